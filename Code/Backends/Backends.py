@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from langchain_core.language_models.llms import LLM
+
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".llm_cache", "replay")
+
+
+@dataclass
+class BackendSpec:
+    name: str
+    family: str  # short model name the prompts use for budgets ("gpt-4", "gemini-1.5", ...)
+    provider: str
+    model_id: str
+    context_window: int
+    max_output_tokens: int
+    batch_size: int
+    encoding: str  # tiktoken encoding used to count tokens; Gemini has no public tokenizer, cl100k is a close estimate
+    prompt_budget: int  # token budget of a whole prompt
+    reference_budget: int  # token budget of the references section of a prompt
+    requests_per_minute: Optional[int]
+    tokens_per_minute: Optional[int]
+    factory: Callable
+    input_cost_per_million: float = 0.0  # USD list price per million prompt tokens
+    output_cost_per_million: float = 0.0
+
+    def create(self, temperature=0):
+        return self.factory(self, temperature)
+
+    def capped(self, model, max_tokens):
+        """model with its replies limited to max_tokens, for callers that spend from a token budget."""
+        if self.provider == "openai":
+            return model.bind(max_tokens=max_tokens)
+        if self.provider == "google":
+            return model.bind(max_output_tokens=max_tokens)
+        return model  # replayed responses are fixed
+
+    def limits(self):
+        return {"requests_per_minute": self.requests_per_minute, "tokens_per_minute": self.tokens_per_minute}
+
+    def cost(self, input_tokens, output_tokens):
+        return (input_tokens * self.input_cost_per_million + output_tokens * self.output_cost_per_million) / 1e6
+
+
+BACKENDS = {}
+DEFAULT_BACKEND = "gemini-1.5-advanced"
+_unknown = set()
+
+
+def register_backend(spec):
+    BACKENDS[spec.name] = spec
+    return spec
+
+
+def get_backend(name):
+    """The backend registered as name; a model family such as "gpt-4" resolves to its first backend."""
+    if name in BACKENDS:
+        return BACKENDS[name]
+    for spec in BACKENDS.values():
+        if spec.family == name:
+            return spec
+    if name not in _unknown:
+        _unknown.add(name)
+        print(f"Unknown model '{name}', using {DEFAULT_BACKEND}.")
+    return BACKENDS[DEFAULT_BACKEND]
+
+
+def openai_model(spec, temperature):
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model_name=spec.model_id, temperature=temperature, max_tokens=spec.max_output_tokens)
+
+
+def google_model(spec, temperature):
+    from langchain_google_genai import GoogleGenerativeAI
+    return GoogleGenerativeAI(model=spec.model_id, temperature=temperature, request_timeout=3600)
+
+
+def replay_model(spec, temperature):
+    return ReplayLLM(replay_dir=os.environ.get("INVARIANT_REPLAY_DIR", REPLAY_DIR))
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class ReplayLLM(LLM):
+    """
+    Offline backend that answers every prompt from <replay_dir>/<sha256(prompt)>.json.
+    With mode="record" and an inner model it calls the inner model instead and saves each response,
+    which produces the recordings a later replay run serves.
+    """
+
+    replay_dir: str = REPLAY_DIR
+    mode: str = "replay"
+    inner: Any = None
+
+    @property
+    def _llm_type(self):
+        return "replay"
+
+    def path_for(self, prompt):
+        return os.path.join(self.replay_dir, prompt_key(prompt) + ".json")
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        path = self.path_for(prompt)
+        if self.mode == "record":
+            response = self.inner.invoke(prompt)
+            response = response if isinstance(response, str) else response.content
+            os.makedirs(self.replay_dir, exist_ok=True)
+            with open(path, "w") as file:
+                json.dump({"prompt": prompt, "response": response}, file)
+            return response
+        try:
+            with open(path, "r") as file:
+                return json.load(file)["response"]
+        except FileNotFoundError:
+            raise ValueError(f"No recorded response for prompt {prompt_key(prompt)} in {self.replay_dir}")
+
+
+def recording(model, replay_dir=None):
+    """Wraps a live model so every response is also written to the replay directory."""
+    return ReplayLLM(replay_dir=replay_dir or REPLAY_DIR, mode="record", inner=model)
+
+
+# registration order is the order the UI lists the models in
+register_backend(BackendSpec("gemini-1.0-pro", "gemini-1.0", "google", "gemini-1.0-pro",
+                             context_window=32760, max_output_tokens=8192, batch_size=8,
+                             encoding="cl100k_base", prompt_budget=280000, reference_budget=100000,
+                             requests_per_minute=60, tokens_per_minute=None, factory=google_model,
+                             input_cost_per_million=0.5, output_cost_per_million=1.5))
+register_backend(BackendSpec("gemini-1.5-advanced", "gemini-1.5", "google", "gemini-1.5-pro-latest",
+                             context_window=1048576, max_output_tokens=8192, batch_size=4,
+                             encoding="cl100k_base", prompt_budget=1000000, reference_budget=300000,
+                             requests_per_minute=60, tokens_per_minute=2000000, factory=google_model,
+                             input_cost_per_million=3.5, output_cost_per_million=10.5))
+register_backend(BackendSpec("gpt-4", "gpt-4", "openai", "gpt-4o",
+                             context_window=128000, max_output_tokens=4096, batch_size=8,
+                             encoding="o200k_base", prompt_budget=120000, reference_budget=40000,
+                             requests_per_minute=500, tokens_per_minute=300000, factory=openai_model,
+                             input_cost_per_million=5.0, output_cost_per_million=15.0))
+register_backend(BackendSpec("gpt-3.5", "gpt-3.5", "openai", "gpt-3.5-turbo-0125",
+                             context_window=16385, max_output_tokens=4096, batch_size=16,
+                             encoding="cl100k_base", prompt_budget=8000, reference_budget=3000,
+                             requests_per_minute=500, tokens_per_minute=200000, factory=openai_model,
+                             input_cost_per_million=0.5, output_cost_per_million=1.5))
+# budgets and tokenizer of the family the recordings were made with
+_replayed = get_backend(os.environ.get("INVARIANT_REPLAY_FAMILY", "gpt-4"))
+register_backend(BackendSpec("replay", _replayed.family, "replay", "replay",
+                             context_window=_replayed.context_window, max_output_tokens=_replayed.max_output_tokens,
+                             batch_size=64, encoding=_replayed.encoding, prompt_budget=_replayed.prompt_budget,
+                             reference_budget=_replayed.reference_budget,
+                             requests_per_minute=None, tokens_per_minute=None, factory=replay_model))
@@ -0,0 +1,275 @@
+"""
+Offline end-to-end benchmark over the bundled Solady Dataset.
+
+    python -m Benchmark.Benchmark --replay-dir .llm_cache/replay --out bench.json
+    python -m Benchmark.Benchmark --replay-dir .llm_cache/replay --baseline Benchmark/baselines/replay.json
+
+Every technique runs over every contract folder of `Solady Dataset/src` with the replay backend,
+so no network is needed and runs are repeatable. It reports throughput, p50/p95 latency per
+stage, peak RSS, prompt tokens and (with --foundry) the compile pass rate. Results are written as
+JSON. With --baseline the run is compared against a saved result and the exit code is 1 when
+any metric regressed beyond its tolerance.
+
+Recordings come from one live run: --record --model gpt-4 calls the real model and saves every
+response into --replay-dir. Replays must use the same --family and INVARIANT_EMBEDDINGS as the
+recording, because both change the prompts and so the recording keys.
+"""
+import argparse
+import dataclasses
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_DIR = os.path.join(os.path.dirname(CODE_DIR), "Solady Dataset")
+TECHNIQUES = ["zero-shot", "few-shot", "Prompt chaining"]
+
+# relative slack before a change counts as a regression; compile pass rate is in absolute points
+TOLERANCES = {
+    "throughput": 0.15,
+    "latency_p95": 0.25,
+    "peak_rss": 0.20,
+    "prompt_tokens": 0.02,
+    "compile_pass_rate": 0.05,
+}
+LATENCY_FLOOR = 0.05  # seconds; p95 changes below this are timer noise
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+
+def prepare_workspace(dataset, foundry_template=None, root=None):
+    """Copies the dataset's src/ into a fresh workspace, linking lib/ and config from a Foundry template."""
+    workspace = tempfile.mkdtemp(prefix="bench-", dir=root)
+    shutil.copytree(os.path.join(dataset, "src"), os.path.join(workspace, "src"))
+    if foundry_template:
+        for name in ["foundry.toml", "remappings.txt"]:
+            if os.path.exists(os.path.join(foundry_template, name)):
+                shutil.copy2(os.path.join(foundry_template, name), workspace)
+        if os.path.isdir(os.path.join(foundry_template, "lib")):
+            os.symlink(os.path.abspath(os.path.join(foundry_template, "lib")), os.path.join(workspace, "lib"))
+    return workspace
+
+
+def contract_folders(workspace):
+    # InvariantGenerator reads the .sol files directly inside one folder, so every folder is a separate run
+    folders = []
+    for folder, _, filenames in sorted(os.walk(os.path.join(workspace, "src"))):
+        if any(filename.endswith(".sol") for filename in filenames):
+            folders.append(os.path.relpath(folder, workspace) + "/")
+    return folders
+
+
+def use_family(family):
+    # the replay backend borrows the prompt budgets and tokenizer of the family the recordings were made with
+    from Backends.Backends import get_backend, register_backend
+    recorded = get_backend(family)
+    register_backend(dataclasses.replace(
+        get_backend("replay"), family=recorded.family, context_window=recorded.context_window,
+        max_output_tokens=recorded.max_output_tokens, encoding=recorded.encoding,
+        prompt_budget=recorded.prompt_budget, reference_budget=recorded.reference_budget))
+
+
+def run_technique(options):
+    """Runs one technique over the whole workspace; meant to run in its own process for a clean RSS."""
+    if options["record"]:
+        os.environ["INVARIANT_RECORD_DIR"] = options["replay_dir"]
+    else:
+        os.environ["INVARIANT_REPLAY_DIR"] = options["replay_dir"]
+    if options["model"] == "replay":
+        use_family(options["family"])
+
+    from contextlib import redirect_stdout
+    from InvariantGenerator.InvariantGenerator import InvariantGenerator
+    from Telemetry.Telemetry import Telemetry
+
+    workspace = options["workspace"]
+    technique = options["technique"]
+    output_root = os.path.join(workspace, "generated", technique.replace(" ", "-"))
+    telemetry = None
+    generated = []
+    contracts = 0
+    error = None
+    start = time.monotonic()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for folder in contract_folders(workspace):
+            output_dir = os.path.join(output_root, folder)
+            try:
+                generator = InvariantGenerator(workspace, folder, options["model"], use_cache=False, output_dir=output_dir)
+                selected = [contract["filename"] for contract in generator.contracts]
+                generator.process_contracts({}, technique, selected, max_concurrency=options["concurrency"],
+                                            stream=options["stream"])
+            except ValueError as e:
+                # the replay backend raises ValueError for prompts it has no recording of
+                error = f"{folder}: {e}"
+                break
+            contracts += len(generator.generated)
+            generated += [os.path.join(output_dir, name) for name in generator.generated]
+            if telemetry is None:
+                telemetry = Telemetry(generator.backend, generator.count_tokens)
+            telemetry.records.extend(generator.telemetry.records)
+            if generator.failed:
+                # the pipeline paths (Prompt chaining, --stream) keep per-contract errors instead of raising
+                error = f"{folder}: " + "; ".join(f"{name}: {reason}" for name, reason in generator.failed.items())
+                break
+    wall = time.monotonic() - start
+
+    compile_pass_rate = None
+    if options["compile"] and generated and error is None:
+        from CompilerPool.CompilerPool import CompilerPool
+        pool = CompilerPool(workspace, root=os.path.join(workspace, ".bench-compiler"))
+        results = pool.compile_many(generated)
+        for name, result in results.items():
+            telemetry.observe(name, "compile", latency=result.duration, ok=result.success)
+        compile_pass_rate = sum(r.success for r in results.values()) / len(results)
+
+    stages = telemetry.summary() if telemetry else {}
+    rss, children_rss = peak_rss_mb()
+    return {
+        "technique": technique,
+        "contracts": contracts,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_min": round(contracts / wall * 60, 2) if wall > 0 else None,
+        "prompt_tokens": stages.get("llm_call", {}).get("input_tokens", 0),
+        "output_tokens": stages.get("llm_call", {}).get("output_tokens", 0),
+        "stages": {name: {k: round(v, 4) if isinstance(v, float) else v for k, v in s.items()}
+                   for name, s in stages.items()},
+        "peak_rss_mb": rss,
+        "peak_children_rss_mb": children_rss,
+        "compile_pass_rate": compile_pass_rate,
+        "error": error,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CODE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(args):
+    os.environ.setdefault("INVARIANT_EMBEDDINGS", "local")
+    results = {
+        "meta": {
+            "dataset": os.path.abspath(args.dataset),
+            "model": args.model,
+            "family": args.family,
+            "embeddings": os.environ["INVARIANT_EMBEDDINGS"],
+            "concurrency": args.concurrency,
+            "stream": args.stream,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "techniques": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    for technique in args.techniques:
+        # a fresh workspace and process per technique: cold index, isolated peak RSS
+        workspace = prepare_workspace(args.dataset, args.foundry)
+        options = {
+            "workspace": workspace, "technique": technique, "model": args.model, "family": args.family,
+            "replay_dir": os.path.abspath(args.replay_dir), "record": args.record,
+            "concurrency": args.concurrency, "stream": args.stream, "compile": bool(args.foundry),
+        }
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results["techniques"][technique] = executor.submit(run_technique, options).result()
+        finally:
+            if not args.keep:
+                shutil.rmtree(workspace, ignore_errors=True)
+        print(f"{technique}: {results['techniques'][technique]['throughput_per_min']} contracts/min", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerances=TOLERANCES):
+    """Human-readable regressions of results against baseline; empty when nothing regressed."""
+    regressions = []
+    for technique, old in baseline.get("techniques", {}).items():
+        new = results["techniques"].get(technique)
+        if new is None:
+            continue
+        if new.get("error"):
+            regressions.append(f"{technique}: run failed: {new['error']}")
+            continue
+        if old.get("throughput_per_min") and new["throughput_per_min"] < old["throughput_per_min"] * (1 - tolerances["throughput"]):
+            regressions.append(f"{technique}: throughput {new['throughput_per_min']} < {old['throughput_per_min']} contracts/min")
+        for stage, old_stage in old.get("stages", {}).items():
+            new_p95 = new["stages"].get(stage, {}).get("latency_p95")
+            old_p95 = old_stage.get("latency_p95", 0)
+            if new_p95 is not None and new_p95 > old_p95 * (1 + tolerances["latency_p95"]) and new_p95 - old_p95 > LATENCY_FLOOR:
+                regressions.append(f"{technique}: {stage} p95 {new_p95:.3f}s > {old_p95:.3f}s")
+        if old.get("peak_rss_mb") and new["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerances["peak_rss"]):
+            regressions.append(f"{technique}: peak RSS {new['peak_rss_mb']} MB > {old['peak_rss_mb']} MB")
+        if old.get("prompt_tokens") and new["prompt_tokens"] > old["prompt_tokens"] * (1 + tolerances["prompt_tokens"]):
+            regressions.append(f"{technique}: prompt tokens {new['prompt_tokens']} > {old['prompt_tokens']}")
+        if old.get("compile_pass_rate") is not None and new.get("compile_pass_rate") is not None and \
+                new["compile_pass_rate"] < old["compile_pass_rate"] - tolerances["compile_pass_rate"]:
+            regressions.append(f"{technique}: compile pass rate {new['compile_pass_rate']:.2%} < {old['compile_pass_rate']:.2%}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark over the Solady Dataset.")
+    parser.add_argument("--dataset", default=DATASET_DIR, help="dataset root containing src/")
+    parser.add_argument("--techniques", nargs="*", default=TECHNIQUES, choices=TECHNIQUES)
+    parser.add_argument("--model", default="replay", help="backend; a live one together with --record")
+    parser.add_argument("--family", default="gpt-4", help="model family the recordings were made with")
+    parser.add_argument("--replay-dir", default=os.path.join(CODE_DIR, ".llm_cache", "replay"))
+    parser.add_argument("--record", action="store_true", help="call --model live and save every response")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action="store_true", help="benchmark the streaming generation path")
+    parser.add_argument("--foundry", help="Foundry project whose lib/ and config are used to compile the outputs")
+    parser.add_argument("--out", help="write the results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON to compare against; exit code 1 on regression")
+    parser.add_argument("--save-baseline", help="also write the results as the new baseline here")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary workspaces")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.record and args.model == "replay":
+        sys.exit("--record needs a live --model to record from")
+    if args.record:
+        from Backends.Backends import get_backend
+        args.family = get_backend(args.model).family
+    results = run_benchmark(args)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as file:
+            file.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            regressions = compare(results, json.load(file))
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
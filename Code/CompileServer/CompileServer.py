@@ -0,0 +1,376 @@
+"""
+solc compile service for candidate test files.
+
+    python -m CompileServer.CompileServer --project ../FoundryProject --socket /tmp/invariant-solc.sock
+
+In-process, CompileServer(project).compile(test_path) returns a BuildReport like
+Diagnostics.forge_build, or None when the caller should compile with forge. Over the socket,
+every request is one JSON line {"path": ..., "code": ...} and every answer one line holding
+BuildReport.to_dict(), or {"unavailable": true}.
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import posixpath
+import re
+import socketserver
+import sys
+import threading
+import time
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+from Diagnostics.Diagnostics import FORGE_IGNORED_CODES, FORGE_MAX_OUTPUT, FORGE_TIMEOUT, BuildReport, Diagnostic, decode_json, parse_errors
+from Process.Process import get_process_manager
+from WorkspacePool.WorkspacePool import forge_binary
+
+IMPORT_RE = re.compile(r"""^\s*import\s+(?:[^'";]*?\s+from\s+)?["']([^"']+)["']""", re.M)
+PRAGMA_RE = re.compile(r"pragma\s+solidity\s+([^;]+);")
+VERSION_RE = re.compile(r"(\^|~|>=|<=|>|<|=)?\s*v?(\d+)(?:\.(\d+))?(?:\.(\d+))?")
+SVM_DIR = os.path.expanduser("~/.svm")
+# what forge's remappings are derived from; a change to any of them reloads the remappings
+CONFIG_PATHS = ("remappings.txt", "foundry.toml", "lib")
+REMAPPINGS_RETRY = 60  # seconds before a failed `forge remappings` is tried again on unchanged config
+
+
+def version_tuple(text):
+    return tuple(int(part) for part in text.split("."))
+
+
+def satisfies(version, pragma):
+    """Whether version (a tuple) satisfies a solidity pragma such as ^0.8.0 or >=0.8.4 <0.9.0."""
+    for alternative in pragma.split("||"):
+        ok = True
+        for match in VERSION_RE.finditer(alternative):
+            operator = match.group(1) or "="
+            bound = tuple(int(part or 0) for part in match.group(2, 3, 4))
+            if operator == "^":
+                # ^0.8.1 means >=0.8.1 <0.9.0 for 0.x versions
+                upper = (bound[0] + 1, 0, 0) if bound[0] > 0 else (0, bound[1] + 1, 0)
+                ok = ok and bound <= version < upper
+            elif operator == "~":
+                ok = ok and bound <= version < (bound[0], bound[1] + 1, 0)
+            elif operator == "=":
+                ok = ok and version == bound
+            else:
+                ok = ok and {">=": version >= bound, "<=": version <= bound,
+                             ">": version > bound, "<": version < bound}[operator]
+        if ok:
+            return True
+    return False
+
+
+def installed_compilers():
+    # {version: solc binary} from svm, the folder forge installs compilers into
+    compilers = {}
+    if os.path.isdir(SVM_DIR):
+        for name in os.listdir(SVM_DIR):
+            binary = os.path.join(SVM_DIR, name, f"solc-{name}")
+            if re.fullmatch(r"\d+\.\d+\.\d+", name) and os.path.isfile(binary):
+                compilers[version_tuple(name)] = binary
+    return compilers
+
+
+def config_signature(root):
+    signature = []
+    for name in CONFIG_PATHS:
+        try:
+            signature.append(os.stat(os.path.join(root, name)).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def load_profile(root):
+    try:
+        with open(os.path.join(root, "foundry.toml"), "rb") as file:
+            return tomllib.load(file).get("profile", {}).get("default", {}) if tomllib else {}
+    except (OSError, ValueError):
+        return {}
+
+
+class SourceTree:
+    """
+    The project's sources as solc source units, named by their path relative to the project root
+    (which is what forge passes to solc too). Text and import lists are kept per file and only
+    re-read when the file's mtime or size changes.
+    """
+
+    def __init__(self, root, remappings):
+        self.root = root
+        self.remappings = sorted(remappings, key=lambda r: len(r[0]), reverse=True)
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, importer, importpath):
+        # solc's rules: relative imports are joined to the importer's unit name, then remappings apply
+        unit = posixpath.normpath(posixpath.join(posixpath.dirname(importer), importpath)) \
+            if importpath.startswith(".") else importpath
+        for prefix, target in self.remappings:
+            if unit.startswith(prefix):
+                unit = posixpath.normpath(target + unit[len(prefix):])
+                break
+        return unit
+
+    def read(self, unit):
+        """(text, imported units) of a unit on disk, or None."""
+        path = os.path.join(self.root, unit)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (stat.st_mtime, stat.st_size)
+        with self.lock:
+            entry = self.files.get(unit)
+        if entry is None or entry[0] != key:
+            with open(path, "r") as file:
+                text = file.read()
+            entry = (key, text, [self.resolve(unit, i) for i in IMPORT_RE.findall(text)])
+            with self.lock:
+                self.files[unit] = entry
+        return entry[1], entry[2]
+
+    def closure(self, unit, code):
+        """{unit: text} for a candidate and everything it imports transitively."""
+        sources = {unit: code}
+        queue = collections.deque(self.resolve(unit, i) for i in IMPORT_RE.findall(code))
+        while queue:
+            current = queue.popleft()
+            if current in sources:
+                continue
+            entry = self.read(current)
+            if entry is None:
+                continue  # left to solc's own file loading, which reports it if it is really missing
+            sources[current] = entry[0]
+            queue.extend(i for i in entry[1] if i not in sources)
+        return sources
+
+
+class CompileServer:
+    """
+    Compiles candidate test files with solc --standard-json instead of a forge build per candidate.
+    The project's remappings (as forge resolves them, auto-detected ones included) are kept in
+    memory and reloaded when remappings.txt, foundry.toml or lib/ change; source files are read
+    once per mtime. Each request starts a new solc that analyses the candidate's whole import
+    closure again (forge-std and src/ included), but asks for bytecode of the candidate's own
+    contracts only, so dependencies are never code-generated for their own sake. Results are
+    cached by the content of the whole closure, so only unchanged candidates (pruning variants,
+    repeated repairs) are answered without running solc.
+    """
+
+    def __init__(self, root, solc=None, cache_size=512, timeout=FORGE_TIMEOUT, ignore_codes=FORGE_IGNORED_CODES):
+        self.root = os.path.abspath(root)
+        self.solc = solc or os.environ.get("INVARIANT_SOLC")
+        self.compilers = installed_compilers()
+        self.timeout = timeout
+        self.ignored = {str(code) for code in ignore_codes}
+        self.cache = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.config_lock = threading.Lock()
+        self.signature = None
+        self.loaded_at = 0.0
+        self.remapped = False
+        self.hits = 0
+        self.misses = 0
+        self.refresh()
+
+    @property
+    def available(self):
+        return bool(self.solc or self.compilers) and self.remapped
+
+    def refresh(self):
+        """Reloads the profile and remappings when the project config changed, or retries a failed load."""
+        with self.config_lock:
+            signature = config_signature(self.root)
+            retry = not self.remapped and time.monotonic() - self.loaded_at > REMAPPINGS_RETRY
+            if signature == self.signature and not retry:
+                return
+            self.profile = load_profile(self.root)
+            remappings = self.load_remappings()
+            # without forge's remappings imports such as forge-std/ would not resolve; callers then use forge
+            self.remapped = remappings is not None
+            self.tree = SourceTree(self.root, remappings or [])
+            self.signature = signature
+            self.loaded_at = time.monotonic()
+
+    def load_remappings(self):
+        # forge merges remappings.txt, foundry.toml and the ones it detects in lib/; None when forge fails
+        proc = get_process_manager().run_sync([forge_binary(), "remappings"], self.root, timeout=self.timeout)
+        if not proc.ok:
+            print(f"forge remappings failed in {self.root}, compiling with forge instead: {proc.describe()}")
+            return None
+        remappings = []
+        for line in proc.stdout.splitlines():
+            line = line.strip()
+            if "=" in line and not line.startswith("#"):
+                prefix, target = line.split("=", 1)
+                remappings.append((prefix.split(":")[-1], target))
+        return remappings
+
+    def solc_for(self, sources):
+        if self.solc:
+            return self.solc
+        pinned = self.profile.get("solc") or self.profile.get("solc_version")
+        if pinned and re.fullmatch(r"\d+\.\d+\.\d+", str(pinned)) and version_tuple(pinned) in self.compilers:
+            return self.compilers[version_tuple(pinned)]
+        pragmas = [match for text in sources.values() for match in PRAGMA_RE.findall(text)]
+        for version in sorted(self.compilers, reverse=True):
+            if all(satisfies(version, pragma) for pragma in pragmas):
+                return self.compilers[version]
+        return None
+
+    def settings(self, unit):
+        settings = {
+            "remappings": [f"{prefix}={target}" for prefix, target in self.tree.remappings],
+            "outputSelection": {unit: {"*": ["evm.bytecode.object"]}},
+        }
+        if self.profile.get("optimizer"):
+            settings["optimizer"] = {"enabled": True, "runs": self.profile.get("optimizer_runs", 200)}
+        if self.profile.get("via_ir"):
+            settings["viaIR"] = True
+        if self.profile.get("evm_version"):
+            settings["evmVersion"] = self.profile["evm_version"]
+        return settings
+
+    def compile(self, test_path=None, code=None, unit=None, timeout=None):
+        """BuildReport for one candidate given by path, by code, or both (code wins); None to use forge instead."""
+        self.refresh()
+        if not self.available:
+            return None
+        if code is None:
+            with open(test_path, "r") as file:
+                code = file.read()
+        unit = unit or posixpath.join("test", os.path.basename(test_path or "Candidate.t.sol"))
+        sources = self.tree.closure(unit, code)
+        solc = self.solc_for(sources)
+        if solc is None:
+            return BuildReport(-1, [Diagnostic(None, None, None, None, "error", "no installed solc satisfies the pragmas")])
+        document = json.dumps({"language": "Solidity", "sources": {u: {"content": t} for u, t in sources.items()},
+                               "settings": self.settings(unit)}, sort_keys=True)
+        key = hashlib.sha256((solc + "\0" + document).encode("utf-8")).hexdigest()
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+        report = self.run_solc(solc, document, sources, timeout or self.timeout)
+        if report.returncode >= 0:
+            with self.lock:
+                self.cache[key] = report
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return report
+
+    def run_solc(self, solc, document, sources, timeout):
+        command = [solc, "--standard-json", "--base-path", self.root, "--allow-paths", self.root]
+        proc = get_process_manager().run_sync(command, self.root, timeout=timeout, input=document,
+                                              max_output=FORGE_MAX_OUTPUT)
+        if proc.timed_out or proc.returncode is None:
+            message = f"solc timed out after {timeout}s" if proc.timed_out else proc.stderr
+            return BuildReport(-1, [Diagnostic(None, None, None, None, "error", message)], proc.duration)
+        data = decode_json(proc.stdout)
+        if data is None:
+            message = proc.stderr.strip() or f"solc exited with {proc.returncode}"
+            return BuildReport(-1, [Diagnostic(None, None, None, None, "error", message)], proc.duration)
+        errors = [e for e in data.get("errors", []) if str(e.get("errorCode")) not in self.ignored]
+        diagnostics = parse_errors(errors, self.root, sources)
+        failed = any(d.is_error for d in diagnostics)
+        return BuildReport(1 if failed else 0, diagnostics, proc.duration)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "cached": len(self.cache)}
+
+    def serve(self, socket_path):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                        report = server.compile(request.get("path"), request.get("code"), request.get("unit"),
+                                                request.get("timeout"))
+                        answer = report.to_dict() if report is not None else {"unavailable": True}
+                    except Exception as e:
+                        answer = {"returncode": -1, "duration": 0.0,
+                                  "diagnostics": [vars(Diagnostic(None, None, None, None, "error", f"{type(e).__name__}: {e}"))]}
+                    self.wfile.write((json.dumps(answer) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as unix_server:
+            unix_server.daemon_threads = True
+            unix_server.serve_forever()
+
+
+class CompileClient:
+    """Talks to a CompileServer over its socket; compile() has the same signature as the server's."""
+
+    def __init__(self, socket_path, timeout=FORGE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def compile(self, test_path=None, code=None, unit=None, timeout=None):
+        import socket
+        timeout = timeout or self.timeout
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            # a little longer than solc's own timeout, so the server's timeout report gets through
+            connection.settimeout(timeout + 30)
+            connection.connect(self.socket_path)
+            request = {"path": os.path.abspath(test_path) if test_path else None, "code": code, "unit": unit,
+                       "timeout": timeout}
+            connection.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            with connection.makefile("r") as answers:
+                answer = json.loads(answers.readline())
+        return None if answer.get("unavailable") else BuildReport.from_dict(answer)
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def get_compile_server(root):
+    """
+    A compiler for root's candidates: a client of $INVARIANT_COMPILE_SOCKET when set, else an
+    in-process CompileServer, or None when no solc is installed. compile() returns None while forge
+    cannot report the project's remappings, and callers then fall back to forge for that file.
+    """
+    if os.environ.get("INVARIANT_COMPILE_SOCKET"):
+        return CompileClient(os.environ["INVARIANT_COMPILE_SOCKET"])
+    root = os.path.abspath(root)
+    with _servers_lock:
+        server = _servers.get(root)
+        if server is None:
+            server = CompileServer(root)
+            if not (server.solc or server.compilers):
+                return None  # not cached: a solc installed later is picked up on the next call
+            _servers[root] = server
+        return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="solc compile server for candidate test files.")
+    parser.add_argument("--project", required=True, help="Foundry project root")
+    parser.add_argument("--socket", required=True, help="Unix socket path to listen on")
+    parser.add_argument("--solc", help="solc binary (default: newest svm install matching each candidate)")
+    args = parser.parse_args(argv)
+    server = CompileServer(args.project, solc=args.solc)
+    if not (server.solc or server.compilers):
+        sys.exit("no solc found (install one with forge (svm) or pass --solc)")
+    if not server.remapped:
+        print("forge remappings failed; requests are answered as unavailable until it succeeds", file=sys.stderr)
+    print(f"Serving {server.root} on {args.socket}", file=sys.stderr)
+    server.serve(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import contextlib
+import os
+import queue
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from Diagnostics.Diagnostics import forge_build
+
+FORGE = shutil.which("forge") or os.path.expanduser("~/.foundry/bin/forge")
+SHARED_DIRS = ["lib", "src"]
+SHARED_FILES = ["foundry.toml", "remappings.txt"]
+
+
+@dataclass
+class CompileResult:
+    filename: str
+    success: bool
+    returncode: int
+    output: str
+    duration: float
+    errors: list = field(default_factory=list)
+    diagnostics: list = field(default_factory=list)
+
+    def by_function(self):
+        # error diagnostics keyed by the test function they fall in
+        grouped = {}
+        for diagnostic in self.diagnostics:
+            if diagnostic.is_error:
+                grouped.setdefault(diagnostic.function, []).append(diagnostic)
+        return grouped
+
+
+class CompilerPool:
+    """
+    Pool of isolated Foundry sandboxes for compiling generated test files in parallel.
+    Every sandbox has its own test/, cache/ and out/ folders and links lib/ and src/ back to
+    the main project, so workers never share build state or depend on the process cwd.
+    With a Validator, files it rejects fail with its reasons and never reach forge. With a
+    compile server (see CompileServer), files are compiled by its warm solc instead of forge.
+    """
+
+    def __init__(self, project_path, workers=None, root=None, validator=None, compile_server=None):
+        self.project_path = project_path.rstrip("/")
+        self.workers = workers or os.cpu_count() or 1
+        self.validator = validator
+        self.compile_server = compile_server
+        self.root = root or os.path.join(self.project_path + "Compiler", "workers")
+        self.sandboxes = queue.Queue()
+        for i in range(self.workers):
+            self.sandboxes.put(self.make_sandbox(i))
+
+    def make_sandbox(self, index):
+        path = os.path.join(self.root, f"worker{index}")
+        os.makedirs(os.path.join(path, "test"), exist_ok=True)
+        for name in SHARED_DIRS:
+            source = os.path.join(self.project_path, name)
+            target = os.path.join(path, name)
+            if not os.path.exists(source) or os.path.lexists(target):
+                continue
+            try:
+                os.symlink(source, target, target_is_directory=True)
+            except OSError:
+                shutil.copytree(source, target)
+        for name in SHARED_FILES:
+            source = os.path.join(self.project_path, name)
+            if os.path.exists(source):
+                shutil.copy2(source, os.path.join(path, name))
+        return path
+
+    @contextlib.contextmanager
+    def sandbox(self, test_path):
+        """Checks out a sandbox whose test/ holds only test_path; yields (sandbox path, relative test path)."""
+        sandbox = self.sandboxes.get()
+        filename = os.path.basename(test_path)
+        try:
+            test_folder = os.path.join(sandbox, "test")
+            for name in os.listdir(test_folder):
+                os.remove(os.path.join(test_folder, name))
+            shutil.copy2(test_path, os.path.join(test_folder, filename))
+            yield sandbox, os.path.join("test", filename)
+        finally:
+            self.sandboxes.put(sandbox)
+
+    def compile(self, test_path, timeout=600):
+        filename = os.path.basename(test_path)
+        if self.validator is not None:
+            validation = self.validator.validate_file(test_path)
+            if not validation.valid:
+                diagnostics = validation.diagnostics()
+                return CompileResult(filename, False, -1, "\n\n".join(str(d) for d in diagnostics), validation.duration,
+                                     [str(d) for d in diagnostics], diagnostics)
+        # the compile server answers None while it cannot resolve the project's remappings
+        report = self.compile_server.compile(test_path, timeout=timeout) if self.compile_server is not None else None
+        if report is None:
+            with self.sandbox(test_path) as (sandbox, relative_path):
+                report = forge_build(sandbox, relative_path, forge=FORGE, timeout=timeout)
+        return CompileResult(filename, report.success, report.returncode, report.output, report.duration,
+                             [str(d) for d in report.errors], report.diagnostics)
+
+    def compile_many(self, test_paths, timeout=600):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(lambda path: self.compile(path, timeout), test_paths)
+            return {result.filename: result for result in results}
@@ -1,39 +1,58 @@
 import glob
 import re
-import subprocess
 from langchain.agents import initialize_agent, AgentType
 import langchain_core.runnables as r
 from langchain_core.tools import tool
 from langchain.prompts import PromptTemplate
 import concurrent.futures
 import os
-from langchain_openai import ChatOpenAI
-import shutil
 from FYP.Prompts import prompts
 # from Prompts import prompts
-from solidity_parser import parser
+from CompilerPool.CompilerPool import CompilerPool
+from CompileServer.CompileServer import get_compile_server
+from CompilingAgent.RepairEngine import RepairEngine
+from Fixer.Fixer import Fixer
+from Validator.Validator import Validator
+from Process.Process import get_process_manager
+from Pruner.Pruner import Pruner
+from Telemetry.Telemetry import Telemetry
+from WorkspacePool.WorkspacePool import link_workspace
+from Backends.Backends import get_backend
+from Prompts.tokens import count_tokens
+from ProjectIndex.ProjectIndex import get_index
+from ReferenceContext.ReferenceContext import ReferenceContextBuilder
 
-from langchain_google_genai import ChatGoogleGenerativeAI,GoogleGenerativeAI
 
 os.environ["GOOGLE_API_KEY"] = "Your GEMINI API Key"
 os.environ["OPENAI_API_KEY"] = "Your OPENAI API Key"
 
 
 class CompilingAgent:
-    def __init__(self,absolutepath,foundrypath,contractfolder):
+    def __init__(self,absolutepath,foundrypath,contractfolder,workers=None,llmmodel="gpt-4"):
         self.absolutepath = os.path.join(absolutepath,foundrypath)#"/home/wahid/Desktop/NewFolder/foundry/"
         self.contractfolder =contractfolder #"src/contracts/libraries"
         self.tempcompiler = self.check_and_copy(absolutepath,foundrypath)#"/home/wahid/PycharmProjects/pythonProject/compiler"
 
-        self.llm = ChatOpenAI(model_name="gpt-4o", temperature=0)
-        # self.llm = ChatOpenAI(model_name="gpt-4-0125-preview", temperature=0)
-        # self.llm = ChatOpenAI(model_name="gpt-3.5-turbo-0125", temperature=0)
-        # self.llm = GoogleGenerativeAI(model="gemini-1.5-pro-latest", temperature=0, request_timeout=1200)
+        self.backend = get_backend(llmmodel)
+        self.llm = self.backend.create(0)
 
         self.agent_type = AgentType.CHAT_ZERO_SHOT_REACT_DESCRIPTION
-        self.check_and_copy(absolutepath,foundrypath)
         self.folder_path = os.path.join(self.absolutepath, self.contractfolder)
+        self.index = get_index(self.absolutepath)
+        self.references = ReferenceContextBuilder(self.index, self.backend.family)
         self.remove_text_files()
+        # tests the validator rejects go straight to fixing and repair without a forge run
+        self.compiler_pool = CompilerPool(self.absolutepath, workers=workers, validator=Validator(self.absolutepath, index=self.index),
+                                          compile_server=get_compile_server(self.absolutepath))
+        self.pruner = Pruner(self.compiler_pool)
+        self.prune_results = {}
+        self.repair_engine = RepairEngine(self.llm, self.compiler_pool, lambda text: count_tokens(text, self.backend.family),
+                                          cap=self.backend.capped)
+        self.repair_results = {}
+        self.fixer = Fixer(self.absolutepath)
+        self.fix_results = {}
+        self.compile_results = {}
+        self.telemetry = Telemetry(self.backend)
         # self.llm = ChatGoogleGenerativeAI(
         #     model="gemini-1.5-pro-latest",
         #     convert_system_message_to_human=True,
@@ -52,27 +71,9 @@ class CompilingAgent:
         # Combine the last folder name with "Compiler" to create the new folder name
         compiler_folder_name = f"{foundryproject}Compiler"
         compiler_folder = os.path.join(absolutepath, compiler_folder_name)
-
-        if not os.path.exists(compiler_folder):
-            # Create the new folder
-            os.makedirs(compiler_folder)
-
         foundry_folder = os.path.join(absolutepath, foundryproject)
-        for item in os.listdir(foundry_folder):
-            item_path = os.path.join(foundry_folder, item)
-            if os.path.isdir(item_path) and item not in ["src", "test"]:
-                # Check if destination directory already exists
-                dest_dir = os.path.join(compiler_folder, item)
-                if not os.path.exists(dest_dir):
-                    # Copy directory
-                    shutil.copytree(item_path, dest_dir)
-                else:
-                    print(f"Destination directory '{dest_dir}' already exists. Skipping...")
-            elif os.path.isfile(item_path):
-                # Copy file
-                shutil.copy2(item_path, compiler_folder)
-
-        return compiler_folder
+        # libraries and other folders are linked rather than copied, config files are copied
+        return link_workspace(foundry_folder, compiler_folder)
 
     def read_sol_code(self, path):
         try:
@@ -107,13 +108,13 @@ class CompilingAgent:
     def check_directory_existence(self, directory_path):
         return os.path.isdir(directory_path)
 
-    def run_subprocess(self, cmd, base_directory):
-        try:
-            subprocess.run(cmd, shell=True, check=True)
-            print(f"Command '{cmd}' executed successfully in {base_directory}.")
-        except subprocess.CalledProcessError as e:
-            # Handle error
-            pass
+    def run_subprocess(self, cmd, base_directory, timeout=600):
+        result = get_process_manager().run_sync(cmd, base_directory, timeout=timeout)
+        if result.ok:
+            print(f"Command '{' '.join(cmd)}' executed successfully in {base_directory}.")
+        else:
+            print(f"Error executing command '{' '.join(cmd)}': {result.describe()}")
+        return result
 
     def change_os_directory(self, path):
         os.chdir(path)
@@ -128,6 +129,7 @@ class CompilingAgent:
                 contract_data = {}
                 with open(os.path.join(folder_path, filename), "r") as file:
                     contract_data["filename"] = filename
+                    contract_data["path"] = os.path.join(folder_path, filename)
                     contract_data["code"] = file.read()
                     contract_list.append(contract_data)
         return contract_list
@@ -148,49 +150,109 @@ class CompilingAgent:
         return '\n'.join(pre_contract_lines)
 
     def run_foundry(self, filename):
-        # Counter.t.sol
-        projectName = "FoundryTest"
-        current_dir = os.getcwd()
-        base_directory = (
-            f"{current_dir}/{projectName}"
-            if self.check_directory_existence(f"{current_dir}/{projectName}")
-            else f"{current_dir}/"
-        )
-        base_directory = self.tempcompiler
-        outputfile = filename.replace(".t.sol", ".txt")
-        self.change_os_directory(base_directory)
-
+        # compiles test/<filename> in one of the isolated sandboxes and returns a CompileResult
         path=os.path.join(self.absolutepath,os.path.join("test",filename))
         if os.path.exists(path):
-            self.run_subprocess(
-                f"/home/wahid/.foundry/bin/forge compile --contracts {path} 2>&1 | sed -r 's/\x1B\[[0-9;]*[mK]//g' > {outputfile}",
-                base_directory,
-            )
-
+            return self.compiler_pool.compile(path)
+        return None
 
     def checkcompileable(self,filename):
-        outputfiles=[]
         testfiles=[]
-        for i in range(len(filename)):
-            outputfiles.append(filename[i])
-            testfiles.append(filename[i])
-            outputfiles[i]=outputfiles[i].replace(".sol",".txt")
-            testfiles[i]=testfiles[i].replace(".sol",".t.sol")
-
+        for name in filename:
+            path=os.path.join(self.absolutepath,"test",name.replace(".sol",".t.sol"))
+            if os.path.exists(path):
+                testfiles.append(path)
+
+        for path in testfiles:
+            self.record_fix(self.fixer.fix_file(path))
+        results=self.compiler_pool.compile_many(testfiles)
         errorfiles=[]
-        for i in range(len(testfiles)):
-            try:
-                self.run_foundry(testfiles[i])
-                status = ""
-                with open(os.path.join(self.tempcompiler, outputfiles[i]), "r") as file:
-                    status = file.read()
-                if "error" in status or "Error" in status:
-                    errorfiles.append(filename[i])
-            except Exception as e:
-                pass
+        for name in filename:
+            result=results.get(name.replace(".sol",".t.sol"))
+            self.compile_results[name]=result
+            if result is not None:
+                self.telemetry.observe(name,"compile",latency=result.duration,ok=result.success,
+                                       error=result.errors[0].splitlines()[0] if result.errors else None)
+            if result is not None and not result.success:
+                errorfiles.append(name)
         return errorfiles
 
 
+    def record_fix(self,result):
+        if result.changed:
+            self.fix_results.setdefault(result.filename,{}).update(result.fired)
+            print(f"Fixed {result.filename}: {result.fired}")
+
+    def fix_uncompilable(self,filename):
+        # rule-based rewrites for the reported error codes; a file that compiles afterwards never reaches a model
+        fixed={}
+        for name in filename:
+            path=os.path.join(self.absolutepath,"test",name.replace(".sol",".t.sol"))
+            with self.telemetry.stage(name,"fix") as record:
+                result=self.fixer.fix_file(path,self.compile_results[name].diagnostics)
+                record.ok=result.changed
+            self.record_fix(result)
+            if result.changed:
+                fixed[name]=path
+        results=self.compiler_pool.compile_many(list(fixed.values()))
+        remaining=[]
+        for name in filename:
+            result=results.get(name.replace(".sol",".t.sol"))
+            if result is not None:
+                self.compile_results[name]=result
+            if result is None or not result.success:
+                remaining.append(name)
+        return remaining
+
+    def repair_uncompilable(self,filename):
+        # patches only the functions the compiler errors point into; files that compile afterwards are done
+        def repair(name):
+            path=os.path.join(self.absolutepath,"test",name.replace(".sol",".t.sol"))
+            contract=self.read_sol_code(os.path.join(self.folder_path,name))
+            with self.telemetry.stage(name,"repair",step=1) as record:
+                result=self.repair_engine.repair(path,contract,self.compile_results.get(name))
+                record.ok=result.compiles
+                record.input_tokens=result.input_tokens
+                record.output_tokens=result.output_tokens
+            return result
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            results=list(executor.map(repair,filename))
+        remaining=[]
+        for name,result in zip(filename,results):
+            self.repair_results[name]=result
+            print(f"{result.filename}: {'repaired' if result.compiles else 'not repaired'} after {result.iterations} iterations, "
+                  f"{result.input_tokens + result.output_tokens} tokens, patched {result.patched}. {result.stopped}")
+            if not result.compiles:
+                remaining.append(name)
+        return remaining
+
+    def prune_uncompilable(self,filename):
+        # drops only the test functions that break compilation; files that keep at least one
+        # property are written back and no longer need the agent
+        paths=[os.path.join(self.absolutepath,"test",name.replace(".sol",".t.sol")) for name in filename]
+        def prune(name,path):
+            # repair step 0 is deterministic pruning, step 1 function-level patches, step 2 the LLM agent
+            with self.telemetry.stage(name,"repair",step=0) as record:
+                result=self.pruner.prune(path)
+                record.ok=result.compiles and bool(result.kept)
+            return result
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            results=list(executor.map(prune,filename,paths))
+        remaining=[]
+        for name,path,result in zip(filename,paths,results):
+            self.prune_results[name]=result
+            if result.compiles and result.kept:
+                with open(path,"w") as file:
+                    file.write(result.code)
+                print(f"{result.filename}: kept {len(result.kept)} properties, dropped {len(result.dropped)} in {result.compile_runs} compiles.")
+                for prop,reason in result.dropped.items():
+                    print(f"  dropped {prop}: {reason}")
+            else:
+                remaining.append(name)
+        return remaining
+
     def initialize_agent(self, filename):
         @tool
         def compile_testcontractfile(filecontent:str):
@@ -206,13 +268,9 @@ class CompilingAgent:
             try:
                 with open(os.path.join(os.path.join(self.absolutepath,"test"),filename), "w") as file:
                     file.write(filecontent)
-                self.run_foundry(filename)
-                outputfile = filename.replace(".t.sol", ".txt")
-                status = ""
-                with open(os.path.join(self.tempcompiler,outputfile), "r") as file:
-                    status = file.read()
-                print(status)
-                return status
+                result = self.run_foundry(filename)
+                print(result.output)
+                return result.output
             except Exception as e:
                 return str(e)
 
@@ -226,35 +284,13 @@ class CompilingAgent:
         )
         return agent
 
-    def find_references(self,code):
-        parsed=False
-        referencecontracts=""
-        try:
-            ast = parser.parse(code)
-            parsed = True
-            ast_obj = parser.objectify(ast)
-            for i in ast_obj.imports:
-                path = i["path"].replace("'", "")
-                if os.path.exists(os.path.join(self.folder_path, path)):
-                    print("path exist")
-                    with open(os.path.join(self.folder_path, path), "r") as file:
-                        referencecontracts += i["path"] + ":\n" + file.read() + "\n\n"
-        except Exception as e:
-            (e)
-        if not parsed:
-            try:
-                code = self.extract_pre_contract(code)
-                ast = parser.parse(code)
-                ast_obj = parser.objectify(ast)
-                for i in ast_obj.imports:
-                    path = i["path"].replace("'", "")
-                    if os.path.exists(os.path.join(self.folder_path, path)):
-                        print("path exist 2")
-                        with open(os.path.join(self.folder_path, path), "r") as file:
-                            referencecontracts += i["path"] + ":\n" + file.read() + "\n\n"
-            except Exception as e:
-               (e)
-        return referencecontracts
+    def find_references(self,code,path=None):
+        with self.telemetry.stage(os.path.basename(path or ""),"reference_resolution"):
+            return self.references.build(code, path, self.folder_path)
+
+    def run_agent(self,name,agent):
+        with self.telemetry.stage(name,"repair",step=2):
+            return agent.invoke({"input": ""})
 
     def interact_with_agent(self):
 
@@ -264,7 +300,9 @@ class CompilingAgent:
         for contract in contracts:
             contractfilename.append(contract["filename"])
 
-        File_list=self.checkcompileable(contractfilename)
+        # cheapest first: rule-based fixes, patches to the failing functions, dropping what is still broken, and only then
+        # hand whole files to the agent
+        File_list=self.prune_uncompilable(self.repair_uncompilable(self.fix_uncompilable(self.checkcompileable(contractfilename))))
         contracts = [entry for entry in contracts if entry['filename'] in File_list]
         print(File_list)
         agentsdic = {}
@@ -274,7 +312,7 @@ class CompilingAgent:
             for contract in contracts:
                 testfile = contract["filename"].replace(".sol", ".t.sol")
                 tstfile = self.read_sol_code(os.path.join(os.path.join(self.absolutepath,"test"),testfile))
-                references=self.find_references(contract["code"])
+                references=self.find_references(contract["code"],contract["path"])
                 prompttemplate = prompts.compiling_agent_prompt(contract["code"],tstfile,references)
                 print("------------------------")
                 agent = (
@@ -283,13 +321,17 @@ class CompilingAgent:
                         | self.initialize_agent(testfile)
                 )
 
-                future = executor.submit(agent.invoke, {"input": ""})
+                future = executor.submit(self.run_agent, contract["filename"], agent)
                 futures.append(future)
 
             # Wait for all futures to complete
             for future in concurrent.futures.as_completed(futures):
                 pass
 
+        self.telemetry.print_summary()
+        if os.environ.get("INVARIANT_TELEMETRY_DIR"):
+            self.telemetry.export(os.environ["INVARIANT_TELEMETRY_DIR"])
+
 
 compiling_agent = CompilingAgent("/home/wahid/PycharmProjects/pythonProject/FYP/","FoundryProject","src/utils/")
 result = compiling_agent.interact_with_agent()
@@ -0,0 +1,208 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from Prompts import prompts
+from Pruner.Pruner import split_functions
+from ReferenceContext.ReferenceContext import extract_signatures
+
+CODE_BLOCK_RE = re.compile(r"```[ \t]*(?:solidity)?[ \t]*\n(.*?)```", re.S)
+DECLARATIONS = "<declarations>"
+# a replacement is about as long as the span it replaces; replies may be twice that plus the fences
+REPLY_OVERHEAD = 64
+
+
+@dataclass
+class Region:
+    name: str  # function name, or DECLARATIONS for the code between functions
+    start: int
+    end: int
+
+    @property
+    def is_function(self):
+        return self.name != DECLARATIONS
+
+
+@dataclass
+class RepairResult:
+    filename: str
+    code: str
+    compiles: bool
+    iterations: int = 0
+    compile_runs: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    patched: list = field(default_factory=list)  # names of the regions that were replaced
+    errors: list = field(default_factory=list)  # errors left after the last compile
+    stopped: str = ""  # why the loop ended without a compiling file
+
+
+def regions(code):
+    """The test contract cut into its functions and the declaration gaps between them, in order."""
+    found = []
+    position = 0
+    for span in split_functions(code):
+        if span.start > position:
+            found.append(Region(DECLARATIONS, position, span.start))
+        found.append(Region(span.name, span.start, span.end))
+        position = span.end
+    found.append(Region(DECLARATIONS, position, len(code)))
+    return found
+
+
+def locate(code, parts, line):
+    # the region holding the start of a 1-based line
+    offset = 0
+    for _ in range(line - 1):
+        offset = code.find("\n", offset) + 1
+        if offset == 0:
+            return None
+    for region in parts:
+        if region.start <= offset < region.end:
+            return region
+    return None
+
+
+def extract_patch(response):
+    blocks = CODE_BLOCK_RE.findall(response)
+    if blocks:
+        return blocks[-1].strip("\n")
+    return None
+
+
+def apply_patches(code, patches):
+    # applied back to front so earlier offsets stay valid
+    for region, text in sorted(patches, key=lambda p: p[0].start, reverse=True):
+        original = code[region.start:region.end]
+        body = original.strip("\n")
+        lead = original[:original.find(body)] if body else ""
+        trail = original[len(lead) + len(body):]
+        replacement = lead + text.strip("\n") + trail if text.strip() else ""
+        code = code[:region.start] + replacement + code[region.end:]
+    return code
+
+
+class RepairEngine:
+    """
+    Repairs a generated test file one failing region at a time instead of regenerating it.
+    Every compiler error is mapped to the function (or the declarations between functions) it
+    falls in, the model is asked for a replacement of only that span, the patches are applied
+    and only this file is recompiled. Prompts carry the errors, the span, a body-less outline
+    of the test contract and the declarations of the contract under test; never the full
+    sources or the Foundry documentation. Each file has a hard budget of iterations and tokens:
+    every call is capped at the reply length reserved for it, so prompts and replies together
+    stay within token_budget. cap(llm, max_tokens) returns the capped model; by default it binds
+    max_tokens, see BackendSpec.capped for the providers that name it differently.
+    """
+
+    def __init__(self, llm, compiler_pool, count_tokens, max_iterations=4, token_budget=24000, max_parallel=4,
+                 cap=None):
+        self.llm = llm
+        self.pool = compiler_pool
+        self.count_tokens = count_tokens
+        self.max_iterations = max_iterations
+        self.token_budget = token_budget
+        self.max_parallel = max_parallel
+        self.cap = cap or (lambda llm, max_tokens: llm.bind(max_tokens=max_tokens))
+
+    def invoke(self, prompt, max_tokens):
+        response = self.cap(self.llm, max_tokens).invoke(prompt)
+        return response if isinstance(response, str) else response.content
+
+    def blame(self, filename, code, diagnostics):
+        """{region: [error text]} for the errors inside filename; None when an error cannot be localised."""
+        parts = regions(code)
+        blamed = {}
+        for diagnostic in diagnostics:
+            if not diagnostic.is_error:
+                continue
+            if diagnostic.file is None or diagnostic.line is None or os.path.basename(diagnostic.file) != filename:
+                # an error in a dependency or without a location is not fixable by patching this file
+                return None
+            region = locate(code, parts, diagnostic.line)
+            if region is None:
+                return None
+            blamed.setdefault((region.start, region.end), (region, []))[1].append(str(diagnostic))
+        return list(blamed.values())
+
+    def write(self, path, code):
+        with open(path, "w") as file:
+            file.write(code)
+
+    def repair(self, test_path, contract_code="", compiled=None):
+        # compiled: an up-to-date CompileResult of the file, which saves the first compile
+        filename = os.path.basename(test_path)
+        with open(test_path, "r") as file:
+            original = file.read()
+        interface = extract_signatures(contract_code) if contract_code else ""
+        result = RepairResult(filename, original, False)
+        code = original
+        if compiled is None:
+            compiled = self.pool.compile(test_path)
+            result.compile_runs += 1
+        original_errors = len(compiled.errors)
+
+        while not compiled.success:
+            result.errors = compiled.errors
+            if result.iterations >= self.max_iterations:
+                result.stopped = f"iteration budget of {self.max_iterations} used up"
+                break
+            spent = result.input_tokens + result.output_tokens
+            if spent >= self.token_budget:
+                result.stopped = f"token budget of {self.token_budget} used up ({spent} tokens)"
+                break
+            blamed = self.blame(filename, code, compiled.diagnostics)
+            if not blamed:
+                result.stopped = "errors could not be localised to a function"
+                break
+
+            outline = extract_signatures(code)
+            requests = []
+            for region, errors in blamed:
+                text = code[region.start:region.end]
+                prompt = prompts.repair_prompt("\n\n".join(errors), text.strip("\n"), outline, interface)
+                span_tokens = self.count_tokens(text)
+                prompt_tokens = self.count_tokens(prompt)
+                # the reply is capped at what is reserved for it here, so the budget holds even for a long one
+                max_tokens = min(self.token_budget - spent - prompt_tokens, 2 * span_tokens + REPLY_OVERHEAD)
+                if max_tokens < span_tokens + REPLY_OVERHEAD:
+                    continue
+                spent += prompt_tokens + max_tokens
+                requests.append((region, prompt, max_tokens))
+            if not requests:
+                result.stopped = f"token budget of {self.token_budget} used up"
+                break
+
+            with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(requests))) as executor:
+                responses = list(executor.map(lambda request: self.invoke(request[1], request[2]), requests))
+            patches = []
+            for (region, prompt, _), response in zip(requests, responses):
+                result.input_tokens += self.count_tokens(prompt)
+                result.output_tokens += self.count_tokens(response)
+                patch = extract_patch(response)
+                # only a function may be removed; an empty declarations block would drop the contract header
+                if patch is None or (not patch.strip() and not region.is_function):
+                    continue
+                patches.append((region, patch))
+                result.patched.append(region.name)
+            result.iterations += 1
+            if not patches:
+                result.stopped = "the model returned no usable patch"
+                break
+
+            code = apply_patches(code, patches)
+            self.write(test_path, code)
+            compiled = self.pool.compile(test_path)
+            result.compile_runs += 1
+
+        result.compiles = compiled.success
+        if result.compiles:
+            result.errors = []
+        elif code != original and len(compiled.errors) >= original_errors:
+            # no progress: leave the original for the pruner and the agent
+            code = original
+            result.patched = []
+            self.write(test_path, code)
+        result.code = code
+        return result
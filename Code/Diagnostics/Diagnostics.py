@@ -0,0 +1,197 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from Process.Process import get_process_manager
+from ProjectIndex.ProjectIndex import summarize
+
+FORGE_TIMEOUT = 600
+# forge build --json carries the whole solc output, so it gets a larger capture bound than plain logs
+FORGE_MAX_OUTPUT = 256 * 1024 * 1024
+# forge's default ignored_error_codes: license, code-size, init-code-size, transient-storage
+FORGE_IGNORED_CODES = (1878, 5574, 3860, 2394)
+
+
+@dataclass
+class Diagnostic:
+    file: Optional[str]
+    line: Optional[int]
+    column: Optional[int]
+    code: Optional[str]
+    severity: str
+    message: str
+    formatted: str = ""
+    function: Optional[str] = None
+
+    @property
+    def is_error(self):
+        return self.severity == "error"
+
+    def __str__(self):
+        if self.formatted:
+            return self.formatted.strip()
+        location = f"{self.file}:{self.line}:{self.column}: " if self.file else ""
+        code = f" ({self.code})" if self.code else ""
+        return f"{location}{self.severity.capitalize()}{code}: {self.message}"
+
+
+@dataclass
+class BuildReport:
+    """Outcome of one forge build: its return code and every compiler diagnostic it produced."""
+
+    returncode: int
+    diagnostics: list = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def errors(self):
+        return [d for d in self.diagnostics if d.is_error]
+
+    @property
+    def warnings(self):
+        return [d for d in self.diagnostics if d.severity == "warning"]
+
+    @property
+    def success(self):
+        return self.returncode == 0 and not self.errors
+
+    @property
+    def output(self):
+        # human-readable text for the UI and the repair agent, errors first
+        if self.success and not self.diagnostics:
+            return "Compiler run successful!"
+        ordered = self.errors + [d for d in self.diagnostics if not d.is_error]
+        return "\n\n".join(str(d) for d in ordered)
+
+    def by_file(self):
+        grouped = {}
+        for diagnostic in self.diagnostics:
+            grouped.setdefault(diagnostic.file, []).append(diagnostic)
+        return grouped
+
+    def by_function(self, file):
+        # diagnostics of one file keyed by the function they fall in (None outside any function)
+        grouped = {}
+        for diagnostic in self.by_file().get(file, []):
+            grouped.setdefault(diagnostic.function, []).append(diagnostic)
+        return grouped
+
+    def to_dict(self):
+        return {"returncode": self.returncode, "duration": self.duration,
+                "diagnostics": [asdict(d) for d in self.diagnostics]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["returncode"], [Diagnostic(**d) for d in data["diagnostics"]], data.get("duration", 0.0))
+
+
+def line_column(source, offset):
+    # solc source locations are byte offsets into the file
+    prefix = source.encode("utf-8")[:offset].decode("utf-8", errors="ignore")
+    line = prefix.count("\n") + 1
+    return line, len(prefix) - (prefix.rfind("\n") + 1) + 1
+
+
+def enclosing_function(summary, line):
+    # regex-fallback summaries have no end lines, so the nearest function starting above wins
+    best = None
+    for contract in summary["contracts"]:
+        for function in contract["functions"]:
+            start, end = function["start_line"], function["end_line"]
+            if start is None or start > line:
+                continue
+            if end is not None and line <= end:
+                return function["name"]
+            if end is None and (best is None or start > best[0]):
+                best = (start, function["name"])
+    return best[1] if best else None
+
+
+class SourceCache:
+    """File text and parsed summary per path, read at most once while one build is being decoded."""
+
+    def __init__(self, cwd, sources=None):
+        self.cwd = cwd
+        self.sources = dict(sources or {})
+        self.summaries = {}
+
+    def source(self, file):
+        if file not in self.sources:
+            try:
+                with open(os.path.join(self.cwd, file), "r") as handle:
+                    self.sources[file] = handle.read()
+            except OSError:
+                self.sources[file] = None
+        return self.sources[file]
+
+    def function_at(self, file, line):
+        source = self.source(file)
+        if source is None:
+            return None
+        if file not in self.summaries:
+            self.summaries[file] = summarize(source)
+        return enclosing_function(self.summaries[file], line)
+
+
+def decode_json(stdout):
+    # forge may print progress lines before the JSON document
+    start = stdout.find("{")
+    while start != -1:
+        try:
+            data, _ = json.JSONDecoder().raw_decode(stdout[start:])
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+        start = stdout.find("{", start + 1)
+    return None
+
+
+def parse_errors(errors, cwd, sources=None):
+    # sources: {file: text} for files that are not (or not yet) on disk under cwd
+    files = SourceCache(cwd, sources)
+    diagnostics = []
+    for error in errors:
+        location = error.get("sourceLocation") or {}
+        file = location.get("file")
+        line = column = function = None
+        if file and location.get("start", -1) >= 0 and files.source(file) is not None:
+            line, column = line_column(files.source(file), location["start"])
+            function = files.function_at(file, line)
+        diagnostics.append(Diagnostic(
+            file=file,
+            line=line,
+            column=column,
+            code=error.get("errorCode"),
+            severity=(error.get("severity") or "error").lower(),
+            message=error.get("message", ""),
+            formatted=error.get("formattedMessage", ""),
+            function=function,
+        ))
+    return diagnostics
+
+
+def forge_build(cwd, contracts=None, forge="forge", timeout=FORGE_TIMEOUT, ignore_codes=FORGE_IGNORED_CODES):
+    """
+    Runs `forge build --json` in cwd (optionally limited to --contracts) and returns a BuildReport.
+    Output is captured in memory; solc's default-ignored warning codes are filtered like forge does.
+    """
+    command = [forge, "build", "--json"]
+    if contracts:
+        command += ["--contracts", contracts]
+    proc = get_process_manager().run_sync(command, cwd, timeout=timeout, max_output=FORGE_MAX_OUTPUT)
+    if proc.returncode is None or proc.timed_out:
+        message = f"forge build timed out after {timeout}s" if proc.timed_out else proc.stderr
+        return BuildReport(-1, [Diagnostic(None, None, None, None, "error", message)], proc.duration)
+    data = decode_json(proc.stdout)
+    if data is None:
+        # forge failed before solc ran (bad config, missing remapping, ...)
+        diagnostics = []
+        if proc.returncode != 0:
+            message = (proc.stderr or proc.stdout).strip() or f"forge exited with {proc.returncode}"
+            diagnostics.append(Diagnostic(None, None, None, None, "error", message))
+        return BuildReport(proc.returncode, diagnostics, proc.duration)
+    ignored = {str(code) for code in ignore_codes}
+    errors = [e for e in data.get("errors", []) if str(e.get("errorCode")) not in ignored]
+    return BuildReport(proc.returncode, parse_errors(errors, cwd), proc.duration)
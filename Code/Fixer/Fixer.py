@@ -0,0 +1,246 @@
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from Solidity.Solidity import mask
+
+ASSERT_RE = re.compile(r"(?<![\w.])assert\s*\(")
+USING_ADDRESS_RE = re.compile(r"^[ \t]*using\s+([\w.]+)\s+for\s+address(?:\s+payable)?\s*;[ \t]*\n?", re.M)
+CONSTANT_RE = re.compile(r"^([ \t]*[\w.\[\]]+(?:\s+(?:public|private|internal))?)\s+constant(?:\s+(public|private|internal))?(\s+\w+\s*=\s*)([^;]*);", re.M)
+IMPORT_RE = re.compile(r"""^([ \t]*import\s+(?:[^;'"]*?\s+from\s+)?)(["'])([^"']+)\2""", re.M)
+CHECKSUM_RE = re.compile(r'[Cc]orrect checksummed address:\s*"?(0x[0-9a-fA-F]{40})')
+HEX_ADDRESS_RE = re.compile(r"\b0x[0-9a-fA-F]{40}\b")
+# initialisers that are only known at deploy or call time
+RUNTIME_VALUE_RE = re.compile(r"\b(this|msg|block|tx|makeAddr|vm|new|gasleft|address\(this\))\b")
+
+
+@dataclass
+class FixContext:
+    """Where a test file will be compiled from: the project root and the folder of the test."""
+
+    root: str
+    test_dir: str
+    index: object = None
+
+    def source_files(self):
+        # project sources by file name, for re-resolving broken relative imports
+        if self.index is None:
+            from ProjectIndex.ProjectIndex import get_index
+            self.index = get_index(self.root).refresh()
+        by_name = {}
+        for key in self.index.files:
+            path = key if os.path.isabs(key) else os.path.join(self.root, key)
+            by_name.setdefault(os.path.basename(path), []).append(path)
+        return by_name
+
+
+@dataclass
+class Rule:
+    name: str
+    codes: tuple  # solc error codes this rule repairs
+    fix: Callable  # (code, context, diagnostics or None) -> (code, number of rewrites)
+    description: str = ""
+
+
+@dataclass
+class FixResult:
+    filename: str
+    code: str
+    fired: dict = field(default_factory=dict)  # rule name -> number of rewrites
+    duration: float = 0.0
+
+    @property
+    def changed(self):
+        return bool(self.fired)
+
+
+def error_lines(diagnostics):
+    return {d.line for d in diagnostics or [] if d.line is not None}
+
+
+def line_of(code, offset):
+    return code.count("\n", 0, offset) + 1
+
+
+def depth_at(masked, offset):
+    # brace depth at offset of code with strings and comments blanked: 0 at file level, 1 in a contract body
+    return masked.count("{", 0, offset) - masked.count("}", 0, offset)
+
+
+def call_arguments(masked, open_paren):
+    """(offsets of the top-level commas, offset of the closing paren) of the call opened at open_paren."""
+    depth = 0
+    commas = []
+    for position in range(open_paren, len(masked)):
+        char = masked[position]
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+            if depth == 0:
+                return commas, position
+        elif char == "," and depth == 1:
+            commas.append(position)
+    return commas, None
+
+
+def fix_assert_message(code, context, diagnostics=None):
+    # assert(cond, "msg") does not exist in Solidity; forge-std's assertTrue(cond, "msg") does
+    lines = error_lines(diagnostics)
+    masked = mask(code)
+    out = []
+    position = 0
+    count = 0
+    for match in ASSERT_RE.finditer(masked):
+        if diagnostics is not None and line_of(code, match.start()) not in lines:
+            continue
+        commas, close = call_arguments(masked, match.end() - 1)
+        if close is None or len(commas) != 1:
+            continue
+        out.append(code[position:match.start()] + "assertTrue")
+        position = match.start() + len("assert")
+        count += 1
+    out.append(code[position:])
+    return "".join(out), count
+
+
+def fix_using_for_address(code, context, diagnostics=None):
+    # `using Lib for address;` only compiles when Lib is imported; generated tests rarely need it
+    lines = error_lines(diagnostics)
+    imports = " ".join(match.group(0) for match in IMPORT_RE.finditer(code))
+    count = 0
+
+    def drop(match):
+        nonlocal count
+        library = match.group(1).split(".")[-1]
+        if diagnostics is not None:
+            if line_of(code, match.start()) not in lines:
+                return match.group(0)
+        elif re.search(rf"\b{re.escape(library)}\b", imports) or \
+                re.search(rf"\b(library|contract)\s+{re.escape(library)}\b", code):
+            return match.group(0)
+        count += 1
+        return ""
+
+    return USING_ADDRESS_RE.sub(drop, code), count
+
+
+def fix_runtime_constant(code, context, diagnostics=None):
+    # `address constant x = address(this);` and the like become immutable-free state variables
+    lines = error_lines(diagnostics)
+    masked = mask(code)
+    count = 0
+
+    def demote(match):
+        nonlocal count
+        if depth_at(masked, match.start()) < 1:
+            return match.group(0)  # file-level constants cannot be state variables
+        if diagnostics is not None:
+            if line_of(code, match.start()) not in lines:
+                return match.group(0)
+        elif not RUNTIME_VALUE_RE.search(mask(match.group(4))):
+            return match.group(0)
+        count += 1
+        visibility = match.group(2)
+        return match.group(1) + (" " + visibility if visibility else "") + match.group(3) + match.group(4) + ";"
+
+    return CONSTANT_RE.sub(demote, code), count
+
+
+def fix_import_paths(code, context, diagnostics=None):
+    # relative imports that do not resolve from test/ are pointed at the project file with that name
+    lines = error_lines(diagnostics)
+    by_name = None
+    count = 0
+
+    def repoint(match):
+        nonlocal by_name, count
+        path = match.group(3)
+        if not path.startswith(".") or (diagnostics is not None and line_of(code, match.start()) not in lines):
+            return match.group(0)
+        if os.path.isfile(os.path.normpath(os.path.join(context.test_dir, path))):
+            return match.group(0)
+        if by_name is None:
+            by_name = context.source_files()
+        candidates = by_name.get(os.path.basename(path), [])
+        if len(candidates) != 1:
+            return match.group(0)
+        fixed = os.path.relpath(candidates[0], context.test_dir)
+        fixed = fixed if fixed.startswith(".") else "./" + fixed
+        count += 1
+        return match.group(1) + match.group(2) + fixed + match.group(2)
+
+    return IMPORT_RE.sub(repoint, code), count
+
+
+def fix_address_checksum(code, context, diagnostics=None):
+    # solc prints the checksummed spelling in the error, so this rule only runs after a compile
+    if diagnostics is None:
+        return code, 0
+    lines = code.split("\n")
+    count = 0
+    for diagnostic in diagnostics:
+        correct = CHECKSUM_RE.search(diagnostic.message or str(diagnostic))
+        if correct is None or diagnostic.line is None or diagnostic.line > len(lines):
+            continue
+        line = lines[diagnostic.line - 1]
+        fixed = HEX_ADDRESS_RE.sub(lambda m: correct.group(1) if m.group().lower() == correct.group(1).lower() else m.group(), line)
+        if fixed != line:
+            lines[diagnostic.line - 1] = fixed
+            count += 1
+    return "\n".join(lines), count
+
+
+RULES = [
+    Rule("assert-with-message", ("6160",), fix_assert_message,
+         'assert(cond, "msg") -> assertTrue(cond, "msg")'),
+    Rule("using-for-address", ("7920",), fix_using_for_address,
+         "drop `using Lib for address;` when Lib is not imported"),
+    Rule("runtime-constant", ("8349",), fix_runtime_constant,
+         "drop `constant` from variables initialised with runtime values"),
+    Rule("import-path", ("6275",), fix_import_paths,
+         "re-point relative imports that do not resolve from test/"),
+    Rule("address-checksum", ("9429",), fix_address_checksum,
+         "replace address literals with the checksummed spelling solc suggests"),
+]
+
+
+class Fixer:
+    """
+    Rule-based rewrites for the compile errors generated tests make over and over, applied in
+    milliseconds and without a model. Before compiling, every rule rewrites the patterns it
+    knows never compile. After a failed compile, fix_errors() runs only the rules whose solc
+    error codes were reported, limited to the reported lines. Results name the rules that fired.
+    """
+
+    def __init__(self, root, test_dir=None, rules=RULES):
+        self.context = FixContext(os.path.abspath(root), os.path.abspath(test_dir or os.path.join(root, "test")))
+        self.rules = rules
+
+    def fix_code(self, code, filename="", diagnostics=None):
+        start = time.monotonic()
+        fired = {}
+        for rule in self.rules:
+            selected = None
+            if diagnostics is not None:
+                selected = [d for d in diagnostics if d.is_error and str(d.code) in rule.codes]
+                if not selected:
+                    continue
+            code, count = rule.fix(code, self.context, selected)
+            if count:
+                fired[rule.name] = count
+        return FixResult(filename, code, fired, time.monotonic() - start)
+
+    def fix_errors(self, code, diagnostics, filename=""):
+        return self.fix_code(code, filename, list(diagnostics))
+
+    def fix_file(self, path, diagnostics=None):
+        with open(path, "r") as file:
+            code = file.read()
+        result = self.fix_code(code, os.path.basename(path), diagnostics)
+        if result.changed:
+            with open(path, "w") as file:
+                file.write(result.code)
+        return result
@@ -1,8 +1,19 @@
-import subprocess
+import hashlib
+import json
 import os
 import shutil
 import zipfile
 
+from Diagnostics.Diagnostics import BuildReport, forge_build
+from Process.Process import get_process_manager
+from TestRunner.TestRunner import TestRunner
+from WorkspacePool.WorkspacePool import clear_folder, forge_binary, get_workspace_pool
+
+BUILD_STATE_FILE = ".build_state.json"
+BUILD_INPUT_DIRS = ["src", "test"]
+BUILD_INPUT_FILES = ["foundry.toml", "remappings.txt"]
+EXTRA_REMAPPINGS = ["openzeppelin/contracts/=lib/openzeppelin-contracts/contracts/"]
+
 class Foundry:
     def __init__(self):
         self.current_dir=os.getcwd()
@@ -13,65 +24,131 @@ class Foundry:
         return os.path.isdir(directory_path)
 
     @staticmethod
-    def run_subprocess(cmd, base_directory):
-        try:
-            subprocess.run(cmd, shell=True, check=True)
-            print(f"Command '{cmd}' executed successfully in {base_directory}.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error executing command: {e}")
+    def run_subprocess(cmd, base_directory, timeout=600):
+        """Runs cmd (an argument list, no shell) in base_directory and returns its ProcessResult."""
+        result = get_process_manager().run_sync(cmd, base_directory, timeout=timeout)
+        if result.ok:
+            print(f"Command '{' '.join(cmd)}' executed successfully in {base_directory}.")
+        else:
+            print(f"Error executing command '{' '.join(cmd)}': {result.describe()}\n{result.stderr.strip()}")
+        return result
 
     def create_foundry(self):
-        current_dir = self.current_dir
-        self.run_subprocess("forge init FoundryProject --no-commit", current_dir)
-        foundry_path = os.path.join(current_dir, "FoundryProject")
-        self.run_subprocess("rm -rf src/*", foundry_path)
-        self.run_subprocess("rm -rf test/*", foundry_path)
+        # built from the cached template: forge-std is linked, not re-downloaded by forge init
+        foundry_path = os.path.join(self.current_dir, "FoundryProject")
+        get_workspace_pool().materialize(foundry_path)
 
     def clear_foundry(self):
-        current_dir = self.current_dir
-        foundry_path = os.path.join(current_dir, "FoundryProject")
-        os.chdir(current_dir)
-        self.run_subprocess("rm -r Output/*", foundry_path)
-        os.chdir(foundry_path)
-        self.run_subprocess("rm -r src/*", foundry_path)
-        self.run_subprocess("rm -r test/*", foundry_path)
-        os.chdir(current_dir)
+        foundry_path = os.path.join(self.current_dir, "FoundryProject")
+        clear_folder(os.path.join(self.current_dir, "Output"))
+        clear_folder(os.path.join(foundry_path, "src"))
+        clear_folder(os.path.join(foundry_path, "test"))
 
     def auto_remappings(self):
-        current_dir = self.current_dir
-        foundry_path = os.path.join(current_dir, "FoundryProject")
-        os.chdir(foundry_path)
-        self.run_subprocess("forge remappings > remappings.txt", foundry_path)
-        self.run_subprocess("echo 'openzeppelin/contracts/=lib/openzeppelin-contracts/contracts/' >> remappings.txt", foundry_path)
-        os.chdir(current_dir)
+        foundry_path = os.path.join(self.current_dir, "FoundryProject")
+        result = self.run_subprocess([forge_binary(), "remappings"], foundry_path)
+        if not result.ok:
+            return
+        with open(os.path.join(foundry_path, "remappings.txt"), "w") as file:
+            file.write(result.stdout)
+            file.write("".join(line + "\n" for line in EXTRA_REMAPPINGS))
 
     def clear_test(self):
-        current_dir = self.current_dir
-        foundry_path = os.path.join(current_dir, "FoundryProject")
-        os.chdir(foundry_path)
-        self.run_subprocess("rm -r test/*", foundry_path)
-        os.chdir(current_dir)
+        clear_folder(os.path.join(self.current_dir, "FoundryProject", "test"))
 
     @staticmethod
     def create_src(uploaded_zip, foundry_path):
         with zipfile.ZipFile(uploaded_zip, 'r') as zf:
             zf.extractall(foundry_path)
 
-    def forge_build(self):
-        current_dir = self.current_dir
-        base_directory = os.path.join(current_dir, "FoundryProject")
-        os.chdir(base_directory)
-        self.run_subprocess("forge build 2>&1 | sed -r 's/\x1B\[[0-9;]*[mK]//g' > ../Output/build_output.txt", base_directory)
-        os.chdir(current_dir)
-        with open(os.path.join(current_dir, "Output/build_output.txt"), "r") as file:
-            return file.read()
+    @staticmethod
+    def sync_src(uploaded_zip, foundry_path):
+        """
+        Applies an uploaded zip to foundry_path file by file: only new or changed files are
+        written and files missing from the zip are deleted, so untouched sources keep their
+        mtimes and forge's cache/ and out/ stay valid for them.
+        Returns {"added": [...], "changed": [...], "removed": [...]}.
+        """
+        changes = {"added": [], "changed": [], "removed": []}
+        root = os.path.abspath(foundry_path)
+        os.makedirs(root, exist_ok=True)
+        uploaded = set()
+        with zipfile.ZipFile(uploaded_zip, 'r') as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                target = os.path.normpath(os.path.join(root, info.filename))
+                if not target.startswith(root + os.sep):
+                    continue
+                uploaded.add(target)
+                data = zf.read(info)
+                try:
+                    with open(target, "rb") as file:
+                        if file.read() == data:
+                            continue
+                    changes["changed"].append(os.path.relpath(target, root))
+                except FileNotFoundError:
+                    changes["added"].append(os.path.relpath(target, root))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as file:
+                    file.write(data)
+        for folder, _, filenames in os.walk(root, topdown=False):
+            for filename in filenames:
+                path = os.path.join(folder, filename)
+                if path not in uploaded:
+                    os.remove(path)
+                    changes["removed"].append(os.path.relpath(path, root))
+            if folder != root and not os.listdir(folder):
+                os.rmdir(folder)
+        print(f"Synced {foundry_path}: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+              f"{len(changes['removed'])} removed.")
+        return changes
 
-    def forge_test(self):
+    @staticmethod
+    def build_fingerprint(base_directory):
+        # content hash of everything forge build reads from the project itself
+        digest = hashlib.sha256()
+        paths = [os.path.join(base_directory, name) for name in BUILD_INPUT_FILES]
+        for name in BUILD_INPUT_DIRS:
+            for folder, _, filenames in os.walk(os.path.join(base_directory, name)):
+                paths.extend(os.path.join(folder, filename) for filename in filenames)
+        for path in sorted(paths):
+            if not os.path.isfile(path):
+                continue
+            digest.update(os.path.relpath(path, base_directory).encode("utf-8") + b"\0")
+            with open(path, "rb") as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+        return digest.hexdigest()
+
+    def forge_build(self):
+        """Builds FoundryProject and returns a BuildReport with the compiler's structured diagnostics."""
         current_dir = self.current_dir
         base_directory = os.path.join(current_dir, "FoundryProject")
-        os.chdir(base_directory)
-        self.run_subprocess("forge test", base_directory)
-        os.chdir(current_dir)
+        state_path = os.path.join(base_directory, BUILD_STATE_FILE)
+        fingerprint = self.build_fingerprint(base_directory)
+        try:
+            with open(state_path, "r") as file:
+                state = json.load(file)
+            if state.get("fingerprint") == fingerprint and os.path.isdir(os.path.join(base_directory, "out")):
+                print("Project unchanged since the last build, skipping forge build.")
+                return BuildReport.from_dict(state["report"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        report = forge_build(base_directory)
+        print(f"forge build finished in {report.duration:.1f}s with {len(report.errors)} errors.")
+        with open(state_path, "w") as file:
+            json.dump({"fingerprint": fingerprint, "report": report.to_dict()}, file)
+        return report
+
+    def forge_test(self, workers=None, timeout=600):
+        """Runs every suite under test/ in parallel and returns (run id, [TestRecord])."""
+        base_directory = os.path.join(self.current_dir, "FoundryProject")
+        test_folder = os.path.join(base_directory, "test")
+        test_paths = sorted(os.path.join(test_folder, name) for name in os.listdir(test_folder) if name.endswith(".t.sol"))
+        runner = TestRunner(base_directory, workers=workers, timeout=timeout)
+        run_id, records = runner.run(test_paths)
+        print(f"forge test run {run_id}: {runner.summary(records)}")
+        return run_id, records
 
     def delete_foundry(self):
         current_dir = self.current_dir
@@ -1,14 +1,22 @@
 
 import os
-import re
-import streamlit as st
+import threading
+import time
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import GoogleGenerativeAI
 from Prompts import prompts
-from solidity_parser import parser
+from Prompts.retriever import get_retriever
+from Backends.Backends import get_backend, recording
+from ResponseCache.ResponseCache import ResponseCache
+from Manifest.Manifest import GenerationManifest
+from Pipeline.Pipeline import PromptChainPipeline
+from InvariantGenerator.StreamExtractor import SolidityStreamExtractor, continuation_prompt, finish_reason
+from ProjectIndex.ProjectIndex import get_index
+from ReferenceContext.ReferenceContext import ReferenceContextBuilder
+from Prompts.tokens import count_tokens as count_model_tokens
+from Telemetry.Telemetry import Telemetry
+from Fixer.Fixer import Fixer
+from Sharder.Sharder import Sharder, merge
 import base64
-import tiktoken
 from zipfile import ZipFile
 
 
@@ -18,29 +26,37 @@ os.environ["OPENAI_API_KEY"] = "Your OPENAI API Key"
 
 
 class InvariantGenerator:
-    def __init__(self, absolute_path, contracts_file_name,llmmodel):
+    def __init__(self, absolute_path, contracts_file_name,llmmodel,use_cache=None,output_dir=None):
         self.absolute_path = absolute_path
+        self.output_dir = output_dir or os.path.join(absolute_path, 'test')
+        self.temperature = 0
 
         self.contracts_file_name = contracts_file_name
-        if llmmodel=="gpt-3.5":
-            self.modelname= "gpt-3.5"
-            self.model = ChatOpenAI(model_name="gpt-3.5-turbo-0125", temperature=0)
-        elif llmmodel=="gpt-4":
-            self.modelname= "gpt-4"
-            self.model = ChatOpenAI(model_name="gpt-4o", temperature=0,max_tokens=4096)
-        elif llmmodel=="gemini-1.0-pro":
-            self.modelname= "gemini-1.0"
-            self.model = GoogleGenerativeAI(model="gemini-1.0-pro", temperature=0,request_timeout=3600)
-        else:
-            self.modelname= "gemini-1.5"
-            self.model = GoogleGenerativeAI(model="gemini-1.5-pro-latest", temperature=0,request_timeout=3600)
+        self.backend = get_backend(llmmodel)
+        self.modelname = self.backend.family
+        self.model_id = self.backend.model_id
+        self.provider = self.backend.provider
+        self.model = self.backend.create(self.temperature)
+        if os.environ.get("INVARIANT_RECORD_DIR"):
+            self.model = recording(self.model, os.environ["INVARIANT_RECORD_DIR"])
         self.chain = PromptTemplate.from_template("{fewshot}") | self.model
         self.strength_chain = PromptTemplate.from_template("{strengthprompt}") | self.model
         self.soundness_chain = PromptTemplate.from_template("{soundnessprompts}") | self.model
+        self.cache = ResponseCache(enabled=use_cache)
+        self.telemetry = Telemetry(self.backend, self.count_tokens)
         self.folder_path = os.path.join(self.absolute_path, self.contracts_file_name)
+        self.index = get_index(self.absolute_path)
+        self.references = ReferenceContextBuilder(self.index, self.modelname)
+        self.fixer = Fixer(self.absolute_path)
+        self.fixes = {}
+        self.sharder = Sharder(self.count_tokens, self.backend.max_output_tokens, self.backend.prompt_budget,
+                               int(os.environ.get("INVARIANT_SHARD_FUNCTIONS", 0)) or None)
+        self.shard_outputs = {}
+        self.shard_lock = threading.Lock()
         self.contracts = self.read_smart_contracts(self.folder_path)
 
-    def read_smart_contracts(self, folder_path):
+    @staticmethod
+    def read_smart_contracts(folder_path):
         contract_list = []
         print(os.listdir(folder_path))
         print("Reading")
@@ -49,31 +65,43 @@ class InvariantGenerator:
                 contract_data = {}
                 with open(os.path.join(folder_path, filename), "r") as file:
                     contract_data["filename"] = filename
+                    contract_data["path"] = os.path.join(folder_path, filename)
                     contract_data["code"] = file.read()
                     contract_list.append(contract_data)
         return contract_list
 
-    def zip_folder(self,folder_path, zip_path):
+    @staticmethod
+    def zip_folder(folder_path, zip_path):
         with ZipFile(zip_path, 'w') as zipf:
             for root, _, files in os.walk(folder_path):
                 for file in files:
                     file_path = os.path.join(root, file)
                     zipf.write(file_path, os.path.relpath(file_path, folder_path))
 
-    def get_base64_of_bin_file(self,bin_file):
+    @staticmethod
+    def get_base64_of_bin_file(bin_file):
         with open(bin_file, 'rb') as f:
             data = f.read()
         return base64.b64encode(data).decode()
 
     def view_test_contract(self):
-        self.zip_folder(os.path.join(self.absolute_path, 'test'), os.path.join(self.absolute_path, 'test.zip'))
-        # st.markdown(f"### [Download Test Invariants]({os.path.join(self.absolute_path, 'test.zip')})")
-        zip_base64 = self.get_base64_of_bin_file(os.path.join(self.absolute_path, 'test.zip'))
+        self.view_tests(self.output_dir)
+
+    @staticmethod
+    def view_tests(output_dir):
+        # a static method so the UI can show a finished job's tests without keeping its generator
+        import streamlit as st  # only the UI needs streamlit; the CLI and workers must not import it
+
+        # the zip sits next to the output folder, which outlives a recycled job workspace
+        zip_path = os.path.join(os.path.dirname(os.path.normpath(output_dir)), 'test.zip')
+        InvariantGenerator.zip_folder(output_dir, zip_path)
+        # st.markdown(f"### [Download Test Invariants]({zip_path})")
+        zip_base64 = InvariantGenerator.get_base64_of_bin_file(zip_path)
 
         # Display download link
         st.markdown(f'<a href="data:application/zip;base64,{zip_base64}" download="output.zip">Download zip file</a>',
                     unsafe_allow_html=True)
-        contracts=self.read_smart_contracts(os.path.join(self.absolute_path, 'test'))
+        contracts=InvariantGenerator.read_smart_contracts(output_dir)
         for contract in contracts:
             st.text(contract["filename"])
             st.code(contract["code"])
@@ -84,40 +112,175 @@ class InvariantGenerator:
 
 
     def write_smart_contracts(self, folder_path, contracts):
+        os.makedirs(folder_path, exist_ok=True)
         for contract in contracts:
             filename = contract["filename"]
             code = contract["code"]
             with open(os.path.join(folder_path, filename), "w") as file:
                 file.write(code)
 
-    def find_references(self,code):
-        parsed=False
-        referencecontracts=""
-        try:
-            ast = parser.parse(code)
-            parsed = True
-            ast_obj = parser.objectify(ast)
-            for i in ast_obj.imports:
-                path = i["path"].replace("'", "")
-                if os.path.exists(os.path.join(self.folder_path, path)):
-
-                    with open(os.path.join(self.folder_path, path), "r") as file:
-                        referencecontracts += i["path"] + ":\n" + file.read() + "\n\n"
-        except Exception as e:
-            (e)
-        if not parsed:
-            try:
-                code = self.extract_pre_contract(code)
-                ast = parser.parse(code)
-                ast_obj = parser.objectify(ast)
-                for i in ast_obj.imports:
-                    path = i["path"].replace("'", "")
-                    if os.path.exists(os.path.join(self.folder_path, path)):
-                        with open(os.path.join(self.folder_path, path), "r") as file:
-                            referencecontracts += i["path"] + ":\n" + file.read() + "\n\n"
-            except Exception as e:
-               (e)
-        return referencecontracts
+    def reference_paths(self,code,path=None):
+        # (import path as written, resolved file path) for every transitive import found in the project index
+        return [(importpath, resolved) for importpath, resolved, _ in self.references.files(code, path, self.folder_path)]
+
+    def find_references(self,code,path=None):
+        return self.references.build(code, path, self.folder_path)
+
+    def count_tokens(self, text):
+        return count_model_tokens(text, self.modelname)
+
+    def run_batch(self, prompt_list, max_concurrency=None):
+        # Serve repeated prompts from the response cache and only send the misses to the model.
+        results = [None] * len(prompt_list)
+        pending = {}
+        for i, p in enumerate(prompt_list):
+            cached = self.cache.get(self.model_id, self.temperature, p["fewshot"])
+            if cached is not None:
+                results[i] = cached
+                self.telemetry.observe(p.get("contract", ""), "llm_call", step=1, cached=True,
+                                       input_tokens=self.count_tokens(p["fewshot"]), output_tokens=self.count_tokens(cached))
+            else:
+                pending.setdefault(p["fewshot"], []).append(i)
+
+        if pending:
+            texts = list(pending.keys())
+            started = time.time()
+            res = self.chain.batch([{"fewshot": t} for t in texts], config={"max_concurrency": max_concurrency or self.backend.batch_size})
+            # a batch has no per-request timing, so every request is charged the batch's wall time
+            latency = time.time() - started
+            for text, r in zip(texts, res):
+                content = r if isinstance(r, str) else r.content
+                self.cache.put(self.model_id, self.temperature, text, content)
+                for i in pending[text]:
+                    results[i] = content
+                self.telemetry.observe(prompt_list[pending[text][0]].get("contract", ""), "llm_call", step=1,
+                                       started=started, latency=latency,
+                                       input_tokens=self.count_tokens(text), output_tokens=self.count_tokens(content))
+
+        print("Response cache:", self.cache.stats())
+        return results
+
+    async def ainvoke_model(self, prompttext):
+        response = await self.chain.ainvoke({"fewshot": prompttext})
+        return response if isinstance(response, str) else response.content
+
+    async def astream_model(self, prompttext, max_continuations=2):
+        # reads the token stream only until the Solidity block closes; a reply cut off at
+        # max_tokens is continued from where it stopped instead of being thrown away
+        code = ""
+        prompt = prompttext
+        for attempt in range(max_continuations + 1):
+            extractor = SolidityStreamExtractor()
+            reason = None
+            async for chunk in self.chain.astream({"fewshot": prompt}):
+                extractor.feed(chunk if isinstance(chunk, str) else chunk.content)
+                reason = finish_reason(chunk) or reason
+                if extractor.done:
+                    break
+            # the continuation picks up mid-line or even mid-token, so the pieces are joined as they are
+            code += extractor.code(strip=False)
+            if not extractor.truncated(reason, code):
+                break
+            print(f"Response cut off after {len(code)} characters, continuing ({attempt + 1}/{max_continuations}).")
+            prompt = continuation_prompt(prompttext, code)
+        return "```solidity\n" + code.strip() + "\n```"
+
+    def extract_test(self, t, response):
+        with self.telemetry.stage(t["filename"], "extraction") as record:
+            extractedcode = self.extract_code(response)
+            record.output_tokens = self.count_tokens(extractedcode)
+        # known model mistakes are rewritten before the test is ever compiled
+        with self.telemetry.stage(t["filename"], "fix"):
+            fix = self.fixer.fix_code(extractedcode, t["filename"].replace(".sol", ".t.sol"))
+        if fix.changed:
+            self.fixes[fix.filename] = fix.fired
+            print(f"Fixed {fix.filename}: {fix.fired}")
+        return fix.code
+
+    def shard_contracts(self, contracts):
+        # contracts too large for one response become one generation unit per group of functions
+        units = []
+        for t in contracts:
+            with self.telemetry.stage(t["filename"], "shard"):
+                summary = self.index.get(t["path"]) if "path" in t else self.index.summarize_code(t["code"])
+                shards = self.sharder.split(t["filename"], t["code"], summary, t["contract_name"])
+            if not shards:
+                units.append(t)
+                continue
+            print(f"Sharding {t['filename']} into {len(shards)} parts:", [len(shard.functions) for shard in shards])
+            self.shard_outputs.pop(t["filename"], None)
+            for shard in shards:
+                units.append(dict(t, filename=shard.filename, code=shard.code, shard=shard, parent=t,
+                                  focus=prompts.shard_focus(shard.functions, shard.index, shard.count)))
+        return units
+
+    def finish_test(self, t, code):
+        """(contract, test code) once its test is complete; for a shard that is when the last of its parts arrives."""
+        shard = t.get("shard")
+        if shard is None:
+            return t, code
+        with self.shard_lock:
+            outputs = self.shard_outputs.setdefault(shard.parent, {})
+            outputs[shard.index] = code
+            if len(outputs) < shard.count:
+                return None, None
+            codes = [outputs[i] for i in sorted(outputs)]
+            del self.shard_outputs[shard.parent]
+        with self.telemetry.stage(shard.parent, "merge") as record:
+            merged = merge(codes)
+            record.output_tokens = self.count_tokens(merged.code)
+        print(f"Merged {merged.shards}/{shard.count} parts of {shard.parent}: "
+              f"{merged.duplicates} duplicate members dropped, renamed {merged.renamed}")
+        return t["parent"], merged.code
+
+    def record_failures(self, pipeline, contracts):
+        # failures are reported per contract; a failed shard fails the contract it belongs to
+        by_name = {t["filename"]: t.get("parent", t)["filename"] for t in contracts}
+        for name, error in pipeline.failures.items():
+            self.failed[by_name.get(name, name)] = f"{type(error).__name__}: {error}"
+
+    def stream_tests(self, contracts, prompt_list, max_concurrency, on_test_ready=None):
+        # one single-stage pipeline per batch: every test is written as soon as its own stream ends
+        prompts_by_file = {t["filename"]: p["fewshot"] for t, p in zip(contracts, prompt_list)}
+
+        def save_test(i, t, response):
+            t, extractedcode = self.finish_test(t, self.extract_test(t, response))
+            if t is None:
+                return
+            name = t["filename"].replace(".sol", ".t.sol")
+            self.write_smart_contracts(self.output_dir, [{"filename": name, "code": extractedcode}])
+            if on_test_ready is not None:
+                on_test_ready(t, os.path.join(self.output_dir, name))
+
+        pipeline = PromptChainPipeline(
+            [lambda t, _: prompts_by_file[t["filename"]]],
+            self.astream_model,
+            self.backend.limits(),
+            max_concurrency=max_concurrency,
+            count_tokens=self.count_tokens,
+            cache_get=lambda text: self.cache.get(self.model_id, self.temperature, text),
+            cache_put=lambda text, response: self.cache.put(self.model_id, self.temperature, text, response),
+            on_stage=save_test,
+            telemetry=self.telemetry,
+            max_retries=2,
+        )
+        pipeline.run(contracts)
+        self.record_failures(pipeline, contracts)
+        print("Response cache:", self.cache.stats())
+
+    def save_tests(self, contracts, responses, on_test_ready=None):
+        output_contracts = []
+        finished = []
+        for t, response in zip(contracts, responses):
+            t, extractedcode = self.finish_test(t, self.extract_test(t, response))
+            if t is None:
+                continue
+            finished.append(t)
+            output_contracts.append({"filename": t["filename"].replace(".sol", ".t.sol"), "code": extractedcode})
+        self.write_smart_contracts(self.output_dir, output_contracts)
+        if on_test_ready is not None:
+            for t, output in zip(finished, output_contracts):
+                on_test_ready(t, os.path.join(self.output_dir, output["filename"]))
 
     def extract_code(self, input_string):
         code_start = input_string.find("```solidity")
@@ -156,12 +319,16 @@ class InvariantGenerator:
         return '\n'.join(pre_contract_lines)
 
 
-    def process_contracts(self, custom_invariants,prompt_technique,selected_files):
+    def process_contracts(self, custom_invariants,prompt_technique,selected_files,incremental=False,max_concurrency=8,stream=False,on_test_ready=None,telemetry_dir=None,shard=False):
+        # stream=True writes each .t.sol as soon as its response completes and calls
+        # on_test_ready(contract, test_path) for it, e.g. to start compiling right away.
+        # shard=True generates large contracts in parallel parts of a few functions each and
+        # merges them into one .t.sol (zero-shot and few-shot; a chain already splits the work).
+        # Per-stage telemetry is kept in self.telemetry and exported to telemetry_dir
+        # (or $INVARIANT_TELEMETRY_DIR) as telemetry.jsonl and telemetry.prom.
         chain_prompts = []
         tempcontracts = []
-        encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-        input_token_count=0
-        output_token_count=0
+        self.telemetry = Telemetry(self.backend, self.count_tokens)
 
 
         # for contract in [self.contracts[33]]:
@@ -172,164 +339,138 @@ class InvariantGenerator:
             if contract["filename"] in custom_invariants:
                 custom_invariant = "\nAlso make some custom test invariants whose detail is as follow:\n"+custom_invariants[contract["filename"]]+"\n\n"
             contract_name = contract["filename"].split(".")[0]
-            referencecontracts=""
-            parsed=False
-            try:
-                ast=parser.parse(contract["code"])
-                parsed = True
-                ast_obj = parser.objectify(ast)
-                contract_name = (list(ast_obj.contracts.keys()))[0]
-                pragma=ast_obj.pragmas[0]["value"]
-                referencecontracts=self.find_references(contract["code"])
-
-            except Exception as e:
-                print(e)
-            if not parsed:
-                try:
-                    code=self.extract_pre_contract(contract["code"])
-                    ast = parser.parse(code)
-                    ast_obj = parser.objectify(ast)
-                    pragma = ast_obj.pragmas[0]["value"]
-                    referencecontracts=self.find_references(code)
-                except Exception as e:
-                    version_match = re.search(r'pragma\s+solidity\s+(.*?);', contract["filename"])
-                    pragma = version_match.group() if version_match else "pragma solidity ^0.8.0;"
-                    print(e)
+            summary = self.index.get(contract["path"]) if "path" in contract else self.index.summarize_code(contract["code"])
+            if summary and summary["contracts"]:
+                contract_name = summary["contracts"][0]["name"]
+            solidity_pragmas = [p["value"] for p in (summary or {}).get("pragmas", []) if p["name"] == "solidity"]
+            pragma = solidity_pragmas[0] if solidity_pragmas else "^0.8.0"
+            with self.telemetry.stage(contract["filename"], "reference_resolution") as record:
+                referencecontracts=self.find_references(contract["code"],contract.get("path"))
+                record.output_tokens=self.count_tokens(referencecontracts)
 
             tempcontracts[-1]["pragma"]=pragma
             tempcontracts[-1]["contract_name"]=contract_name
             tempcontracts[-1]["referencecontracts"]=referencecontracts
             tempcontracts[-1]["custom_invariant"]=custom_invariant
 
+        self.skipped = []
+        self.failed = {}
+        manifest = GenerationManifest(os.path.join(self.absolute_path, ".invariant_manifest.json"))
+        for t in tempcontracts:
+            t["manifest_key"] = os.path.join(self.contracts_file_name, t["filename"])
+            t["manifest_entry"] = manifest.make_entry(t["code"], [path for _, path in self.reference_paths(t["code"], t.get("path"))],
+                                                      prompt_technique, self.model_id, t["custom_invariant"], self.absolute_path)
+        if incremental:
+            changed = [t for t in tempcontracts
+                       if not manifest.is_fresh(t["manifest_key"], t["manifest_entry"],
+                                                os.path.join(self.output_dir, t["filename"].replace(".sol", ".t.sol")))]
+            print(f"Incremental: {len(tempcontracts) - len(changed)} up to date, {len(changed)} to regenerate.")
+            self.skipped = [t["filename"] for t in tempcontracts if t not in changed]
+            tempcontracts = changed
+            if not tempcontracts:
+                self.generated = []
+                return True
+
         self.contracts = tempcontracts
+        units = self.shard_contracts(tempcontracts) if shard and prompt_technique != "Prompt chaining" else tempcontracts
 
         if prompt_technique=="Prompt chaining":
-            prompt1=[]
-            for i,t in enumerate(tempcontracts):
-                prompttext = prompts.promptchain_1(t["code"],t["referencecontracts"])
-                prompt1.append({"fewshot": prompttext})
-
-            res1 = (self.chain.batch(prompt1))
-            if not (type(res1[0]) == type("a")):
-                for i in range(len(res1)):
-                    res1[i] = res1[i].content
-
-            print("Contract functionalities generated.")
-
-            output_contracts=[]
-
-            # saving first resonse in the files
-            for i in range(len(res1)):
-                extractedcode=res1[i]
-                name = self.contracts[i]["filename"].replace(".sol", "1.txt")
-                output_contracts.append({"filename": name, "code": extractedcode})
-                # output_token_count+=len(encoding.encode(extractedcode))
-
-            self.write_smart_contracts(os.path.join(self.absolute_path, 'test'), output_contracts)
-
-            prompt2=[]
-            for i, t in enumerate(tempcontracts):
-                prompttext = prompts.promptchain_2(t["code"], t["referencecontracts"],res1[i])
-                prompt2.append({"fewshot": prompttext})
-
-            res2 = (self.chain.batch(prompt2))
-            if not (type(res2[0]) == type("a")):
-                for i in range(len(res2)):
-                    res2[i] = res2[i].content
-
-            print("Test invariants lists generated..")
-
-            output_contracts = []
-
-            # saving first resonse in the files
-            for i in range(len(res2)):
-                extractedcode = res2[i]
-                name = self.contracts[i]["filename"].replace(".sol", "2.txt")
-                output_contracts.append({"filename": name, "code": extractedcode})
-                # output_token_count+=len(encoding.encode(extractedcode))
-
-
-            self.write_smart_contracts(os.path.join(self.absolute_path, 'test'), output_contracts)
-
-            prompt3=[]
-            for i,t in enumerate(tempcontracts):
-                prompttext = prompts.promptchain_3(t["code"],t["pragma"], t["contract_name"] ,self.contracts_file_name,t["referencecontracts"],t["custom_invariant"],self.modelname,res2[i])
-                prompt3.append({"fewshot": prompttext})
-                input_token_count+=len(encoding.encode(prompttext))
-
-            output_contracts = []
-            ans = (self.chain.batch(prompt3))
-            if not (type(ans[0]) == type("a")):
-                for i in range(len(ans)):
-                    ans[i] = ans[i].content
-
-            for i in range(len(ans)):
-                extractedcode=self.extract_code(ans[i])
-                name = self.contracts[i]["filename"].replace(".sol", ".t.sol")
-                output_contracts.append({"filename": name, "code": extractedcode})
-                output_token_count+=len(encoding.encode(extractedcode))
-
-            self.write_smart_contracts(os.path.join(self.absolute_path, 'test'), output_contracts)
-            print("--------------------------------------------")
-            print("Total Input token: ",input_token_count)
-            print("Total Output token: ",output_token_count)
-            print("--------------------------------------------")
+            test_folder = self.output_dir
+
+            def stage_3(t, testprops):
+                with self.telemetry.stage(t["filename"], "prompt_build", step=3) as record:
+                    prompttext = prompts.promptchain_3(t["code"],t["pragma"], t["contract_name"] ,self.contracts_file_name,t["referencecontracts"],t["custom_invariant"],self.modelname,testprops)
+                    record.input_tokens = self.count_tokens(prompttext)
+                return prompttext
+
+            def save_stage(i, t, response):
+                # each contract's intermediate and final outputs are written as soon as its own stage completes
+                if i == 0:
+                    self.write_smart_contracts(test_folder, [{"filename": t["filename"].replace(".sol", "1.txt"), "code": response}])
+                    print(f"Contract functionalities generated for {t['filename']}.")
+                elif i == 1:
+                    self.write_smart_contracts(test_folder, [{"filename": t["filename"].replace(".sol", "2.txt"), "code": response}])
+                    print(f"Test invariants list generated for {t['filename']}.")
+                else:
+                    extractedcode = self.extract_test(t, response)
+                    self.write_smart_contracts(test_folder, [{"filename": t["filename"].replace(".sol", ".t.sol"), "code": extractedcode}])
+                    if on_test_ready is not None:
+                        on_test_ready(t, os.path.join(test_folder, t["filename"].replace(".sol", ".t.sol")))
+
+            pipeline = PromptChainPipeline(
+                [lambda t, _: prompts.promptchain_1(t["code"], t["referencecontracts"]),
+                 lambda t, functionalities: prompts.promptchain_2(t["code"], t["referencecontracts"], functionalities),
+                 stage_3],
+                [self.ainvoke_model, self.ainvoke_model, self.astream_model if stream else self.ainvoke_model],
+                self.backend.limits(),
+                max_concurrency=max_concurrency,
+                count_tokens=self.count_tokens,
+                cache_get=lambda text: self.cache.get(self.model_id, self.temperature, text),
+                cache_put=lambda text, response: self.cache.put(self.model_id, self.temperature, text, response),
+                on_stage=save_stage,
+                telemetry=self.telemetry,
+                max_retries=2,
+            )
+            pipeline.run(tempcontracts)
+            self.record_failures(pipeline, tempcontracts)
+            print("Response cache:", self.cache.stats())
         elif prompt_technique=="zero-shot":
             prompt1 = []
-            for i, t in enumerate(tempcontracts):
-                p1,p2,prompttext = prompts.zeroShot(t["code"], t["pragma"], t["contract_name"], self.contracts_file_name,
-                                                   t["referencecontracts"], t["custom_invariant"], self.modelname)
-                prompt1.append({"fewshot": prompttext})
-                input_token_count += len(encoding.encode(prompttext))
-
-            res1 = (self.chain.batch(prompt1))
-            if not (type(res1[0]) == type("a")):
-                for i in range(len(res1)):
-                    res1[i] = res1[i].content
-
-            output_contracts = []
-
-            # saving first resonse in the files
-            for i in range(len(res1)):
-                extractedcode = self.extract_code(res1[i])
-                name = self.contracts[i]["filename"].replace(".sol", ".t.sol")
-                output_contracts.append({"filename": name, "code": extractedcode})
-                output_token_count += len(encoding.encode(extractedcode))
-
-
-            self.write_smart_contracts(os.path.join(self.absolute_path, 'test'), output_contracts)
-            print("--------------------------------------------")
-            print("Total Input token: ",input_token_count)
-            print("Total Output token: ",output_token_count)
-            print("--------------------------------------------")
+            for i, t in enumerate(units):
+                with self.telemetry.stage(t["filename"], "prompt_build") as record:
+                    p1,p2,prompttext = prompts.zeroShot(t["code"], t["pragma"], t["contract_name"], self.contracts_file_name,
+                                                       t["referencecontracts"], t["custom_invariant"], self.modelname,
+                                                       t.get("focus", ""))
+                    record.input_tokens = self.count_tokens(prompttext)
+                prompt1.append({"fewshot": prompttext, "contract": t["filename"]})
+
+            if stream:
+                self.stream_tests(units, prompt1, max_concurrency, on_test_ready)
+            else:
+                res1 = self.run_batch(prompt1, max_concurrency)
+                # saving first resonse in the files
+                self.save_tests(units, res1, on_test_ready)
         elif prompt_technique=="few-shot":
             prompt1 = []
-            for i, t in enumerate(tempcontracts):
-                prompttext = prompts.solady_fewShot(t["code"], t["pragma"], t["contract_name"], self.contracts_file_name,
-                                              t["referencecontracts"], t["custom_invariant"], self.modelname)
-                prompt1.append({"fewshot": prompttext})
-                input_token_count += len(encoding.encode(prompttext))
-
-            res1 = (self.chain.batch(prompt1))
-            if not (type(res1[0]) == type("a")):
-                for i in range(len(res1)):
-                    res1[i] = res1[i].content
-
-            output_contracts = []
-
-            # saving first resonse in the files
-            for i in range(len(res1)):
-                extractedcode = self.extract_code(res1[i])
-                name = self.contracts[i]["filename"].replace(".sol", ".t.sol")
-                output_contracts.append({"filename": name, "code": extractedcode})
-                output_token_count += len(encoding.encode(extractedcode))
-
-            self.write_smart_contracts(os.path.join(self.absolute_path, 'test'), output_contracts)
-            print("--------------------------------------------")
-            print("Total Input token: ", input_token_count)
-            print("Total Output token: ", output_token_count)
-            print("--------------------------------------------")
-
+            # one batched retrieval for every contract, recorded once for the whole batch
+            with self.telemetry.stage("*", "example_retrieval"):
+                selected_examples = get_retriever().select_examples([t["code"] for t in tempcontracts],
+                                                                    [t["contract_name"] for t in tempcontracts])
+            # the parts of a sharded contract share its examples
+            examples = {t["filename"]: selected for t, selected in zip(tempcontracts, selected_examples)}
+            for i, t in enumerate(units):
+                with self.telemetry.stage(t["filename"], "prompt_build") as record:
+                    _, prompttext = prompts.solady_fewShot(t["code"], t["pragma"], t["contract_name"], self.contracts_file_name,
+                                                  t["referencecontracts"], t["custom_invariant"], self.modelname,
+                                                  examples[t.get("parent", t)["filename"]], t.get("focus", ""))
+                    record.input_tokens = self.count_tokens(prompttext)
+                prompt1.append({"fewshot": prompttext, "contract": t["filename"]})
+
+            if stream:
+                self.stream_tests(units, prompt1, max_concurrency, on_test_ready)
+            else:
+                res1 = self.run_batch(prompt1, max_concurrency)
+                # saving first resonse in the files
+                self.save_tests(units, res1, on_test_ready)
+
+        llm_calls = self.telemetry.summary().get("llm_call", {})
+        print("--------------------------------------------")
+        print("Total Input token: ", llm_calls.get("input_tokens", 0))
+        print("Total Output token: ", llm_calls.get("output_tokens", 0))
+        print("Estimated cost: $%.4f" % llm_calls.get("cost", 0.0))
+        print("--------------------------------------------")
+        self.telemetry.print_summary()
+        telemetry_dir = telemetry_dir or os.environ.get("INVARIANT_TELEMETRY_DIR")
+        if telemetry_dir:
+            self.telemetry.export(telemetry_dir)
+
+        # a contract whose model calls failed has no fresh test and is regenerated next time
+        tempcontracts = [t for t in tempcontracts if t["filename"] not in self.failed]
+        for t in tempcontracts:
+            manifest.update(t["manifest_key"], t["manifest_entry"])
+        manifest.save()
+        self.index.save()
+        self.generated = [t["filename"].replace(".sol", ".t.sol") for t in tempcontracts]
 
         return True
 
@@ -0,0 +1,69 @@
+import re
+
+from Solidity.Solidity import mask
+
+OPEN_FENCE_RE = re.compile(r"```\nsolidity\n|```[ \t]*(?:solidity)?[ \t]*\n")
+CONTINUE_PROMPT = (
+    "\n\nYour previous answer was cut off before the test contract was complete. "
+    "Here is everything you wrote so far:\n```solidity\n{partial}\n```\n"
+    "Continue exactly where it stopped. Output only the remaining code in a ```solidity block, "
+    "without repeating any of the code above."
+)
+
+
+class SolidityStreamExtractor:
+    """
+    Consumes a model's token stream and tracks the fenced Solidity block while it arrives.
+    done is set as soon as the closing fence is seen, so the caller can stop reading the
+    stream before any trailing explanation.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.code_start = None
+        self.code_end = None
+
+    @property
+    def done(self):
+        return self.code_end is not None
+
+    def feed(self, chunk):
+        search_from = max(len(self.buffer) - 16, 0)
+        self.buffer += chunk
+        if self.code_start is None:
+            match = OPEN_FENCE_RE.search(self.buffer, search_from)
+            if match is None:
+                return
+            rest = self.buffer[match.end():]
+            if match.group() == "```\n" and len(rest) < len("solidity\n") and "solidity\n".startswith(rest):
+                # could still become the "```\nsolidity\n" form, wait for more tokens
+                return
+            self.code_start = match.end()
+            search_from = self.code_start
+        if self.code_end is None:
+            end = self.buffer.find("```", max(search_from, self.code_start))
+            if end != -1:
+                self.code_end = end
+
+    def code(self, strip=True):
+        # strip=False keeps the edges, so a reply cut mid-token can be joined with its continuation
+        code = self.buffer if self.code_start is None else self.buffer[self.code_start:self.code_end]
+        return code.strip() if strip else code
+
+    def truncated(self, finish_reason=None, code=None):
+        # cut off at max_tokens, an unclosed fence, or more opening than closing braces outside strings and comments
+        if finish_reason == "length":
+            return True
+        if self.code_start is not None and self.code_end is None:
+            return True
+        masked = mask(self.code() if code is None else code)
+        return masked.count("{") > masked.count("}")
+
+
+def continuation_prompt(prompt, partial_code):
+    return prompt + CONTINUE_PROMPT.format(partial=partial_code)
+
+
+def finish_reason(chunk):
+    metadata = getattr(chunk, "response_metadata", None) or {}
+    return metadata.get("finish_reason") or metadata.get("finishReason")
@@ -0,0 +1,228 @@
+import json
+import os
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from Manifest.Manifest import GenerationManifest
+from WorkspacePool.WorkspacePool import get_workspace_pool
+
+JOBS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".jobs")
+MANIFEST_FILE = ".invariant_manifest.json"
+INDEX_FILE = ".project_index.json"
+FINISHED = ("done", "failed", "cancelled")
+# finished jobs are forgotten, and their folders deleted, after this many days or beyond this many jobs
+RETENTION_DAYS = float(os.environ.get("INVARIANT_JOB_RETENTION_DAYS", "7"))
+MAX_FINISHED_JOBS = int(os.environ.get("INVARIANT_JOB_HISTORY", "50"))
+
+
+@dataclass
+class Job:
+    id: str
+    project: str
+    contracts_folder: str
+    model: str
+    technique: str
+    selected_files: list
+    custom_invariants: dict = field(default_factory=dict)
+    incremental: bool = False
+    status: str = "queued"  # queued, running, done, failed or cancelled
+    created: float = 0.0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    workspace: Optional[str] = None
+    results: dict = field(default_factory=dict)  # contract filename -> {"status", "test"}
+    error: Optional[str] = None
+
+    @property
+    def progress(self):
+        done = sum(1 for r in self.results.values() if r["status"] in ("generated", "skipped"))
+        return done, len(self.selected_files)
+
+
+class JobService:
+    """
+    Local queue of generation jobs served by a pool of worker threads.
+    Each job runs in its own pooled workspace seeded with the project, so jobs never share src/,
+    test/ or build state. Its generated tests are published back to the project's test/ when it
+    finishes and the workspace is recycled.
+    Job state lives in this process (not in the Streamlit session) and is mirrored to
+    <root>/<job id>/job.json, so UI reruns and page refreshes only need the job id to poll it.
+    Finished jobs are kept for retention_days, and at most max_finished of them.
+    """
+
+    def __init__(self, root=JOBS_DIR, workers=None, retention_days=RETENTION_DAYS, max_finished=MAX_FINISHED_JOBS):
+        self.root = root
+        self.workers = workers or int(os.environ.get("INVARIANT_JOB_WORKERS", "2"))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="invariant-job")
+        self.jobs = {}
+        self.futures = {}
+        self.retention = retention_days * 86400
+        self.max_finished = max_finished
+        self.lock = threading.RLock()
+        self.publish_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self.load()
+        self.prune()
+
+    def load(self):
+        # jobs of a previous process are shown as they were; unfinished ones cannot resume
+        for job_id in os.listdir(self.root):
+            try:
+                with open(os.path.join(self.root, job_id, "job.json"), "r") as file:
+                    job = Job(**json.load(file))
+            except (OSError, ValueError, TypeError):
+                continue
+            if job.status not in FINISHED:
+                job.status, job.error = "failed", "interrupted by a restart"
+            self.jobs[job.id] = job
+
+    def save(self, job):
+        folder = os.path.join(self.root, job.id)
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = os.path.join(folder, "job.json.tmp")
+        with self.lock:
+            data = asdict(job)
+        with open(tmp_path, "w") as file:
+            json.dump(data, file, indent=2)
+        os.replace(tmp_path, os.path.join(folder, "job.json"))
+
+    def submit(self, project, contracts_folder, model, technique, selected_files, custom_invariants=None, incremental=False):
+        job = Job(uuid.uuid4().hex[:12], os.path.abspath(project), contracts_folder, model, technique,
+                  list(selected_files), dict(custom_invariants or {}), incremental, created=time.time())
+        job.results = {filename: {"status": "queued", "test": None} for filename in job.selected_files}
+        with self.lock:
+            self.jobs[job.id] = job
+            self.save(job)
+            self.futures[job.id] = self.executor.submit(self.run, job)
+        return job.id
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda job: job.created, reverse=True)
+
+    def output_dir(self, job_id):
+        # the generated tests of a job; they stay here until the job is pruned
+        return os.path.join(self.root, job_id, "test")
+
+    def prune(self):
+        """Forgets finished jobs past the retention age or count and deletes their folders."""
+        now = time.time()
+        with self.lock:
+            finished = sorted((job for job in self.jobs.values() if job.status in FINISHED),
+                              key=lambda job: job.finished or job.created, reverse=True)
+            expired = [job for i, job in enumerate(finished)
+                       if i >= self.max_finished or now - (job.finished or job.created) > self.retention]
+            for job in expired:
+                del self.jobs[job.id]
+                self.futures.pop(job.id, None)
+        for job in expired:
+            shutil.rmtree(os.path.join(self.root, job.id), ignore_errors=True)
+        return [job.id for job in expired]
+
+    def cancel(self, job_id):
+        # only jobs still waiting for a worker can be cancelled
+        with self.lock:
+            future = self.futures.get(job_id)
+            if future is not None and future.cancel():
+                del self.futures[job_id]
+                self.jobs[job_id].status = "cancelled"
+                self.jobs[job_id].finished = time.time()
+                self.save(self.jobs[job_id])
+                return True
+        return False
+
+    def make_workspace(self, job, output_dir):
+        workspace = get_workspace_pool().acquire(seed=job.project)
+        for name in [MANIFEST_FILE, INDEX_FILE]:
+            if os.path.exists(os.path.join(job.project, name)):
+                shutil.copy2(os.path.join(job.project, name), workspace)
+        os.makedirs(output_dir, exist_ok=True)
+        if job.incremental and os.path.isdir(os.path.join(job.project, "test")):
+            # earlier outputs have to be present for the manifest to consider them fresh
+            for name in os.listdir(os.path.join(job.project, "test")):
+                if name.endswith(".t.sol"):
+                    shutil.copy2(os.path.join(job.project, "test", name), output_dir)
+        return workspace
+
+    def run(self, job):
+        from InvariantGenerator.InvariantGenerator import InvariantGenerator
+
+        with self.lock:
+            job.status, job.started = "running", time.time()
+        try:
+            # outputs live in the job folder so they outlive the pooled workspace
+            output_dir = self.output_dir(job.id)
+            job.workspace = self.make_workspace(job, output_dir)
+            self.save(job)
+
+            def on_test_ready(contract, test_path):
+                with self.lock:
+                    job.results[contract["filename"]] = {"status": "generated", "test": test_path}
+                self.save(job)
+
+            # the generator is dropped with this frame; the UI reads the tests from output_dir(job.id)
+            generator = InvariantGenerator(job.workspace, job.contracts_folder, job.model, output_dir=output_dir)
+            generator.process_contracts(job.custom_invariants, job.technique, job.selected_files, job.incremental,
+                                        stream=True, on_test_ready=on_test_ready)
+            with self.lock:
+                for filename in generator.skipped:
+                    job.results[filename] = {"status": "skipped", "test": None}
+            self.publish(job, generator)
+            with self.lock:
+                job.status = "done"
+        except Exception as e:
+            traceback.print_exc()
+            with self.lock:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+                for result in job.results.values():
+                    if result["status"] == "queued":
+                        result["status"] = "failed"
+        finally:
+            if job.workspace is not None:
+                for name in [MANIFEST_FILE, INDEX_FILE]:
+                    if os.path.exists(os.path.join(job.workspace, name)):
+                        os.remove(os.path.join(job.workspace, name))
+                get_workspace_pool().release(job.workspace)
+            with self.lock:
+                job.finished = time.time()
+                self.futures.pop(job.id, None)
+            self.save(job)
+            self.prune()
+
+    def publish(self, job, generator):
+        # copy the new tests into the project and merge their manifest entries, one job at a time
+        with self.publish_lock:
+            test_folder = os.path.join(job.project, "test")
+            os.makedirs(test_folder, exist_ok=True)
+            for name in generator.generated:
+                shutil.copy2(os.path.join(generator.output_dir, name), test_folder)
+            workspace_manifest = GenerationManifest(os.path.join(job.workspace, MANIFEST_FILE))
+            project_manifest = GenerationManifest(os.path.join(job.project, MANIFEST_FILE))
+            for filename in generator.generated:
+                key = os.path.join(job.contracts_folder, filename.replace(".t.sol", ".sol"))
+                if key in workspace_manifest.entries:
+                    project_manifest.update(key, workspace_manifest.entries[key])
+            project_manifest.save()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_job_service():
+    """Process-wide JobService; Streamlit keeps modules loaded between reruns, so jobs keep running."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = JobService()
+        return _service
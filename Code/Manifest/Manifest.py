@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(path):
+    try:
+        with open(path, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class GenerationManifest:
+    """
+    Records the inputs each generated test file was built from: the contract source hash,
+    the hashes of its resolved references, the prompt technique, the model and the custom
+    invariants. A contract only needs regenerating when one of those inputs changed, which
+    includes any change to a file it imports.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as file:
+                self.entries = json.load(file).get("contracts", {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"version": 1, "contracts": self.entries}, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def make_entry(code, reference_paths, technique, model, custom_invariant="", root=None):
+        # references are keyed relative to root so entries stay valid in a copied workspace
+        return {
+            "source": hash_text(code),
+            "references": {(os.path.relpath(path, root) if root else path): hash_file(path)
+                           for path in sorted(set(reference_paths))},
+            "technique": technique,
+            "model": model,
+            "custom": hash_text(custom_invariant or ""),
+        }
+
+    def is_fresh(self, key, entry, output_path):
+        if not os.path.exists(output_path):
+            return False
+        return self.entries.get(key) == entry
+
+    def update(self, key, entry):
+        self.entries[key] = entry
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """Sliding one-minute window over request count and prompt tokens."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, window=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self.events = deque()
+        self.lock = asyncio.Lock()
+
+    def allowed(self, tokens):
+        if self.requests_per_minute is not None and len(self.events) >= self.requests_per_minute:
+            return False
+        if self.tokens_per_minute is not None and self.events:
+            used = sum(t for _, t in self.events)
+            if used + tokens > self.tokens_per_minute:
+                return False
+        return True
+
+    async def acquire(self, tokens=0):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                while self.events and now - self.events[0][0] >= self.window:
+                    self.events.popleft()
+                if self.allowed(tokens):
+                    self.events.append((now, tokens))
+                    return
+                await asyncio.sleep(self.window - (now - self.events[0][0]) + 0.01)
+
+
+class PromptChainPipeline:
+    """
+    Runs every contract through its own chain of prompt stages. A contract enters stage n+1 as
+    soon as its stage n response arrives, so no stage waits for the slowest contract of the batch.
+    Model calls are bounded by a global semaphore and the backend's rate limits
+    ({"requests_per_minute": ..., "tokens_per_minute": ...}); cache hits skip both.
+
+    stages: list of callables (contract, previous_response) -> prompt text
+    model_call: async callable prompt text -> response text, or a list with one callable per stage
+    on_stage: optional callable (stage_index, contract, response) run after each stage
+    telemetry: optional Telemetry that gets one llm_call record per model call, with queue time
+    max_retries: failed model calls are retried this many times with exponential backoff
+
+    A contract whose calls still fail does not stop the others: its result is None and the
+    exception is kept in failures. Callers inside an event loop await arun() instead of run().
+    """
+
+    def __init__(self, stages, model_call, limits=None, max_concurrency=8,
+                 count_tokens=None, cache_get=None, cache_put=None, on_stage=None,
+                 telemetry=None, max_retries=0, retry_delay=2.0):
+        self.stages = stages
+        self.model_calls = model_call if isinstance(model_call, list) else [model_call] * len(stages)
+        self.max_concurrency = max_concurrency
+        self.limits = limits or {}
+        self.count_tokens = count_tokens or (lambda text: len(text) // 4)
+        self.cache_get = cache_get
+        self.cache_put = cache_put
+        self.on_stage = on_stage
+        self.telemetry = telemetry
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.failures = {}  # contract name -> exception that ended its chain
+
+    async def call(self, prompt, stage=0, contract=None):
+        name = contract.get("filename", "") if isinstance(contract, dict) else str(contract or "")
+        if self.cache_get is not None:
+            cached = self.cache_get(prompt)
+            if cached is not None:
+                if self.telemetry is not None:
+                    self.telemetry.observe(name, "llm_call", step=stage + 1, cached=True,
+                                           input_tokens=self.count_tokens(prompt), output_tokens=self.count_tokens(cached))
+                return cached
+        prompt_tokens = self.count_tokens(prompt)
+        queued = time.monotonic()
+        wall_start = time.time()
+        retries = 0
+        async with self.semaphore:
+            started = None
+            while True:
+                # every attempt, retries included, counts against the rate limits
+                await self.limiter.acquire(prompt_tokens)
+                started = started or time.monotonic()
+                try:
+                    response = await self.model_calls[stage](prompt)
+                    break
+                except Exception as e:
+                    if retries >= self.max_retries:
+                        if self.telemetry is not None:
+                            self.telemetry.observe(name, "llm_call", step=stage + 1, started=wall_start,
+                                                   queue_time=started - queued, latency=time.monotonic() - started,
+                                                   input_tokens=prompt_tokens, retries=retries, ok=False,
+                                                   error=f"{type(e).__name__}: {e}")
+                        raise
+                    retries += 1
+                    await asyncio.sleep(self.retry_delay * 2 ** (retries - 1))
+        if self.telemetry is not None:
+            self.telemetry.observe(name, "llm_call", step=stage + 1, started=wall_start,
+                                   queue_time=started - queued, latency=time.monotonic() - started,
+                                   input_tokens=prompt_tokens, output_tokens=self.count_tokens(response), retries=retries)
+        if self.cache_put is not None:
+            self.cache_put(prompt, response)
+        return response
+
+    async def run_contract(self, contract):
+        previous = None
+        responses = []
+        for i, stage in enumerate(self.stages):
+            previous = await self.call(stage(contract, previous), i, contract)
+            responses.append(previous)
+            if self.on_stage is not None:
+                self.on_stage(i, contract, previous)
+        return responses
+
+    async def arun(self, contracts):
+        # created here so they bind to the running event loop
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.limiter = RateLimiter(**self.limits)
+        self.failures = {}
+        results = await asyncio.gather(*(self.run_contract(c) for c in contracts), return_exceptions=True)
+        for contract, result in zip(contracts, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                name = contract.get("filename", "") if isinstance(contract, dict) else str(contract)
+                self.failures[name] = result
+                print(f"Generation failed for {name}: {type(result).__name__}: {result}")
+        return [None if isinstance(result, BaseException) else result for result in results]
+
+    def run(self, contracts):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.arun(contracts))
+        # asyncio.run cannot nest inside a running loop, so the pipeline gets a loop of its own
+        outcome = {}
+        worker = threading.Thread(target=lambda: outcome.update(results=asyncio.run(self.arun(contracts))))
+        worker.start()
+        worker.join()
+        return outcome["results"]
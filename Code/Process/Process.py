@@ -0,0 +1,169 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+DEFAULT_MAX_OUTPUT = 16 * 1024 * 1024
+KILL_GRACE = 2.0  # seconds between SIGTERM and SIGKILL
+CHUNK = 64 * 1024
+
+
+@dataclass
+class ProcessResult:
+    args: list
+    cwd: str
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    duration: float
+    timed_out: bool = False
+    cancelled: bool = False
+    truncated: bool = False
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+    @property
+    def output(self):
+        return self.stdout + self.stderr
+
+    def describe(self):
+        if self.timed_out:
+            return f"{self.args[0]} timed out after {self.duration:.0f}s"
+        if self.cancelled:
+            return f"{self.args[0]} was cancelled"
+        return f"{self.args[0]} exited with {self.returncode}"
+
+
+async def read_bounded(stream, limit):
+    # keeps the first `limit` bytes and drains the rest so the child never blocks on a full pipe
+    kept = bytearray()
+    truncated = False
+    while True:
+        chunk = await stream.read(CHUNK)
+        if not chunk:
+            break
+        if limit is None or len(kept) < limit:
+            room = len(chunk) if limit is None else limit - len(kept)
+            kept += chunk[:room]
+            truncated = truncated or room < len(chunk)
+        else:
+            truncated = True
+    return kept.decode("utf-8", errors="replace"), truncated
+
+
+async def write_input(process, data):
+    # a child that exits without reading all of its stdin closes the pipe; its exit code and stderr still count
+    try:
+        process.stdin.write(data)
+        await process.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        process.stdin.close()
+
+
+def kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def force_kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class ProcessManager:
+    """
+    Runs external tools (forge, solc, ...) without a shell and without touching the process cwd.
+    Every call names its cwd and may set a timeout; on timeout or cancellation the whole process
+    group gets SIGTERM, then SIGKILL, so forge's own children die with it. stdout and stderr
+    are captured in memory up to max_output bytes each. At most max_concurrency processes run at
+    once across all threads and event loops of this process.
+    """
+
+    def __init__(self, max_concurrency=None, max_output=DEFAULT_MAX_OUTPUT):
+        self.max_concurrency = max_concurrency or int(os.environ.get("INVARIANT_MAX_PROCESSES", os.cpu_count() or 4))
+        self.max_output = max_output
+        # a threading semaphore, because callers run their own event loops in worker threads
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    async def acquire(self):
+        # waits in an executor thread; a slot taken after the caller was cancelled is handed back
+        waiting = asyncio.get_running_loop().run_in_executor(None, self.slots.acquire)
+        try:
+            await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            waiting.add_done_callback(lambda _: self.slots.release())
+            raise
+
+    async def run(self, args, cwd, timeout=None, env=None, input=None, max_output=-1):
+        if cwd is None:
+            raise ValueError("an explicit cwd is required")
+        max_output = self.max_output if max_output == -1 else max_output
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *args, cwd=cwd, env=env, start_new_session=True,
+                    stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                )
+            except OSError as e:
+                return ProcessResult(list(args), cwd, None, "", f"could not start {args[0]}: {e}",
+                                     time.monotonic() - start)
+            # stdin is written alongside the reads, so a large input neither deadlocks on full pipes nor escapes the timeout
+            streams = [read_bounded(process.stdout, max_output), read_bounded(process.stderr, max_output)]
+            if input is not None:
+                streams.append(write_input(process, input.encode("utf-8")))
+            readers = asyncio.gather(*streams)
+            timed_out = cancelled = False
+            try:
+                (stdout, out_truncated), (stderr, err_truncated) = (await asyncio.wait_for(asyncio.shield(readers), timeout))[:2]
+                await process.wait()
+            except asyncio.TimeoutError:
+                timed_out = True
+            except asyncio.CancelledError:
+                cancelled = True
+            if timed_out or cancelled:
+                await self.terminate(process)
+                (stdout, out_truncated), (stderr, err_truncated) = (await readers)[:2]
+                if cancelled:
+                    raise asyncio.CancelledError()
+            return ProcessResult(list(args), cwd, process.returncode, stdout, stderr, time.monotonic() - start,
+                                 timed_out, cancelled, out_truncated or err_truncated)
+        finally:
+            self.slots.release()
+
+    async def terminate(self, process):
+        kill_group(process)
+        try:
+            await asyncio.wait_for(process.wait(), KILL_GRACE)
+        except asyncio.TimeoutError:
+            force_kill_group(process)
+            await process.wait()
+
+    def run_sync(self, args, cwd, timeout=None, env=None, input=None, max_output=-1):
+        """Blocking form of run() for threads without an event loop (compiler workers, the UI)."""
+        return asyncio.run(self.run(args, cwd, timeout, env, input, max_output))
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_process_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ProcessManager()
+        return _manager
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+from solidity_parser import parser
+
+INDEX_VERSION = 2
+INDEX_FILE = ".project_index.json"
+
+PRAGMA_RE = re.compile(r"pragma\s+(\w+)\s+([^;]+);")
+IMPORT_RE = re.compile(r"""import\s+(?:[^'";]*?\s+from\s+)?["']([^"']+)["']""")
+CONTRACT_RE = re.compile(r"^\s*(abstract\s+contract|contract|library|interface)\s+(\w+)", re.M)
+FUNCTION_RE = re.compile(r"function\s+(\w+)\s*\(([^)]*)\)([^{;]*)")
+VISIBILITIES = ("external", "public", "internal", "private")
+MUTABILITIES = ("pure", "view", "payable")
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def extract_pre_contract(contract_code):
+    lines = contract_code.split('\n')
+    for i, line in enumerate(lines):
+        if line.strip().startswith(("contract ", "library ", "interface ", "abstract contract ")):
+            return '\n'.join(lines[:i])
+    return ""
+
+
+def type_name(node):
+    if not isinstance(node, dict):
+        return ""
+    kind = node.get("type")
+    if kind == "ElementaryTypeName":
+        return node.get("name", "")
+    if kind == "UserDefinedTypeName":
+        return node.get("namePath", "")
+    if kind == "ArrayTypeName":
+        length = node.get("length")
+        length = length.get("number", "") if isinstance(length, dict) else ""
+        return f"{type_name(node.get('baseTypeName'))}[{length}]"
+    if kind == "Mapping":
+        return f"mapping({type_name(node.get('keyType'))} => {type_name(node.get('valueType'))})"
+    if kind == "FunctionTypeName":
+        return "function"
+    return node.get("name", "") or ""
+
+
+def parameter_types(parameter_list):
+    if isinstance(parameter_list, dict):
+        parameter_list = parameter_list.get("parameters", [])
+    return [type_name(p.get("typeName")) for p in parameter_list or [] if isinstance(p, dict)]
+
+
+def line_range(node):
+    loc = node.get("loc") or {}
+    return (loc.get("start") or {}).get("line"), (loc.get("end") or {}).get("line")
+
+
+def summarize_ast(ast):
+    summary = {"parsed": True, "pragmas": [], "imports": [], "contracts": []}
+    for child in ast.get("children", []):
+        kind = child.get("type")
+        if kind == "PragmaDirective":
+            summary["pragmas"].append({"name": child.get("name"), "value": child.get("value")})
+        elif kind == "ImportDirective":
+            summary["imports"].append(child.get("path", "").strip("'\""))
+        elif kind == "ContractDefinition":
+            start, end = line_range(child)
+            contract = {
+                "name": child.get("name"),
+                "kind": child.get("kind"),
+                "bases": [b.get("baseName", {}).get("namePath") for b in child.get("baseContracts", [])],
+                "start_line": start,
+                "end_line": end,
+                "functions": [],
+                "variables": [],
+            }
+            for node in child.get("subNodes", []):
+                if node.get("type") == "FunctionDefinition":
+                    start, end = line_range(node)
+                    contract["functions"].append({
+                        "name": node.get("name") or ("constructor" if node.get("isConstructor") else ""),
+                        "visibility": node.get("visibility") or "default",
+                        "mutability": node.get("stateMutability"),
+                        "parameters": parameter_types(node.get("parameters")),
+                        "returns": parameter_types(node.get("returnParameters")),
+                        "start_line": start,
+                        "end_line": end,
+                    })
+                elif node.get("type") == "StateVariableDeclaration":
+                    for var in node.get("variables", []):
+                        contract["variables"].append({
+                            "name": var.get("name"),
+                            "visibility": var.get("visibility") or "default",
+                            "constant": bool(var.get("isDeclaredConst")),
+                        })
+            summary["contracts"].append(contract)
+    return summary
+
+
+def summarize_regex(code):
+    # best-effort summary for sources the parser rejects
+    summary = {"parsed": False, "pragmas": [], "imports": IMPORT_RE.findall(code), "contracts": []}
+    for name, value in PRAGMA_RE.findall(code):
+        summary["pragmas"].append({"name": name, "value": value.strip()})
+    matches = list(CONTRACT_RE.finditer(code))
+    for i, match in enumerate(matches):
+        body_end = matches[i + 1].start() if i + 1 < len(matches) else len(code)
+        body = code[match.end():body_end]
+        base_line = code.count("\n", 0, match.start()) + 1
+        contract = {
+            "name": match.group(2),
+            "kind": match.group(1).split()[-1] if "abstract" not in match.group(1) else "abstract",
+            "bases": [],
+            "start_line": base_line,
+            "end_line": None,
+            "functions": [],
+            "variables": [],
+        }
+        for fn in FUNCTION_RE.finditer(body):
+            words = fn.group(3).split()
+            visibility = next((w for w in words if w in VISIBILITIES), "default")
+            mutability = next((w for w in words if w in MUTABILITIES), None)
+            contract["functions"].append({
+                "name": fn.group(1),
+                "visibility": visibility,
+                "mutability": mutability,
+                "parameters": [p.split()[0] for p in fn.group(2).split(",") if p.strip()],
+                "returns": [],
+                "start_line": base_line + body.count("\n", 0, fn.start()),
+                "end_line": None,
+            })
+        summary["contracts"].append(contract)
+    return summary
+
+
+def summarize(code):
+    """Parse a Solidity source once and reduce it to pragmas, imports, contracts and their members."""
+    try:
+        return summarize_ast(parser.parse(code, loc=True))
+    except Exception as e:
+        (e)
+    summary = summarize_regex(code)
+    try:
+        # the header usually still parses even when the body does not
+        header = summarize_ast(parser.parse(extract_pre_contract(code), loc=True))
+        summary["pragmas"] = header["pragmas"] or summary["pragmas"]
+        summary["imports"] = header["imports"] or summary["imports"]
+    except Exception as e:
+        (e)
+    return summary
+
+
+class ProjectIndex:
+    """
+    Project-wide index of parsed Solidity files: contracts, pragmas, imports and resolved import paths.
+    Entries are revalidated by mtime/size, then by content hash, so the parser only runs when a file
+    really changed. The index is persisted in <root>/.project_index.json between runs.
+    """
+
+    def __init__(self, root, source_dirs=("src",)):
+        self.root = os.path.abspath(root)
+        self.source_dirs = source_dirs
+        self.path = os.path.join(self.root, INDEX_FILE)
+        self.files = {}
+        self.by_hash = {}
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.remappings = []
+        self.remappings_mtime = None
+        self.load()
+        self.load_remappings()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+            if data.get("version") == INDEX_VERSION:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+        for entry in self.files.values():
+            self.by_hash[entry["hash"]] = entry["summary"]
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as file:
+                json.dump({"version": INDEX_VERSION, "files": self.files}, file)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+    def load_remappings(self):
+        # remappings.txt lines look like [context:]prefix=target; the longest matching prefix wins
+        path = os.path.join(self.root, "remappings.txt")
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self.remappings, self.remappings_mtime = [], None
+            return
+        if mtime == self.remappings_mtime:
+            return
+        remappings = []
+        with open(path, "r") as file:
+            for line in file:
+                line = line.strip()
+                if "=" not in line or line.startswith("#"):
+                    continue
+                prefix, target = line.split("=", 1)
+                remappings.append((prefix.split(":")[-1], target))
+        self.remappings = sorted(remappings, key=lambda r: len(r[0]), reverse=True)
+        self.remappings_mtime = mtime
+
+    def key(self, path):
+        path = os.path.abspath(path)
+        return os.path.relpath(path, self.root) if path.startswith(self.root + os.sep) else path
+
+    def refresh(self):
+        # revalidate every source file under the indexed folders and drop deleted ones
+        self.load_remappings()
+        seen = set()
+        for source_dir in self.source_dirs:
+            for folder, _, filenames in os.walk(os.path.join(self.root, source_dir)):
+                for filename in filenames:
+                    if filename.endswith(".sol"):
+                        path = os.path.join(folder, filename)
+                        self.get(path)
+                        seen.add(self.key(path))
+        with self.lock:
+            for key in list(self.files):
+                if not os.path.isabs(key) and key not in seen and not os.path.exists(os.path.join(self.root, key)):
+                    del self.files[key]
+                    self.dirty = True
+        self.save()
+        return self
+
+    def get(self, path):
+        """Summary of the file at path with an extra "resolved" list of import file paths, or None."""
+        path = os.path.abspath(path)
+        summary = self.summary(path)
+        if summary is None:
+            return None
+        self.load_remappings()
+        base_dir = os.path.dirname(path)
+        return dict(summary, resolved=[self.resolve(importpath, base_dir) for importpath in summary["imports"]])
+
+    def summary(self, path):
+        key = self.key(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.files.get(key)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                return entry["summary"]
+        with open(path, "r") as file:
+            code = file.read()
+        digest = hash_text(code)
+        with self.lock:
+            if entry and entry["hash"] == digest:
+                entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+                self.dirty = True
+                return entry["summary"]
+        summary = self.summarize_code(code)
+        with self.lock:
+            self.files[key] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": digest, "summary": summary}
+            self.dirty = True
+        return summary
+
+    def summarize_code(self, code):
+        # summaries are shared by content hash, so identical sources are parsed once
+        digest = hash_text(code)
+        with self.lock:
+            summary = self.by_hash.get(digest)
+        if summary is None:
+            summary = summarize(code)
+            with self.lock:
+                self.by_hash[digest] = summary
+        return summary
+
+    def resolve(self, importpath, base_dir):
+        if importpath.startswith("."):
+            candidates = [os.path.join(base_dir, importpath)]
+        else:
+            candidates = [os.path.join(self.root, target + importpath[len(prefix):])
+                          for prefix, target in self.remappings if importpath.startswith(prefix)][:1]
+            candidates += [os.path.join(self.root, importpath), os.path.join(base_dir, importpath)]
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                return os.path.normpath(candidate)
+        return None
+
+    def resolve_code_imports(self, code, base_dir):
+        # (import path as written, resolved file) for a source that is not on disk
+        summary = self.summarize_code(code)
+        self.load_remappings()
+        resolved = [(importpath, self.resolve(importpath, base_dir)) for importpath in summary["imports"]]
+        return [(importpath, path) for importpath, path in resolved if path]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root):
+    """Process-wide ProjectIndex for root, so Streamlit reruns and every caller share one instance."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = ProjectIndex(root)
+        return _indexes[root]
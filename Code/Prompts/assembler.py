@@ -0,0 +1,49 @@
+from Prompts.tokens import encoding_for
+from Backends.Backends import get_backend
+
+
+class PromptSection:
+    """
+    One piece of a prompt. Sections are concatenated in the order given.
+    When the prompt is over budget, droppable sections go first (lowest priority first, later
+    sections before earlier ones on ties), then truncatable sections lose tokens from their end.
+    """
+
+    def __init__(self, name, text, priority=0, droppable=False, truncatable=False):
+        self.name = name
+        self.text = text
+        self.priority = priority
+        self.droppable = droppable
+        self.truncatable = truncatable
+
+
+def assemble(sections, modelname, budget=None):
+    """Returns (prompt, token_count). Every section is encoded exactly once."""
+    budget = budget if budget is not None else get_backend(modelname).prompt_budget
+    encoding = encoding_for(modelname)
+    tokens = [encoding.encode(section.text, disallowed_special=()) for section in sections]
+    texts = [section.text for section in sections]
+    kept = [True] * len(sections)
+    total = sum(len(t) for t in tokens)
+
+    by_priority = sorted(range(len(sections)), key=lambda i: (sections[i].priority, -i))
+    for i in by_priority:
+        if total <= budget:
+            break
+        if sections[i].droppable:
+            kept[i] = False
+            total -= len(tokens[i])
+
+    for i in by_priority:
+        if total <= budget:
+            break
+        if kept[i] and sections[i].truncatable:
+            cut = min(total - budget, len(tokens[i]))
+            tokens[i] = tokens[i][:len(tokens[i]) - cut]
+            texts[i] = encoding.decode(tokens[i])
+            total -= cut
+
+    dropped = [sections[i].name for i in range(len(sections)) if not kept[i]]
+    if dropped:
+        print("Prompt over budget, dropped sections:", dropped)
+    return "".join(texts[i] for i in range(len(sections)) if kept[i]), total
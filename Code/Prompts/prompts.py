@@ -1,11 +1,9 @@
 import json
 from langchain.prompts import PromptTemplate
-import tiktoken
 import os
-from langchain_chroma import Chroma
 from langchain_core.example_selectors import SemanticSimilarityExampleSelector
-from langchain_openai import OpenAIEmbeddings
-from langchain_core.documents import Document
+from Prompts.assembler import PromptSection, assemble
+from Prompts.retriever import get_retriever
 
 examples=  [
     {
@@ -18,7 +16,7 @@ vminterface="""
 interface Vm:
 """
 
-def zeroShot(input_sc,pragma,contractname,filename,references,custom_invariant,modelname):
+def zeroShot(input_sc,pragma,contractname,filename,references,custom_invariant,modelname,focus=""):
     opencurly = "{"
     closedcurly = "}"
     path = os.path.join("../", filename)
@@ -48,31 +46,18 @@ def zeroShot(input_sc,pragma,contractname,filename,references,custom_invariant,m
         Given input contract:\n {input_contract} \n{reference}\nTest Contract Format:\n{testformat}
         """
     )
-    zeroShotPrompt1 = zeroShotPrompt1.format(input_contract=input_sc,reference=references,testformat=test_contract_format)
-    zeroShotPrompt2 = zeroShotPrompt2.format(input_contract=input_sc,reference=references,testformat=test_contract_format)
-    zeroShotPrompt3 = zeroShotPrompt3.format(input_contract=input_sc,reference=references,testformat=test_contract_format)
+    zeroShotPrompt1 = zeroShotPrompt1.format(input_contract=input_sc,reference=references+focus,testformat=test_contract_format)
+    zeroShotPrompt2 = zeroShotPrompt2.format(input_contract=input_sc,reference=references+focus,testformat=test_contract_format)
+    zeroShotPrompt3 = zeroShotPrompt3.format(input_contract=input_sc,reference=references+focus,testformat=test_contract_format)
 
     return zeroShotPrompt1, zeroShotPrompt2, zeroShotPrompt3
 
 
-def solady_fewShot(input_sc,pragma,contractname,filename,references,custom_invariant,modelname):
-
-    if not os.path.exists("./chroma_db/chroma.sqlite3"):
-        examplespath = os.path.join(os.getcwd(), "Prompts/solady_examples.json")
-        examples = None
-        with open(examplespath, "r") as json_file:
-            examples = json.load(json_file)
-        docexamples = []
-        for example in examples:
-            docexamples.append(Document(page_content=example["input"], metadata=example))
-        db2 = Chroma.from_documents(docexamples, OpenAIEmbeddings(), persist_directory="./chroma_db")
-        print("Database created")
-    db3 = Chroma(persist_directory="./chroma_db", embedding_function=OpenAIEmbeddings())
-    docs = db3.similarity_search(input_sc,3)
-    selected_examples = []
-    for doc in docs:
-        if doc.metadata["contractname"]!=contractname+".sol":
-            selected_examples.append(doc.metadata)
+def solady_fewShot(input_sc,pragma,contractname,filename,references,custom_invariant,modelname,selected_examples=None,focus=""):
+
+    # examples are normally selected for the whole batch up front through get_retriever().select_examples
+    if selected_examples is None:
+        selected_examples = get_retriever().select_examples([input_sc], [contractname])[0]
 
     # example_selector = SemanticSimilarityExampleSelector.from_examples(
     #     # This is the list of examples available to select from.
@@ -89,16 +74,17 @@ def solady_fewShot(input_sc,pragma,contractname,filename,references,custom_invar
 
 
 
-    # STEP2: Create few shot prompt
-    prompt = "Here are few-shot examples of pair of contract with their corresponding foundry test contract to test solidity contracts:\n"
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+    # STEP2: Create few shot prompt from sections so an oversized prompt drops whole examples first
+    sections = [PromptSection("examples header", "Here are few-shot examples of pair of contract with their corresponding foundry test contract to test solidity contracts:\n", priority=2, droppable=True)]
     examplecount=0
     for i, example in enumerate(selected_examples):
         if examplecount<3:
+            exampletext=""
             for k, v in example.items():
                 if k!="contractname":
                     examplecount+=1
-                    prompt = prompt +"\n"+ k + "\n" + v + "\n\n"
+                    exampletext = exampletext +"\n"+ k + "\n" + v + "\n\n"
+            sections.append(PromptSection(f"example {i}", exampletext, priority=1, droppable=True))
 
 
     opencurly="{"
@@ -116,18 +102,16 @@ def solady_fewShot(input_sc,pragma,contractname,filename,references,custom_invar
                           )
     if references:
         references="Here are the references of the input smart contract:\n"+references
-    prompt=prompt+"Your output should only be the code. Your task is to write the foundry test contract for the given input smart contract:\n" + input_sc + "\n"+references+"\nHere is the template of Output test contract:\n"+test_contract_format
-    token_thresh=8000 if modelname=="gpt-3.5"  else 280000 if modelname=="gemini-1.0" else 1000000 if modelname=="gemini-1.5" else 120000 if modelname=="gpt-4" else 10000
-
-    token_count = len(encoding.encode(prompt))
-    while token_count > token_thresh:
-        prompt = prompt[1000:]
-        # prompt = prompt[:-1000]
-        token_count = len(encoding.encode(prompt))
+    sections += [
+        PromptSection("instruction", "Your output should only be the code. Your task is to write the foundry test contract for the given input smart contract:\n"),
+        PromptSection("input contract", input_sc + "\n", priority=4, truncatable=True),
+        PromptSection("references", references, priority=3, droppable=True, truncatable=True),
+        PromptSection("focus", focus, priority=5),
+        PromptSection("template", "\nHere is the template of Output test contract:\n"+test_contract_format, priority=5),
+    ]
+    prompt, token_count = assemble(sections, modelname)
     print(prompt)
     print(token_count)
-    # print(selected_examples)
-    # print("Selected Examples :",len(selected_examples))
 
     return prompt,prompt
 
@@ -183,7 +167,6 @@ def fewShot(input_sc,pragma,contractname,filename,references,custom_invariant,mo
 
     # STEP2: Create few shot prompt
     prompt = "Here are some fewshot examples:\n"
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
     for i,example in enumerate(examples):
         if i<3:
             for k, v in example.items():
@@ -260,19 +243,19 @@ def fewShot(input_sc,pragma,contractname,filename,references,custom_invariant,mo
                    +custom_invariant+
     "The following are some common the functions in foundry that are used in test contracts:"+(vminterface))
 
-    prompt2 = instruction + prompt1 +prompt
     documentation=""
     with open(os.path.join(os.getcwd(),"Prompts/documentation.txt"), "r") as textfile:
         documentation = textfile.read()
         if documentation:
             documentation="\nHere is the foundry documentation to write good foundry test contract :" +documentation
-    prompt2 = prompt2 +documentation
     token_thresh=6000 if modelname=="gpt-3.5" else 1000000 if modelname=="gemini" else 120000 if modelname=="gpt-4" else 10000
 
-    token_count = len(encoding.encode(prompt2))
-    while token_count > token_thresh:
-        prompt2 = prompt2[:-1000]
-        token_count = len(encoding.encode(prompt2))
+    prompt2, token_count = assemble([
+        PromptSection("instruction", instruction, priority=3),
+        PromptSection("input", prompt1, priority=2, truncatable=True),
+        PromptSection("examples", prompt, priority=1, droppable=True),
+        PromptSection("documentation", documentation, priority=0, droppable=True),
+    ], modelname, token_thresh)
     print(prompt2)
     print(token_count)
     return prompt, prompt2
@@ -375,6 +358,22 @@ def compiling_agent_prompt(code, tstfile,references):
 
 
 
+def shard_focus(functions, index, count):
+    # one part of a contract that is generated in several parts and merged afterwards
+    return (f"\nThis is part {index} of {count} of the test contract for this input contract. "
+            f"Write tests only for these functions: {', '.join(functions)}.\n"
+            f"Functions whose body is elided are tested in the other parts; use them only where a test needs them for its setup.\n")
+
+
+def repair_prompt(errors, region, outline, interface):
+    prompt=PromptTemplate.from_template(
+        template="""The following part of a foundry test contract does not compile. Fix only this part and keep its test logic.\nReturn only the corrected replacement for this part in a ```solidity block, nothing else. Return an empty block if it cannot be fixed and should be removed.\nCompiler errors:\n{errors}\nPart to fix:\n```solidity\n{region}\n```\nOutline of the whole test contract (bodies omitted):\n```solidity\n{outline}\n```\n{interface}"""
+    )
+    if interface:
+        interface="Declarations of the contract under test:\n```solidity\n"+interface+"\n```"
+    return prompt.format(errors=errors,region=region,outline=outline,interface=interface)
+
+
 def severityScore(testContract):
     stPrompt = PromptTemplate.from_template(
         template="""
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+PROMPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.dirname(PROMPTS_DIR)
+EXAMPLES_PATH = os.path.join(PROMPTS_DIR, "solady_examples.json")
+CHROMA_DIR = os.path.join(CODE_DIR, "chroma_db")
+EMBEDDING_CACHE_PATH = os.path.join(CODE_DIR, ".llm_cache", "embeddings.sqlite3")
+
+SOLIDITY_TOKEN_RE = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+CAMEL_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedding model with an on-disk cache keyed by the content hash of each text."""
+
+    def __init__(self, inner, namespace, path=EMBEDDING_CACHE_PATH):
+        self.inner = inner
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector TEXT)")
+        self.conn.commit()
+
+    def key(self, text):
+        return hashlib.sha256((self.namespace + "\0" + text).encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts):
+        keys = [self.key(text) for text in texts]
+        vectors = {}
+        with self.lock:
+            for key in set(keys):
+                row = self.conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vectors[key] = json.loads(row[0])
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing[key] = text
+        if missing:
+            embedded = self.inner.embed_documents(list(missing.values()))
+            with self.lock:
+                for key, vector in zip(missing.keys(), embedded):
+                    vectors[key] = vector
+                    self.conn.execute("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                                      (key, json.dumps(vector)))
+                self.conn.commit()
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def solidity_tokens(code):
+    # identifiers plus their camelCase parts, so "safeTransferFrom" also matches "transfer"
+    tokens = []
+    for identifier in SOLIDITY_TOKEN_RE.findall(code):
+        tokens.append(identifier.lower())
+        parts = CAMEL_RE.findall(identifier)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+
+class LocalEmbeddings(Embeddings):
+    """Deterministic TF-IDF vectors over Solidity tokens, hashed into a fixed number of dimensions."""
+
+    def __init__(self, corpus, dims=4096):
+        self.dims = dims
+        document_frequency = Counter()
+        for text in corpus:
+            document_frequency.update(set(solidity_tokens(text)))
+        n = max(len(corpus), 1)
+        self.idf = {token: math.log((1 + n) / (1 + df)) + 1 for token, df in document_frequency.items()}
+        self.default_idf = math.log(1 + n) + 1
+
+    def bucket(self, token):
+        return int.from_bytes(hashlib.md5(token.encode("utf-8")).digest()[:4], "little") % self.dims
+
+    def sparse(self, text):
+        vector = Counter()
+        for token, count in Counter(solidity_tokens(text)).items():
+            vector[self.bucket(token)] += (1 + math.log(count)) * self.idf.get(token, self.default_idf)
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {i: v / norm for i, v in vector.items()}
+
+    def embed_query(self, text):
+        vector = [0.0] * self.dims
+        for i, v in self.sparse(text).items():
+            vector[i] = v
+        return vector
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class ExampleRetriever:
+    """
+    Long-lived few-shot example selector over solady_examples.json.
+    backend "openai" keeps one Chroma store open and caches query embeddings by content hash;
+    backend "local" needs no network and ranks examples by TF-IDF cosine similarity.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or os.environ.get("INVARIANT_EMBEDDINGS", "openai")
+        with open(EXAMPLES_PATH, "r") as json_file:
+            self.examples = json.load(json_file)
+        if self.backend == "local":
+            self.embeddings = LocalEmbeddings([example["input"] for example in self.examples])
+            self.example_vectors = [self.embeddings.sparse(example["input"]) for example in self.examples]
+        else:
+            from langchain_chroma import Chroma
+            from langchain_openai import OpenAIEmbeddings
+
+            self.embeddings = CachedEmbeddings(OpenAIEmbeddings(), "openai")
+            if not os.path.exists(os.path.join(CHROMA_DIR, "chroma.sqlite3")):
+                docexamples = [Document(page_content=example["input"], metadata=example) for example in self.examples]
+                self.db = Chroma.from_documents(docexamples, self.embeddings, persist_directory=CHROMA_DIR)
+                print("Database created")
+            else:
+                self.db = Chroma(persist_directory=CHROMA_DIR, embedding_function=self.embeddings)
+
+    def similarity_search(self, queries, k=3):
+        """The k nearest examples for every query, embedding all queries in one batched call."""
+        results = []
+        if self.backend == "local":
+            for query in queries:
+                vector = self.embeddings.sparse(query)
+                scores = [sum(v * ev.get(i, 0.0) for i, v in vector.items()) for ev in self.example_vectors]
+                ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+                results.append([self.examples[i] for i in ranked])
+        else:
+            for vector in self.embeddings.embed_documents(queries):
+                results.append([doc.metadata for doc in self.db.similarity_search_by_vector(vector, k)])
+        return results
+
+    def select_examples(self, codes, contractnames, k=3):
+        # an example of the contract itself would leak the reference test, so it is skipped
+        selected = []
+        for docs, contractname in zip(self.similarity_search(codes, k), contractnames):
+            selected.append([doc for doc in docs if doc["contractname"] != contractname + ".sol"])
+        return selected
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever():
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = ExampleRetriever()
+        return _retriever
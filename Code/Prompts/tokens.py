@@ -0,0 +1,15 @@
+from functools import lru_cache
+
+import tiktoken
+
+from Backends.Backends import get_backend
+
+
+@lru_cache(maxsize=None)
+def encoding_for(modelname):
+    # modelname is a backend name or a model family; the encoding is part of its BackendSpec
+    return tiktoken.get_encoding(get_backend(modelname).encoding)
+
+
+def count_tokens(text, modelname):
+    return len(encoding_for(modelname).encode(text, disallowed_special=()))
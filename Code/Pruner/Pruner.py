@@ -0,0 +1,182 @@
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+SCAN_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//[^\n]*|/\*.*?\*/|[{}]|\b(?:contract|function)\b', re.S)
+FUNCTION_NAME_RE = re.compile(r"function\s+(\w+)")
+# functions forge runs as properties; setUp and helpers are never dropped because tests depend on them
+PROPERTY_PREFIXES = ("test", "invariant", "statefulFuzz", "prove", "check")
+
+
+@dataclass
+class FunctionSpan:
+    name: str
+    start: int  # offset of the start of the line the function begins on
+    end: int  # offset just past the closing brace and its newline
+    start_line: int
+    end_line: int
+
+
+@dataclass
+class PruneResult:
+    filename: str
+    code: str
+    compiles: bool
+    kept: list = field(default_factory=list)
+    dropped: dict = field(default_factory=dict)  # property name -> reason
+    compile_runs: int = 0
+
+    @property
+    def pruned(self):
+        return bool(self.dropped)
+
+
+def split_functions(code):
+    """Spans of the functions of the last contract in a source: the test contract of a generated file."""
+    contracts = []
+    depth = 0
+    pending = None
+    body = None
+    for match in SCAN_RE.finditer(code):
+        token = match.group()
+        if token.startswith(("//", "/*", '"', "'")):
+            continue
+        if token == "contract":
+            if depth == 0:
+                contracts.append([])
+        elif token == "function":
+            name = FUNCTION_NAME_RE.match(code, match.start())
+            # function types in parameter lists have no name and do not start a new function
+            if contracts and depth == 1 and name:
+                pending = (name.group(1), code.rfind("\n", 0, match.start()) + 1)
+        elif token == "{":
+            depth += 1
+            if pending is not None and depth == 2:
+                body, pending = pending, None
+        else:
+            depth = max(depth - 1, 0)
+            if body is not None and depth == 1:
+                end = match.end() + 1 if code.startswith("\n", match.end()) else match.end()
+                contracts[-1].append(FunctionSpan(body[0], body[1], end, code.count("\n", 0, body[1]) + 1,
+                                                  code.count("\n", 0, match.end()) + 1))
+                body = None
+    return contracts[-1] if contracts else []
+
+
+def is_property(name):
+    return name.startswith(PROPERTY_PREFIXES)
+
+
+def render(code, spans, dropped):
+    out = []
+    position = 0
+    for span in spans:
+        if span.name in dropped:
+            out.append(code[position:span.start])
+            position = span.end
+    out.append(code[position:])
+    return "".join(out)
+
+
+class Pruner:
+    """
+    Finds the largest set of test functions of a generated test contract that still compiles.
+    Functions that compiler errors point into are dropped first; whatever the error locations
+    cannot explain is settled by bisection, compiling both halves of each split in parallel.
+    Helpers and setUp are always kept, and no LLM is involved.
+    """
+
+    def __init__(self, compiler_pool, max_rounds=8):
+        self.pool = compiler_pool
+        self.max_rounds = max_rounds
+
+    def compile_variants(self, filename, variants):
+        # each variant is compiled from its own folder so parallel sandboxes never share a path
+        paths = []
+        for variant in variants:
+            path = os.path.join(tempfile.mkdtemp(prefix="pruner-"), filename)
+            with open(path, "w") as file:
+                file.write(variant)
+            paths.append(path)
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(paths), 1)) as executor:
+                return list(executor.map(self.pool.compile, paths))
+        finally:
+            for path in paths:
+                shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+    def prune(self, test_path):
+        filename = os.path.basename(test_path)
+        with open(test_path, "r") as file:
+            code = file.read()
+        spans = split_functions(code)
+        properties = [span.name for span in spans if is_property(span.name)]
+        runs = 0
+        dropped = {}
+
+        # localisation rounds: solc reports errors phase by phase, so repeat while they land in properties
+        for _ in range(self.max_rounds):
+            result = self.compile_variants(filename, [render(code, spans, dropped)])[0]
+            runs += 1
+            if result.success:
+                return self.result(filename, code, spans, properties, dropped, True, runs)
+            rendered = render(code, spans, dropped)
+            live = split_functions(rendered)
+            blamed = {}
+            for diagnostic in result.diagnostics:
+                if not diagnostic.is_error or diagnostic.line is None:
+                    continue
+                for span in live:
+                    if is_property(span.name) and span.start_line <= diagnostic.line <= span.end_line:
+                        blamed.setdefault(span.name, str(diagnostic).splitlines()[0])
+            if not blamed:
+                break
+            dropped.update(blamed)
+
+        # errors outside the properties: check the contract compiles without any of them, then bisect
+        remaining = [name for name in properties if name not in dropped]
+        base = dict(dropped, **{name: None for name in remaining})
+        result = self.compile_variants(filename, [render(code, spans, base)])[0]
+        runs += 1
+        if not result.success:
+            reason = "setUp or helper code does not compile: " + (result.errors[0].splitlines()[0] if result.errors else "unknown error")
+            return self.result(filename, code, spans, properties, {name: reason for name in properties}, False, runs)
+        kept, runs = self.bisect(filename, code, spans, dropped, remaining, runs)
+        for name in remaining:
+            if name not in kept:
+                dropped[name] = "does not compile together with the rest of the suite (found by bisection)"
+        return self.result(filename, code, spans, properties, dropped, True, runs)
+
+    def bisect(self, filename, code, spans, dropped, candidates, runs, kept=()):
+        """Largest subset of candidates that compiles alongside kept, as (kept names, compile runs)."""
+        if not candidates:
+            return list(kept), runs
+        excluded = lambda chosen: dict(dropped, **{n: None for n in candidates if n not in chosen})
+        if len(candidates) == 1:
+            result = self.compile_variants(filename, [render(code, spans, excluded(candidates))])[0]
+            return list(kept) + (candidates if result.success else []), runs + 1
+        middle = len(candidates) // 2
+        halves = [candidates[:middle], candidates[middle:]]
+        results = self.compile_variants(filename, [render(code, spans, excluded(half)) for half in halves])
+        runs += 2
+        if all(r.success for r in results):
+            together = self.compile_variants(filename, [render(code, spans, excluded(candidates))])[0]
+            runs += 1
+            if together.success:
+                return list(kept) + candidates, runs
+        # the second half stays disabled while the first is searched, so its errors cannot mask the first's
+        first, runs = (list(halves[0]), runs) if results[0].success else \
+            self.bisect(filename, code, spans, dict(dropped, **{n: None for n in halves[1]}), halves[0], runs)
+        return self.bisect(filename, code, spans, dict(dropped, **{n: None for n in halves[0] if n not in first}),
+                           halves[1], runs, list(kept) + first)
+
+    def result(self, filename, code, spans, properties, dropped, compiles, runs):
+        pruned = render(code, spans, dropped) if compiles else code
+        if compiles and dropped:
+            pruned = pruned.rstrip("\n") + "\n\n// Properties dropped because they did not compile:\n" + \
+                "".join(f"// - {name}: {reason}\n" for name, reason in dropped.items())
+        kept = [name for name in properties if name not in dropped]
+        return PruneResult(filename, pruned, compiles, kept, dropped, runs)
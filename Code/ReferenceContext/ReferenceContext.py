@@ -0,0 +1,144 @@
+import os
+import re
+from collections import deque
+
+from Backends.Backends import get_backend
+from Prompts.tokens import count_tokens
+from Solidity.Solidity import strip_comments
+
+TOKEN_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[{};]')
+BODY_HEADER_RE = re.compile(r"(function|modifier|constructor|fallback|receive)\b")
+
+
+def extract_signatures(code):
+    """Declarations of a Solidity source with every function and modifier body dropped."""
+    code = strip_comments(code)
+    out = []
+    depth = 0
+    start = 0
+    skip_depth = None
+    in_import = False
+    for match in TOKEN_RE.finditer(code):
+        token = match.group()
+        if token not in "{};":
+            continue
+        if in_import and token != ";":
+            continue
+        if skip_depth is not None:
+            if token == "{":
+                depth += 1
+            elif token == "}":
+                depth -= 1
+                if depth == skip_depth:
+                    skip_depth = None
+                    start = match.end()
+            continue
+        segment = " ".join(code[start:match.start()].split())
+        indent = "    " * depth
+        if token == "{" and segment.startswith("import"):
+            # import {A, B} from "..."; is a single statement
+            in_import = True
+            continue
+        in_import = False
+        if token == "{":
+            if BODY_HEADER_RE.match(segment):
+                out.append(indent + segment + ";")
+                skip_depth = depth
+            else:
+                out.append(indent + segment + " {")
+            depth += 1
+        elif token == ";":
+            if segment:
+                out.append(indent + segment + ";")
+        else:
+            if segment:
+                out.append(indent + "    " + segment)
+            depth = max(depth - 1, 0)
+            out.append("    " * depth + "}")
+        start = match.end()
+    return "\n".join(out)
+
+
+class ReferenceContextBuilder:
+    """
+    Builds the references section of a prompt from the import graph in the ProjectIndex.
+    Imports are followed transitively (remappings included) and every file appears once.
+    When everything does not fit the token budget, files are kept by priority: shallower imports
+    first, interfaces before other files, and declaration-only signatures before full bodies.
+    """
+
+    def __init__(self, index, modelname, budget=None):
+        self.index = index
+        self.modelname = modelname
+        self.budget = budget if budget is not None else get_backend(modelname).reference_budget
+        self.rendered = {}
+
+    def files(self, code, path=None, base_dir=None):
+        """[(import path as written, resolved path, depth)] for the transitive imports of a source."""
+        summary = self.index.get(path) if path is not None else None
+        if summary is not None:
+            direct = [(i, r) for i, r in zip(summary["imports"], summary["resolved"]) if r]
+            seen = {os.path.normpath(os.path.abspath(path))}
+        else:
+            direct = self.index.resolve_code_imports(code, base_dir or self.index.root)
+            seen = set()
+        found = []
+        queue = deque((importpath, resolved, 1) for importpath, resolved in direct)
+        while queue:
+            importpath, resolved, depth = queue.popleft()
+            if resolved in seen:
+                continue
+            seen.add(resolved)
+            found.append((importpath, resolved, depth))
+            summary = self.index.get(resolved)
+            if summary is None:
+                continue
+            for child, child_resolved in zip(summary["imports"], summary["resolved"]):
+                if child_resolved and child_resolved not in seen:
+                    queue.append((child, child_resolved, depth + 1))
+        return found
+
+    def render(self, resolved):
+        # (full text, full tokens, signatures, signature tokens), memoised by path and mtime
+        key = (resolved, os.path.getmtime(resolved))
+        if key not in self.rendered:
+            with open(resolved, "r") as file:
+                full = file.read()
+            summary = self.index.get(resolved) or {"contracts": []}
+            kinds = {c["kind"] for c in summary["contracts"]}
+            signatures = full if kinds == {"interface"} else extract_signatures(full)
+            full_tokens = count_tokens(full, self.modelname)
+            signature_tokens = full_tokens if signatures is full else count_tokens(signatures, self.modelname)
+            self.rendered[key] = (full, full_tokens, signatures, signature_tokens)
+        return self.rendered[key]
+
+    def build(self, code, path=None, base_dir=None):
+        candidates = []
+        for importpath, resolved, depth in self.files(code, path, base_dir):
+            summary = self.index.get(resolved) or {"contracts": []}
+            is_interface = bool(summary["contracts"]) and all(c["kind"] == "interface" for c in summary["contracts"])
+            candidates.append((depth, 0 if is_interface else 1, importpath, resolved))
+        candidates.sort(key=lambda c: (c[0], c[1]))
+
+        # first pass: signatures for as many files as fit, second pass: upgrade to full bodies
+        remaining = self.budget
+        chosen = {}
+        for _, _, importpath, resolved in candidates:
+            full, full_tokens, signatures, signature_tokens = self.render(resolved)
+            if signature_tokens <= remaining:
+                chosen[resolved] = signatures
+                remaining -= signature_tokens
+        for _, _, importpath, resolved in candidates:
+            if resolved not in chosen:
+                continue
+            full, full_tokens, signatures, signature_tokens = self.render(resolved)
+            if chosen[resolved] is not full and full_tokens - signature_tokens <= remaining:
+                chosen[resolved] = full
+                remaining -= full_tokens - signature_tokens
+
+        referencecontracts = ""
+        for _, _, importpath, resolved in candidates:
+            if resolved in chosen:
+                label = importpath if chosen[resolved] is self.render(resolved)[0] else importpath + " (signatures only)"
+                referencecontracts += label + ":\n" + chosen[resolved] + "\n\n"
+        return referencecontracts
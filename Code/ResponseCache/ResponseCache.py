@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".llm_cache")
+
+
+class ResponseCache:
+    """
+    Persistent content-addressed cache for LLM responses.
+    Entries are keyed by sha256(model name, temperature, prompt text) and evicted
+    least-recently-used first once the stored responses exceed max_bytes.
+    Set INVARIANT_CACHE=off (or enabled=False) to bypass it.
+    """
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024, enabled=None):
+        self.path = path or os.path.join(CACHE_DIR, "responses.sqlite3")
+        self.max_bytes = max_bytes
+        if enabled is None:
+            enabled = os.environ.get("INVARIANT_CACHE", "on").lower() not in ("off", "0", "false", "no")
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = None
+        if self.enabled:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, temperature REAL, response TEXT, "
+                "size INTEGER, created REAL, accessed REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            self.conn.commit()
+            self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, temperature, prompt):
+        payload = json.dumps([model, temperature, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model, temperature, prompt):
+        if not self.enabled:
+            return None
+        key = self.make_key(model, temperature, prompt)
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return row[0]
+
+    def put(self, model, temperature, prompt, response):
+        if not self.enabled or response is None:
+            return
+        key = self.make_key(model, temperature, prompt)
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.total_bytes -= old[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, temperature, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, temperature, response, size, now, now),
+            )
+            self.total_bytes += size
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        # caller holds self.lock
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC LIMIT 64").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for key, size in rows:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.total_bytes = 0
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": self.total_bytes if self.enabled else 0,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,324 @@
+import re
+from dataclasses import dataclass, field
+
+from Pruner.Pruner import is_property
+from Solidity.Solidity import MASK_RE, mask
+
+UNIT_RE = re.compile(r"\b(?:abstract\s+contract|contract|library|interface)\s+(\w+)")
+SPLIT_RE = re.compile(r"[{}();]")
+# a closing brace that does not end the statement: if/else, try/catch and call options such as f{value: 1}()
+CONTINUED_RE = re.compile(r"\s*(?:else\b|catch\b|\()")
+KIND_RE = re.compile(r"(function|modifier|event|error|struct|enum|using|constructor|receive|fallback)\b\s*(\w*)")
+LOCAL_RE = re.compile(r"^[\w.]+(?:\[\d*\])*(?:\s+(?:memory|storage|calldata))?\s+(\w+)\s*=")
+TARGET_KINDS = ("contract", "library", "abstract")
+DECLARATION_KINDS = ("variable", "event", "error", "struct", "enum", "using")
+# rough size of what the model writes: contract scaffolding and setUp, plus a few properties per function
+SCAFFOLD_TOKENS = 800
+TOKENS_PER_FUNCTION = 350
+
+
+@dataclass
+class Shard:
+    parent: str  # file name of the sharded contract
+    index: int  # 1-based
+    count: int
+    functions: list  # names of the functions this shard tests
+    code: str  # the contract with the bodies of the other shards' functions elided
+
+    @property
+    def filename(self):
+        stem = self.parent[:-len(".sol")] if self.parent.endswith(".sol") else self.parent
+        return f"{stem}.shard{self.index}.sol"
+
+
+@dataclass
+class Unit:
+    name: str
+    start: int
+    open: int  # offset of the opening brace
+    end: int  # offset just past the closing brace
+
+
+@dataclass
+class Member:
+    text: str  # source, with the whitespace and comments in front of it
+    masked: str
+    kind: str  # function, modifier, event, ..., or variable
+    name: str
+    key: str  # members with the same key declare the same thing
+    body: str  # normalised source, to tell identical copies from conflicting ones
+
+
+@dataclass
+class MergeResult:
+    code: str
+    shards: int  # shard outputs that contained a contract
+    duplicates: int = 0  # members dropped because an earlier shard already declared them
+    renamed: list = field(default_factory=list)  # properties renamed because another shard used the name
+
+
+def testable(summary, contract_name):
+    """Functions of the contract under test that a test calls: public and external ones, or a library's non-private ones."""
+    contracts = [c for c in summary["contracts"] if c["kind"] in TARGET_KINDS]
+    target = next((c for c in contracts if c["name"] == contract_name), contracts[0] if contracts else None)
+    if target is None:
+        return []
+    library = target["kind"] == "library"
+    return [f for f in target["functions"] if f["name"] and f["name"] != "constructor"
+            and (f["visibility"] in ("public", "external") or (library and f["visibility"] != "private"))]
+
+
+def bodies(code, masked, functions):
+    """(function, signature start, body start, body end) from the AST line ranges; functions without a body are skipped."""
+    starts = [0] + [m.end() for m in re.finditer("\n", code)]
+    found = []
+    for function in functions:
+        first, last = function.get("start_line"), function.get("end_line")
+        if not first or not last or last > len(starts):
+            continue
+        begin = starts[first - 1]
+        line_end = starts[last] if last < len(starts) else len(code)
+        open_ = masked.find("{", begin, line_end)
+        if open_ == -1 or masked.find(";", begin, open_) != -1:
+            continue
+        close = masked.rfind("}", open_, line_end)
+        if close != -1:
+            found.append((function, begin, open_, close + 1))
+    return found
+
+
+def elide(code, spans):
+    out = []
+    position = 0
+    for start, end in sorted(spans):
+        out.append(code[position:start] + "{ /* tested in another shard */ }")
+        position = end
+    out.append(code[position:])
+    return "".join(out)
+
+
+def closing_brace(masked, open_):
+    depth = 0
+    for match in re.finditer(r"[{}]", masked[open_:]):
+        depth += 1 if match.group() == "{" else -1
+        if depth == 0:
+            return open_ + match.end()
+    return len(masked)
+
+
+def top_level(masked):
+    units = []
+    for match in UNIT_RE.finditer(masked):
+        if units and match.start() < units[-1].end:
+            continue
+        open_ = masked.find("{", match.end())
+        if open_ == -1:
+            break
+        units.append(Unit(match.group(1), match.start(), open_, closing_brace(masked, open_)))
+    return units
+
+
+def split_members(masked, start, end):
+    """(start, end) of the members of a contract body, or the statements of a function body, between start and end."""
+    spans = []
+    depth = parens = 0
+    begin = start
+    for match in SPLIT_RE.finditer(masked, start, end):
+        char = match.group()
+        if char == "(":
+            parens += 1
+        elif char == ")":
+            parens -= 1
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0 and parens == 0 and not CONTINUED_RE.match(masked, match.end(), end):
+                spans.append((begin, match.end()))
+                begin = match.end()
+        elif depth == 0 and parens == 0:
+            spans.append((begin, match.end()))
+            begin = match.end()
+    return spans
+
+
+def normal(text):
+    # comments removed and whitespace collapsed; string contents are kept
+    return " ".join(MASK_RE.sub(lambda m: m.group() if m.group()[0] in "\"'" else " ", text).split())
+
+
+def member(text, masked):
+    declaration = " ".join(masked.split())
+    match = KIND_RE.match(declaration)
+    if match is None:
+        names = re.findall(r"\w+", re.split(r"=(?!>)|;", declaration)[0])
+        name = names[-1] if names else declaration
+        return Member(text, masked, "variable", name, f"variable {name}", normal(text))
+    kind, name = match.groups()
+    if kind == "function":
+        key = "function " + re.sub(r"\s*([(),])\s*", r"\1", declaration.split("{")[0].rstrip(" ;"))
+    elif kind == "using":
+        key = declaration
+    else:
+        key = f"{kind} {name}"
+    return Member(text, masked, kind, name, key, normal(text))
+
+
+def contract_members(code, masked, unit):
+    """The members of a contract and the text between the last of them and the closing brace."""
+    close = unit.end - 1 if masked[unit.end - 1:unit.end] == "}" else unit.end
+    spans = split_members(masked, unit.open + 1, close)
+    tail = spans[-1][1] if spans else unit.open + 1
+    return [member(code[s:e], masked[s:e]) for s, e in spans], code[tail:close]
+
+
+def merge_setup(target, other):
+    """Appends the statements of other's setUp that target's setUp does not run yet; True when any were added."""
+    def statements(m):
+        open_, close = m.masked.find("{"), m.masked.rfind("}")
+        if open_ == -1 or close <= open_:
+            return [], None
+        return [m.text[s:e] for s, e in split_members(m.masked, open_ + 1, close)], close
+
+    ours, close = statements(target)
+    theirs, _ = statements(other)
+    if close is None:
+        return False
+    seen = {normal(s) for s in ours}
+    declared = {match.group(1) for match in (LOCAL_RE.match(normal(s)) for s in ours) if match}
+    added = []
+    for statement in theirs:
+        text = normal(statement)
+        local = LOCAL_RE.match(text)
+        # a local the setUp already declares would be a redeclaration, even with another initial value
+        if text in seen or (local and local.group(1) in declared):
+            continue
+        added.append(statement)
+        seen.add(text)
+        if local:
+            declared.add(local.group(1))
+    if not added:
+        return False
+    end = len(target.text[:close].rstrip())
+    target.text = target.text[:end] + "".join(added) + target.text[end:]
+    target.masked = mask(target.text)
+    target.body = normal(target.text)
+    return True
+
+
+def rename(m, name):
+    match = re.search(rf"\bfunction\s+({re.escape(m.name)})\b", m.masked)
+    text = m.text[:match.start(1)] + name + m.text[match.end(1):]
+    return member(text, mask(text))
+
+
+def merge(codes):
+    """
+    One test file from the outputs of the shards of a contract, in shard order. The first shard
+    is kept as written; later shards add the imports, helper contracts and members it lacks.
+    setUp bodies are merged statement by statement, helpers, variables and other declarations
+    keep their first copy, and a test that reuses another shard's name with a different body is
+    renamed with the shard number.
+    """
+    parsed = []
+    for number, code in enumerate(codes, 1):
+        masked = mask(code)
+        units = top_level(masked)
+        if units:
+            parsed.append((number, code, masked, units))
+    if not parsed:
+        return MergeResult(codes[0] if codes else "", 0)
+
+    _, base_code, base_masked, base_units = parsed[0]
+    result = MergeResult("", len(parsed))
+    header = base_code[:base_units[0].start].rstrip().split("\n")
+    imports = {line.strip() for line in header if line.strip().startswith("import")}
+    others = {unit.name: base_code[unit.start:unit.end] for unit in base_units[:-1]}
+    test = base_units[-1]
+    members, tail = contract_members(base_code, base_masked, test)
+    by_key = {m.key: m for m in members}
+    names = {m.name for m in members if m.kind == "function"}
+
+    for number, code, masked, units in parsed[1:]:
+        for line in code[:units[0].start].split("\n"):
+            if line.strip().startswith("import") and line.strip() not in imports:
+                imports.add(line.strip())
+                last = max((i for i, l in enumerate(header) if l.strip().startswith("import")), default=len(header) - 1)
+                header.insert(last + 1, line)
+        for unit in units[:-1]:
+            others.setdefault(unit.name, code[unit.start:unit.end])
+        for m in contract_members(code, masked, units[-1])[0]:
+            existing = by_key.get(m.key)
+            if existing is None:
+                if m.kind in DECLARATION_KINDS:
+                    # state variables and type declarations go after the ones already there, before the functions
+                    position = max((i + 1 for i, o in enumerate(members) if o.kind in DECLARATION_KINDS), default=0)
+                    members.insert(position, m)
+                else:
+                    members.append(m)
+                by_key[m.key] = m
+                if m.kind == "function":
+                    names.add(m.name)
+            elif existing.body == m.body:
+                result.duplicates += 1
+            elif m.kind == "function" and m.name == "setUp":
+                merge_setup(existing, m)
+            elif m.kind == "function" and is_property(m.name):
+                name = f"{m.name}_{number}"
+                while name in names:
+                    name += "_"
+                m = rename(m, name)
+                members.append(m)
+                by_key[m.key] = m
+                names.add(name)
+                result.renamed.append(name)
+            else:
+                result.duplicates += 1
+
+    contract = base_code[test.start:test.open + 1] + "".join(m.text for m in members) + tail.rstrip() + "\n}"
+    result.code = "\n".join(header).rstrip() + "\n\n" + "\n\n".join(list(others.values()) + [contract]) + "\n"
+    return result
+
+
+class Sharder:
+    """
+    Splits a contract too large for one generation into groups of the functions a test calls,
+    using the line ranges of the parsed AST. Each group stays within what the model can write
+    in one response (max_output_tokens) and keeps overloads together. A shard sees the whole
+    contract with the bodies of the other groups' functions elided, so every prompt carries the
+    same declarations and internal helpers. merge() puts the shard outputs back together.
+    """
+
+    def __init__(self, count_tokens, max_output_tokens=4096, prompt_budget=10000, max_functions=None):
+        self.count_tokens = count_tokens
+        self.max_functions = max_functions or max(1, (max_output_tokens - SCAFFOLD_TOKENS) // TOKENS_PER_FUNCTION)
+        # source of the functions under test per shard, leaving room for references and examples
+        self.max_source_tokens = max(prompt_budget // 4, 1)
+
+    def plan(self, code, summary, contract_name):
+        """Groups of function names in source order; [] when the contract fits one generation."""
+        if not summary or not summary.get("parsed"):
+            return []  # regex summaries have no end lines
+        masked = mask(code)
+        sizes = {}
+        for function, begin, _, end in bodies(code, masked, testable(summary, contract_name)):
+            sizes[function["name"]] = sizes.get(function["name"], 0) + self.count_tokens(code[begin:end])
+        groups, current, size = [], [], 0
+        for name, tokens in sizes.items():
+            if current and (len(current) >= self.max_functions or size + tokens > self.max_source_tokens):
+                groups.append(current)
+                current, size = [], 0
+            current.append(name)
+            size += tokens
+        if current:
+            groups.append(current)
+        return groups if len(groups) > 1 else []
+
+    def split(self, filename, code, summary, contract_name):
+        groups = self.plan(code, summary, contract_name)
+        if not groups:
+            return []
+        spans = bodies(code, mask(code), testable(summary, contract_name))
+        return [Shard(filename, i, len(groups), group,
+                      elide(code, [(start, end) for function, _, start, end in spans if function["name"] not in group]))
+                for i, group in enumerate(groups, 1)]
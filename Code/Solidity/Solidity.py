@@ -0,0 +1,15 @@
+import re
+
+# strings and comments in one pass, so quotes in comments and slashes in strings are not misread;
+# Solidity strings cannot span lines, so a stray apostrophe never masks more than the rest of its line
+MASK_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|//[^\n]*|/\*.*?\*/', re.S)
+
+
+def mask(code):
+    # comments and string contents become spaces; lines and offsets stay where they were
+    return MASK_RE.sub(lambda m: re.sub(r"[^\n]", " ", m.group()), code)
+
+
+def strip_comments(code):
+    # comments removed, string literals kept as they are
+    return MASK_RE.sub(lambda m: m.group() if m.group()[0] in "\"'" else "", code)
@@ -0,0 +1,165 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+STAGES = ["reference_resolution", "example_retrieval", "shard", "prompt_build", "llm_call", "extraction", "fix", "merge", "compile", "repair"]
+
+
+@dataclass
+class StageRecord:
+    contract: str
+    stage: str
+    step: int = 0  # prompt-chain stage for llm_call, 0 otherwise
+    started: float = 0.0
+    queue_time: float = 0.0
+    latency: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    retries: int = 0
+    cached: bool = False
+    cost: float = 0.0
+    ok: bool = True
+    error: Optional[str] = None
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class Telemetry:
+    """
+    Per-contract, per-stage measurements of one generation run: wall time, time spent queued
+    behind the concurrency and rate limits, tokens counted with the backend's tokenizer,
+    retries and the estimated cost from the backend's pricing.
+
+        with telemetry.stage("Foo.sol", "prompt_build") as record:
+            record.input_tokens = count_tokens(prompt)
+    """
+
+    def __init__(self, backend=None, count_tokens=None):
+        self.backend = backend
+        self.count_tokens = count_tokens
+        self.records = []
+        self.lock = threading.Lock()
+        self.exported = {}  # jsonl path -> records already written there
+
+    def tokens(self, text):
+        if not text:
+            return 0
+        if self.count_tokens is not None:
+            return self.count_tokens(text)
+        from Prompts.tokens import count_tokens
+        return count_tokens(text, self.backend.family if self.backend else "")
+
+    def add(self, record):
+        if record.stage == "llm_call" and not record.cached and self.backend is not None:
+            record.cost = self.backend.cost(record.input_tokens, record.output_tokens)
+        with self.lock:
+            self.records.append(record)
+        return record
+
+    def observe(self, contract, stage, **fields):
+        return self.add(StageRecord(contract, stage, started=fields.pop("started", time.time()), **fields))
+
+    @contextlib.contextmanager
+    def stage(self, contract, stage, **fields):
+        record = StageRecord(contract, stage, started=time.time(), **fields)
+        start = time.monotonic()
+        try:
+            yield record
+        except Exception as e:
+            record.ok = False
+            record.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record.latency = time.monotonic() - start
+            self.add(record)
+
+    def summary(self):
+        """{stage: {count, p50, p95, total latency, queue time, tokens, retries, cost}}"""
+        with self.lock:
+            records = list(self.records)
+        stages = {}
+        for name in STAGES + sorted({r.stage for r in records} - set(STAGES)):
+            selected = [r for r in records if r.stage == name]
+            if not selected:
+                continue
+            latencies = [r.latency for r in selected]
+            stages[name] = {
+                "count": len(selected),
+                "errors": sum(not r.ok for r in selected),
+                "cached": sum(r.cached for r in selected),
+                "latency_p50": percentile(latencies, 0.5),
+                "latency_p95": percentile(latencies, 0.95),
+                "latency_total": sum(latencies),
+                "queue_time_total": sum(r.queue_time for r in selected),
+                "input_tokens": sum(r.input_tokens for r in selected),
+                "output_tokens": sum(r.output_tokens for r in selected),
+                "retries": sum(r.retries for r in selected),
+                "cost": sum(r.cost for r in selected),
+            }
+        return stages
+
+    def export_jsonl(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # appends only records not written to this path yet, so exporting twice never duplicates
+        path = os.path.abspath(path)
+        with self.lock:
+            records = self.records[self.exported.get(path, 0):]
+            self.exported[path] = len(self.records)
+        with open(path, "a") as file:
+            for record in records:
+                file.write(json.dumps(asdict(record)) + "\n")
+
+    def export_prometheus(self, path, prefix="invariant"):
+        # node_exporter textfile format; the file is replaced atomically so scrapes never see half of it
+        model = self.backend.name if self.backend else ""
+        lines = [
+            f"# HELP {prefix}_stage_latency_seconds Wall time per contract and stage.",
+            f"# TYPE {prefix}_stage_latency_seconds summary",
+        ]
+        summary = self.summary()
+        for stage, s in summary.items():
+            labels = f'stage="{stage}",model="{model}"'
+            lines.append(f'{prefix}_stage_latency_seconds{{{labels},quantile="0.5"}} {s["latency_p50"]:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds{{{labels},quantile="0.95"}} {s["latency_p95"]:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_sum{{{labels}}} {s["latency_total"]:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_count{{{labels}}} {s["count"]}')
+        metrics = [
+            ("stage_queue_seconds_total", "counter", "Time spent waiting for concurrency and rate limits.", "queue_time_total"),
+            ("stage_input_tokens_total", "counter", "Prompt tokens per stage.", "input_tokens"),
+            ("stage_output_tokens_total", "counter", "Completion tokens per stage.", "output_tokens"),
+            ("stage_retries_total", "counter", "Retried model calls per stage.", "retries"),
+            ("stage_errors_total", "counter", "Failed stage executions.", "errors"),
+            ("stage_cost_dollars_total", "counter", "Estimated model cost in USD.", "cost"),
+        ]
+        for name, kind, help_text, key in metrics:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for stage, s in summary.items():
+                lines.append(f'{prefix}_{name}{{stage="{stage}",model="{model}"}} {s[key]}')
+        tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(tmp_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def export(self, folder):
+        self.export_jsonl(os.path.join(folder, "telemetry.jsonl"))
+        self.export_prometheus(os.path.join(folder, "telemetry.prom"))
+
+    def print_summary(self):
+        for stage, s in self.summary().items():
+            print(f"{stage:>20}: n={s['count']} p50={s['latency_p50']:.2f}s p95={s['latency_p95']:.2f}s "
+                  f"queued={s['queue_time_total']:.2f}s in={s['input_tokens']} out={s['output_tokens']} "
+                  f"retries={s['retries']} cost=${s['cost']:.4f}")
@@ -0,0 +1,183 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from CompilerPool.CompilerPool import FORGE, CompilerPool
+from Diagnostics.Diagnostics import FORGE_MAX_OUTPUT, decode_json
+from Process.Process import get_process_manager
+
+DURATION_RE = re.compile(r"([\d.]+)\s*(ns|µs|us|ms|s)")
+DURATION_UNITS = {"ns": 1e-9, "µs": 1e-6, "us": 1e-6, "ms": 1e-3, "s": 1.0}
+# forge test --json status -> TestRecord status; anything else (Failure) is a fail
+STATUSES = {"Success": "pass", "Skipped": "skip"}
+
+
+@dataclass
+class TestRecord:
+    suite: str  # test file relative to the project, e.g. test/Foo.t.sol
+    contract: str
+    test: str
+    status: str  # pass, fail, skip, timeout or error
+    reason: Optional[str] = None
+    kind: Optional[str] = None  # unit, fuzz or invariant
+    gas: Optional[int] = None
+    runs: Optional[int] = None
+    counterexample: Optional[str] = None
+    duration: Optional[float] = None
+    logs: Optional[str] = None
+
+
+def parse_duration(value):
+    # forge reports durations as {"secs", "nanos"} or as text like "1.23ms"
+    if isinstance(value, dict):
+        return value.get("secs", 0) + value.get("nanos", 0) / 1e9
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = DURATION_RE.search(str(value or ""))
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)] if match else None
+
+
+def parse_kind(kind):
+    # {"Unit": {"gas": n}}, {"Fuzz": {"runs": n, "mean_gas": ..}} or {"Invariant": {"runs": n, ...}}
+    if not isinstance(kind, dict) or not kind:
+        return None, None, None
+    name, data = next(iter(kind.items()))
+    data = data or {}
+    return name.lower(), data.get("gas", data.get("median_gas", data.get("mean_gas"))), data.get("runs")
+
+
+def parse_results(data, suite):
+    records = []
+    for key, suite_result in (data or {}).items():
+        contract = key.split(":")[-1]
+        for test, result in (suite_result.get("test_results") or {}).items():
+            kind, gas, runs = parse_kind(result.get("kind"))
+            counterexample = result.get("counterexample")
+            records.append(TestRecord(
+                suite=key.split(":")[0] if ":" in key else suite,
+                contract=contract,
+                test=test,
+                status=STATUSES.get(result.get("status"), "fail"),
+                reason=result.get("reason"),
+                kind=kind,
+                gas=gas,
+                runs=runs,
+                counterexample=json.dumps(counterexample) if counterexample else None,
+                duration=parse_duration(result.get("duration")),
+                logs="\n".join(result.get("decoded_logs") or []) or None,
+            ))
+    return records
+
+
+class TestResultStore:
+    """sqlite store of test records, one row per test of every run, for querying across runs."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, started REAL, project TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "run_id INTEGER, suite TEXT, contract TEXT, test TEXT, status TEXT, reason TEXT, kind TEXT, "
+            "gas INTEGER, runs INTEGER, counterexample TEXT, duration REAL, logs TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_run ON results(run_id, suite)")
+        self.conn.commit()
+
+    def start_run(self, project):
+        with self.lock:
+            cursor = self.conn.execute("INSERT INTO runs (started, project) VALUES (?, ?)", (time.time(), project))
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def add(self, run_id, records):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, r.suite, r.contract, r.test, r.status, r.reason, r.kind, r.gas, r.runs,
+                  r.counterexample, r.duration, r.logs) for r in records],
+            )
+            self.conn.commit()
+
+    def latest_run(self):
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(id) FROM runs").fetchone()
+        return row[0]
+
+    def results(self, run_id=None, status=None, suite=None):
+        run_id = run_id if run_id is not None else self.latest_run()
+        query = "SELECT suite, contract, test, status, reason, kind, gas, runs, counterexample, duration, logs " \
+                "FROM results WHERE run_id = ?"
+        params = [run_id]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        if suite is not None:
+            query += " AND suite = ?"
+            params.append(suite)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [TestRecord(*row) for row in rows]
+
+
+class TestRunner:
+    """
+    Runs generated test suites with `forge test --json`, one suite per CompilerPool sandbox,
+    so suites execute in parallel across cores without sharing build state. Every suite has
+    its own time budget; a suite that runs out is recorded as a timeout instead of blocking
+    the run. Results are parsed into TestRecords and kept in a TestResultStore.
+    """
+    __test__ = False  # not a pytest test class despite the name
+
+    def __init__(self, project_path, workers=None, timeout=600, store_path=None, compiler_pool=None):
+        self.project_path = project_path.rstrip("/")
+        self.pool = compiler_pool or CompilerPool(self.project_path, workers=workers)
+        self.timeout = timeout
+        self.store = TestResultStore(store_path or os.path.join(self.project_path, ".test_results.sqlite3"))
+
+    def run_suite(self, test_path, timeout=None):
+        timeout = timeout or self.timeout
+        start = time.monotonic()
+        with self.pool.sandbox(test_path) as (sandbox, relative_path):
+            proc = get_process_manager().run_sync([FORGE, "test", "--json", "--match-path", relative_path],
+                                                  sandbox, timeout=timeout, max_output=FORGE_MAX_OUTPUT)
+        if proc.timed_out:
+            # the manager has already killed forge and the fuzzer workers it spawned
+            return [TestRecord(relative_path, "", "*", "timeout", f"suite exceeded its {timeout}s budget",
+                               duration=time.monotonic() - start)]
+        data = decode_json(proc.stdout)
+        records = parse_results(data, relative_path) if data is not None else []
+        if not records and proc.returncode != 0:
+            # nothing ran: the suite failed to compile or forge itself failed
+            message = (proc.stderr or proc.stdout).strip()[-2000:] or f"forge exited with {proc.returncode}"
+            records = [TestRecord(relative_path, "", "*", "error", message, duration=time.monotonic() - start)]
+        return records
+
+    def run(self, test_paths, timeout=None):
+        """Runs every suite in parallel and returns (run id, records); records are also stored under the run id."""
+        run_id = self.store.start_run(self.project_path)
+        records = []
+        with ThreadPoolExecutor(max_workers=self.pool.workers) as executor:
+            for suite_records in executor.map(lambda path: self.run_suite(path, timeout), test_paths):
+                self.store.add(run_id, suite_records)
+                records.extend(suite_records)
+        return run_id, records
+
+    @staticmethod
+    def summary(records):
+        counts = {}
+        for record in records:
+            counts[record.status] = counts.get(record.status, 0) + 1
+        return counts
+
+    @staticmethod
+    def to_dicts(records):
+        return [asdict(record) for record in records]
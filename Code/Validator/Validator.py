@@ -0,0 +1,227 @@
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from Diagnostics.Diagnostics import Diagnostic
+from Solidity.Solidity import mask
+
+CONTRACT_RE = re.compile(r"\b(?:abstract\s+)?contract\s+(\w+)(?:\s+is\s+([^{]*))?\{")
+IMPORT_RE = re.compile(r"""import\s+(?:[^'";]*?\s+from\s+)?["']([^"']+)["']""")
+STORAGE_WORDS = r"(?:(?:public|internal|private|immutable|memory|storage|calldata)\s+)*"
+TEST_BASES = ("Test", "DSTest")
+PUBLIC = ("public", "external")
+
+
+@dataclass
+class Issue:
+    kind: str  # truncated, unbalanced, no-test-contract, unknown-member or non-public-member
+    message: str
+    line: Optional[int] = None
+
+    def __str__(self):
+        return f"line {self.line}: {self.message}" if self.line else self.message
+
+
+@dataclass
+class ValidationResult:
+    filename: str
+    issues: list = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def valid(self):
+        return not self.issues
+
+    @property
+    def reasons(self):
+        return [str(issue) for issue in self.issues]
+
+    def diagnostics(self, file=None):
+        # the issues as compiler-style diagnostics, so fixers and repair can treat them like solc errors
+        file = file or os.path.join("test", self.filename)
+        return [Diagnostic(file, issue.line, None, f"validator:{issue.kind}", "error", issue.message)
+                for issue in self.issues]
+
+
+@dataclass
+class TargetAbi:
+    name: str
+    kind: str
+    callable: set  # externally callable functions and public getters
+    hidden: dict  # internal/private member -> visibility
+    complete: bool  # every base contract was found, so unknown names really are unknown
+
+
+def line_of(code, offset):
+    return code.count("\n", 0, offset) + 1
+
+
+def check_structure(masked):
+    issues = []
+    if not masked.strip():
+        return [Issue("truncated", "the output contains no code")]
+    depth = 0
+    for match in re.finditer(r"[{}]", masked):
+        depth += 1 if match.group() == "{" else -1
+        if depth < 0:
+            issues.append(Issue("unbalanced", "closing brace without a matching opening brace", line_of(masked, match.start())))
+            return issues
+    if depth > 0:
+        issues.append(Issue("truncated", f"code ends with {depth} unclosed brace(s)", line_of(masked, len(masked.rstrip()))))
+    elif not masked.rstrip().endswith("}"):
+        issues.append(Issue("truncated", "code does not end with a closing brace", line_of(masked, len(masked.rstrip()))))
+    if masked.count("(") != masked.count(")"):
+        issues.append(Issue("unbalanced", f"{masked.count('(')} opening and {masked.count(')')} closing parentheses"))
+    return issues
+
+
+def test_contracts(masked):
+    found = []
+    for match in CONTRACT_RE.finditer(masked):
+        bases = [base.split("(")[0].strip() for base in (match.group(2) or "").split(",") if base.strip()]
+        if match.group(1).endswith("Test") or any(base in TEST_BASES for base in bases):
+            found.append(match.group(1))
+    return found
+
+
+class Validator:
+    """
+    Millisecond checks that reject generated tests forge would certainly fail on: truncated
+    output, no test contract, unbalanced braces, calls to functions the target contract does not
+    have, and use of its internal or private members. Targets are the contracts of the project
+    files the test imports; their ABI (inherited members included) comes from the parsed
+    summaries of the ProjectIndex, so solidity_parser only ever runs on changed sources.
+    """
+
+    def __init__(self, root, test_dir=None, index=None):
+        self.root = os.path.abspath(root)
+        self.test_dir = os.path.abspath(test_dir or os.path.join(root, "test"))
+        self.index = index
+
+    def get_index(self):
+        if self.index is None:
+            from ProjectIndex.ProjectIndex import get_index
+            self.index = get_index(self.root)
+        return self.index
+
+    def closure(self, paths):
+        """Summaries of paths and everything they import, as {path: summary}."""
+        index = self.get_index()
+        summaries = {}
+        queue = deque(paths)
+        while queue:
+            path = queue.popleft()
+            if path in summaries:
+                continue
+            summary = index.get(path)
+            if summary is None:
+                continue
+            summaries[path] = summary
+            queue.extend(resolved for resolved in summary["resolved"] if resolved and resolved not in summaries)
+        return summaries
+
+    def abi(self, contract, contracts_by_name):
+        callable_, hidden = set(), {}
+        complete = True
+        seen = set()
+        queue = deque([contract])
+        while queue:
+            current = queue.popleft()
+            if current["name"] in seen:
+                continue
+            seen.add(current["name"])
+            library = current["kind"] == "library"
+            for function in current["functions"]:
+                visibility = function["visibility"]
+                # interface members are external; a library's internal functions are callable as Lib.f()
+                if visibility in PUBLIC or current["kind"] == "interface" or (library and visibility != "private"):
+                    callable_.add(function["name"])
+                else:
+                    hidden.setdefault(function["name"], visibility)
+            for variable in current["variables"]:
+                # a library's internal constants are read as Lib.NAME, like its internal functions
+                if variable["visibility"] == "public" or (library and variable["visibility"] != "private"):
+                    callable_.add(variable["name"])
+                else:
+                    hidden.setdefault(variable["name"], variable["visibility"])
+            if not current["parsed"]:
+                complete = False  # regex summaries do not know the base contracts
+            for base in current["bases"]:
+                if base in contracts_by_name:
+                    queue.append(contracts_by_name[base])
+                else:
+                    complete = False
+        for name in callable_:
+            hidden.pop(name, None)
+        return TargetAbi(contract["name"], contract["kind"], callable_, hidden, complete)
+
+    def targets(self, code):
+        index = self.get_index()
+        imports = [index.resolve(path, self.test_dir) for path in IMPORT_RE.findall(code)]
+        project = [path for path in imports if path and path.startswith(self.root + os.sep)
+                   and not os.path.relpath(path, self.root).startswith("lib" + os.sep)]
+        summaries = self.closure(project)
+        contracts_by_name = {c["name"]: dict(c, parsed=summary["parsed"])
+                             for summary in summaries.values() for c in summary["contracts"]}
+        direct = [c["name"] for path in project if path in summaries for c in summaries[path]["contracts"]]
+        return [self.abi(contracts_by_name[name], contracts_by_name) for name in direct]
+
+    def member_uses(self, masked, target):
+        """(member, offset) for every target.member access reachable through the names the test uses."""
+        receivers = set()
+        name = re.escape(target.name)
+        if target.kind == "library":
+            receivers.add(target.name)
+        for match in re.finditer(rf"\b{name}\s+{STORAGE_WORDS}(\w+)\s*[;=,)]", masked):
+            receivers.add(match.group(1))
+        uses = []
+        if receivers:
+            pattern = rf"\b(?:{'|'.join(re.escape(r) for r in receivers)})\s*\.\s*(\w+)"
+            uses += [(m.group(1), m.start(1)) for m in re.finditer(pattern, masked)]
+        # casts such as Target(address(x)).f()
+        cast = re.compile(rf"\b{name}\s*\(")
+        for match in cast.finditer(masked):
+            depth = 0
+            for position in range(match.end() - 1, len(masked)):
+                depth += {"(": 1, ")": -1}.get(masked[position], 0)
+                if depth == 0:
+                    member = re.match(r"\s*\.\s*(\w+)", masked[position + 1:])
+                    if member:
+                        uses.append((member.group(1), position + 1 + member.start(1)))
+                    break
+        return uses
+
+    def check_members(self, masked, targets):
+        issues = []
+        reported = set()
+        for target in targets:
+            for member, offset in self.member_uses(masked, target):
+                if member in target.callable or (target.name, member) in reported:
+                    continue
+                line = line_of(masked, offset)
+                if member in target.hidden:
+                    reported.add((target.name, member))
+                    issues.append(Issue("non-public-member",
+                                        f"{target.name}.{member} is {target.hidden[member]} and cannot be used by the test", line))
+                elif target.complete and member[0].islower() and member not in ("selector", "address"):
+                    # capitalised names are usually errors, events or structs, which the summaries do not list
+                    reported.add((target.name, member))
+                    issues.append(Issue("unknown-member", f"{target.name} has no function or public variable {member}", line))
+        return issues
+
+    def validate(self, code, filename=""):
+        start = time.monotonic()
+        masked = mask(code)
+        issues = check_structure(masked)
+        if not test_contracts(masked):
+            issues.append(Issue("no-test-contract", "no contract named *Test or inheriting forge-std's Test"))
+        if not any(issue.kind in ("truncated", "unbalanced") for issue in issues):
+            issues += self.check_members(masked, self.targets(code))
+        return ValidationResult(filename, issues, time.monotonic() - start)
+
+    def validate_file(self, path):
+        with open(path, "r") as file:
+            return self.validate(file.read(), os.path.basename(path))
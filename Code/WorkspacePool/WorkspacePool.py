@@ -0,0 +1,189 @@
+import atexit
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+from Process.Process import get_process_manager
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_DIR = os.path.join(CODE_DIR, ".workspaces", "template")
+WORKSPACES_DIR = os.path.join(CODE_DIR, ".workspaces", "pool")
+CONFIG_FILES = ["foundry.toml", "remappings.txt"]
+# per-workspace state that is never shared through links
+PRIVATE_DIRS = ["src", "test", "cache", "out"]
+
+
+def forge_binary():
+    return shutil.which("forge") or os.path.expanduser("~/.foundry/bin/forge")
+
+
+def has_libraries(project):
+    lib = os.path.join(project, "lib")
+    return os.path.isdir(lib) and bool(os.listdir(lib))
+
+
+def link_libraries(source_lib, target_lib, replace=False):
+    # lib/ itself is a real folder so a project can still add libraries; each entry links to the shared copy.
+    # replace=True lets source_lib's entries take the place of links to another copy of the same library.
+    source_lib = os.path.abspath(source_lib)
+    os.makedirs(target_lib, exist_ok=True)
+    if not os.path.isdir(source_lib):
+        return
+    for name in os.listdir(source_lib):
+        target = os.path.join(target_lib, name)
+        if replace and os.path.islink(target):
+            os.remove(target)
+        if os.path.lexists(target):
+            continue
+        try:
+            os.symlink(os.path.join(source_lib, name), target, target_is_directory=True)
+        except OSError:
+            shutil.copytree(os.path.join(source_lib, name), target)
+
+
+def link_workspace(source, target, exclude=PRIVATE_DIRS):
+    """
+    Makes target a Foundry project that shares source's libraries and other folders through symlinks
+    and has its own copies of the config files and its own (empty) src/, test/, cache/ and out/.
+    """
+    os.makedirs(target, exist_ok=True)
+    for name in os.listdir(source):
+        path = os.path.join(source, name)
+        destination = os.path.join(target, name)
+        if name in exclude or name.startswith("."):
+            continue
+        if name == "lib":
+            link_libraries(path, destination)
+        elif os.path.isdir(path):
+            if not os.path.lexists(destination):
+                os.symlink(os.path.abspath(path), destination, target_is_directory=True)
+        elif os.path.isfile(path):
+            shutil.copy2(path, destination)
+    for name in ["src", "test"]:
+        os.makedirs(os.path.join(target, name), exist_ok=True)
+    return target
+
+
+def clear_folder(path):
+    if not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        child = os.path.join(path, name)
+        if os.path.isdir(child) and not os.path.islink(child):
+            shutil.rmtree(child)
+        else:
+            os.remove(child)
+
+
+class WorkspacePool:
+    """
+    Keeps `size` ready Foundry workspaces built from one cached template (forge init plus forge-std),
+    so no request path runs forge init or copies lib/. Workspaces link the template's libraries, so
+    creating one takes milliseconds. Released workspaces are emptied and go back into the pool;
+    their cache/ and out/ are kept because forge's cache is content-addressed.
+    """
+
+    def __init__(self, size=None, template_dir=TEMPLATE_DIR, root=WORKSPACES_DIR):
+        self.size = size or int(os.environ.get("INVARIANT_WORKSPACES", "4"))
+        self.template_dir = template_dir
+        self.root = root
+        self.ready = queue.Queue()
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.ensure_template()
+        os.makedirs(self.root, exist_ok=True)
+        for name in sorted(os.listdir(self.root)):
+            # workspaces left by an earlier process are reused after a reset
+            path = os.path.join(self.root, name)
+            self.counter = max(self.counter, int(name[2:]) + 1 if name[2:].isdigit() else 0)
+            self.reset(path)
+            self.ready.put(path)
+        while self.ready.qsize() < self.size:
+            self.ready.put(self.create())
+
+    def ensure_template(self):
+        if os.path.isfile(os.path.join(self.template_dir, "foundry.toml")) and has_libraries(self.template_dir):
+            return
+        # built once in a scratch folder and renamed into place, so a half-built template is never used
+        os.makedirs(os.path.dirname(self.template_dir), exist_ok=True)
+        scratch = tempfile.mkdtemp(prefix="template-", dir=os.path.dirname(self.template_dir))
+        project = os.path.join(scratch, "project")
+        result = get_process_manager().run_sync([forge_binary(), "init", project, "--no-git"], scratch, timeout=600)
+        if not result.ok:
+            # the library-less fallback serves this process only; the next start runs forge init again
+            print(f"forge init failed ({result.describe()}); workspaces have no libraries until the next start.")
+            os.makedirs(project, exist_ok=True)
+            with open(os.path.join(project, "foundry.toml"), "w") as file:
+                file.write('[profile.default]\nsrc = "src"\nout = "out"\nlibs = ["lib"]\n')
+            self.template_dir = project
+            atexit.register(shutil.rmtree, scratch, True)
+            return
+        for name in ["src", "test", "script"]:
+            clear_folder(os.path.join(project, name))
+        if not has_libraries(self.template_dir):
+            # a template left without libraries, e.g. by an earlier failed init, is replaced
+            shutil.rmtree(self.template_dir, ignore_errors=True)
+        try:
+            os.rename(project, self.template_dir)
+        except OSError:
+            pass  # another process finished its template first
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    def create(self):
+        with self.lock:
+            path = os.path.join(self.root, f"ws{self.counter}")
+            self.counter += 1
+        return link_workspace(self.template_dir, path)
+
+    def materialize(self, path):
+        """A persistent project at path built from the template, e.g. the UI's FoundryProject."""
+        return link_workspace(self.template_dir, path)
+
+    def reset(self, path):
+        # back to a pristine template copy: empty sources and tests, template config and libraries
+        for name in ["src", "test", "lib"]:
+            clear_folder(os.path.join(path, name))
+        link_libraries(os.path.join(self.template_dir, "lib"), os.path.join(path, "lib"))
+        for name in CONFIG_FILES:
+            source = os.path.join(self.template_dir, name)
+            target = os.path.join(path, name)
+            if os.path.exists(source):
+                shutil.copy2(source, target)
+            elif os.path.exists(target):
+                os.remove(target)
+
+    def acquire(self, seed=None):
+        """A ready workspace; seed is a project whose src/ and config files are copied into it."""
+        try:
+            path = self.ready.get_nowait()
+        except queue.Empty:
+            path = self.create()
+        if seed is not None:
+            shutil.copytree(os.path.join(seed, "src"), os.path.join(path, "src"), dirs_exist_ok=True)
+            for name in CONFIG_FILES:
+                if os.path.exists(os.path.join(seed, name)):
+                    shutil.copy2(os.path.join(seed, name), path)
+            # the seed's libraries win over the template's, so a project keeps its pinned forge-std
+            link_libraries(os.path.join(seed, "lib"), os.path.join(path, "lib"), replace=True)
+        return path
+
+    def release(self, path):
+        self.reset(path)
+        if self.ready.qsize() < self.size:
+            self.ready.put(path)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_workspace_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkspacePool()
+        return _pool
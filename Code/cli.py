@@ -0,0 +1,120 @@
+"""
+Headless entry point for generating test invariants without the Streamlit UI.
+
+    python cli.py path/to/project-or.zip --contracts src/utils --model gpt-4 \
+        --technique few-shot --concurrency 8 --output generated/
+
+A .zip is extracted into the src/ folder of a fresh workspace, the same way the UI does it,
+so --contracts is then relative to that workspace (e.g. src/ or src/utils). Generated .t.sol
+files are written to --output as they complete and a JSON summary is printed on stdout.
+With --stream every test is written as soon as its own response finishes, and --compile
+hands each one to a pool of forge sandboxes right away instead of after the whole batch.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from Backends.Backends import BACKENDS
+from CompileServer.CompileServer import get_compile_server
+from CompilerPool.CompilerPool import CompilerPool
+from InvariantGenerator.InvariantGenerator import InvariantGenerator
+from Validator.Validator import Validator
+
+TECHNIQUES = ["zero-shot", "few-shot", "Prompt chaining"]
+
+
+def prepare_project(project, workspace):
+    if os.path.isdir(project):
+        return os.path.abspath(project)
+    workspace = os.path.abspath(workspace or tempfile.mkdtemp(prefix="invariants-"))
+    with zipfile.ZipFile(project, 'r') as zf:
+        zf.extractall(os.path.join(workspace, "src"))
+    return workspace
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate foundry test invariants for Solidity contracts.")
+    parser.add_argument("project", help="Foundry project directory or .zip of the contract sources")
+    parser.add_argument("--contracts", default="src/", help="contracts folder relative to the project (default: src/)")
+    parser.add_argument("--model", default="gpt-4", choices=sorted(BACKENDS),
+                        help="registered backend; 'replay' serves recorded responses offline")
+    parser.add_argument("--technique", default="few-shot", choices=TECHNIQUES)
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum concurrent model requests")
+    parser.add_argument("--output", default="generated", help="directory for the generated .t.sol files")
+    parser.add_argument("--files", nargs="*", help="only these contract files (default: every .sol in --contracts)")
+    parser.add_argument("--workspace", help="where to extract a .zip project (default: a temp directory)")
+    parser.add_argument("--incremental", action="store_true", help="skip contracts whose inputs are unchanged")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    parser.add_argument("--stream", action="store_true", help="write each test as soon as its response completes")
+    parser.add_argument("--shard", action="store_true",
+                        help="generate large contracts in parallel parts of a few functions each and merge them")
+    parser.add_argument("--compile", action="store_true", help="compile each generated test with forge as it lands")
+    parser.add_argument("--telemetry", help="directory for per-stage telemetry (telemetry.jsonl, telemetry.prom)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.monotonic()
+    project = prepare_project(args.project, args.workspace)
+    output_dir = os.path.abspath(args.output)
+
+    # progress output goes to stderr so stdout only carries the JSON summary
+    with contextlib.redirect_stdout(sys.stderr):
+        generator = InvariantGenerator(project, args.contracts, args.model,
+                                       use_cache=False if args.no_cache else None, output_dir=output_dir)
+        selected = args.files or [contract["filename"] for contract in generator.contracts]
+        ready = {}
+        compiles = {}
+        pool = CompilerPool(project, validator=Validator(project, index=generator.index),
+                            compile_server=get_compile_server(project)) if args.compile else None
+        executor = ThreadPoolExecutor(max_workers=pool.workers) if pool else None
+
+        def on_test_ready(contract, test_path):
+            ready[os.path.basename(test_path)] = round(time.monotonic() - start, 3)
+            if executor is not None:
+                compiles[os.path.basename(test_path)] = executor.submit(pool.compile, test_path)
+
+        generator.process_contracts({}, args.technique, selected, args.incremental, args.concurrency,
+                                    stream=args.stream, on_test_ready=on_test_ready, shard=args.shard)
+        compiled = {name: future.result() for name, future in compiles.items()}
+        if executor is not None:
+            executor.shutdown()
+        for name, result in compiled.items():
+            generator.telemetry.observe(name, "compile", latency=result.duration, ok=result.success)
+        if args.telemetry:
+            generator.telemetry.export(args.telemetry)
+
+    summary = {
+        "project": project,
+        "contracts": args.contracts,
+        "model": args.model,
+        "technique": args.technique,
+        "output": output_dir,
+        "selected": len(selected),
+        "generated": generator.generated,
+        "skipped": generator.skipped,
+        "failed": generator.failed,
+        "cache": generator.cache.stats(),
+        "ready_seconds": ready,
+        "first_test_seconds": min(ready.values()) if ready else None,
+        "stages": generator.telemetry.summary(),
+        "elapsed_seconds": round(time.monotonic() - start, 3),
+    }
+    if args.compile:
+        summary["compiled"] = {name: result.success for name, result in compiled.items()}
+        # rejected by the validator without running forge, with its reasons
+        summary["rejected"] = {name: [d.message for d in result.diagnostics] for name, result in compiled.items()
+                               if any(str(d.code).startswith("validator:") for d in result.diagnostics)}
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the packages under Code/ are imported by their top-level names, as the CLI and the UI do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
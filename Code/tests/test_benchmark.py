@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("solidity_parser")  # InvariantGenerator -> ProjectIndex
+
+from Benchmark.Benchmark import compare, run_technique
+
+CONTRACT = """// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+contract Counter {
+    uint256 public count;
+
+    function increment() external {
+        count += 1;
+    }
+}
+"""
+
+
+def test_missing_recording_in_prompt_chaining_fails_the_run(tmp_path, monkeypatch):
+    monkeypatch.delenv("INVARIANT_REPLAY_DIR", raising=False)
+    monkeypatch.delenv("INVARIANT_RECORD_DIR", raising=False)
+    workspace = tmp_path / "workspace"
+    (workspace / "src").mkdir(parents=True)
+    (workspace / "src" / "Counter.sol").write_text(CONTRACT)
+    replay_dir = tmp_path / "replay"
+    replay_dir.mkdir()
+    result = run_technique({
+        "workspace": str(workspace), "technique": "Prompt chaining", "model": "replay", "family": "gpt-4",
+        "replay_dir": str(replay_dir), "record": False, "concurrency": 1, "stream": False, "compile": False,
+    })
+    assert result["error"] and "Counter.sol" in result["error"]
+    assert result["contracts"] == 0
+    assert not os.path.exists(workspace / "generated" / "Prompt-chaining" / "src" / "Counter.t.sol")
+    baseline = {"techniques": {"Prompt chaining": {"throughput_per_min": 1.0}}}
+    assert compare({"techniques": {"Prompt chaining": result}}, baseline)
@@ -0,0 +1,50 @@
+import os
+import stat
+
+import pytest
+
+pytest.importorskip("solidity_parser")  # CompileServer -> Diagnostics -> ProjectIndex
+
+from CompileServer.CompileServer import CompileServer
+
+# prints remappings.txt like `forge remappings` would, and fails without one
+FORGE = "#!/bin/sh\n[ \"$1\" = remappings ] || exit 1\ncat remappings.txt\n"
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    forge = bin_dir / "forge"
+    forge.write_text(FORGE)
+    forge.chmod(forge.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    root = tmp_path / "project"
+    (root / "lib").mkdir(parents=True)
+    return root
+
+
+def touch_later(path, text):
+    path.write_text(text)
+    mtime = path.stat().st_mtime + 10
+    os.utime(path, (mtime, mtime))
+
+
+def test_remappings_are_reloaded_when_the_config_changes(project):
+    touch_later(project / "remappings.txt", "forge-std/=lib/forge-std/src/\n")
+    server = CompileServer(str(project), solc="/bin/true")
+    assert server.tree.remappings == [("forge-std/", "lib/forge-std/src/")]
+
+    touch_later(project / "remappings.txt", "solady/=lib/solady/src/\n")
+    server.refresh()
+    assert server.tree.remappings == [("solady/", "lib/solady/src/")]
+
+
+def test_failed_remappings_are_not_kept(project):
+    server = CompileServer(str(project), solc="/bin/true")
+    assert not server.available
+    assert server.compile(code="contract A {}") is None  # the pool compiles with forge instead
+
+    touch_later(project / "remappings.txt", "forge-std/=lib/forge-std/src/\n")
+    server.refresh()
+    assert server.available
@@ -0,0 +1,113 @@
+from Fixer.Fixer import Fixer
+
+SUITE = """// SPDX-License-Identifier: UNLICENSED
+pragma solidity ^0.8.0;
+
+import {Test} from "forge-std/Test.sol";
+
+address constant DEPLOYER = address(0xBEEF); // file-level: stays a constant
+
+contract FooTest is Test {
+    address constant public ALICE = makeAddr("alice");
+    address internal constant BOB = makeAddr("bob");
+    uint256 constant LIMIT = 10;
+
+    function testAlice() public {
+        assertTrue(ALICE != BOB);
+    }
+}
+"""
+
+
+def test_runtime_constants_are_demoted(tmp_path):
+    result = Fixer(str(tmp_path)).fix_code(SUITE, "FooTest.t.sol")
+
+    assert result.fired["runtime-constant"] == 2
+    assert 'address public ALICE = makeAddr("alice");' in result.code
+    assert 'address internal BOB = makeAddr("bob");' in result.code
+    assert "uint256 constant LIMIT = 10;" in result.code
+
+
+def test_file_level_constants_are_kept(tmp_path):
+    code = SUITE.replace("address(0xBEEF)", "address(this)")
+    result = Fixer(str(tmp_path)).fix_code(code, "FooTest.t.sol")
+
+    assert "address constant DEPLOYER = address(this);" in result.code
+
+
+class FakeDiagnostic:
+    def __init__(self, code, line, message="", severity="error"):
+        self.code, self.line, self.message, self.severity = code, line, message, severity
+
+    @property
+    def is_error(self):
+        return self.severity == "error"
+
+
+class FakeIndex:
+    def __init__(self, files):
+        self.files = files
+
+
+def test_assert_with_message_becomes_assert_true(tmp_path):
+    code = 'function testX() public {\n    assert(x == 1, "bad");\n    assert(x == 1);\n}\n'
+    result = Fixer(str(tmp_path)).fix_code(code)
+
+    assert result.fired == {"assert-with-message": 1}
+    assert 'assertTrue(x == 1, "bad");' in result.code
+    assert "    assert(x == 1);" in result.code
+
+
+def test_assert_after_an_apostrophe_in_a_comment_is_fixed(tmp_path):
+    code = ("// the owner's balance\n"
+            "// assert(y == 2, \"in a comment\");\n"
+            'function testX() public {\n    assert(x == 1, "bad");\n}\n'
+            "// isn't reached\n")
+    result = Fixer(str(tmp_path)).fix_code(code)
+
+    assert result.fired == {"assert-with-message": 1}
+    assert 'assertTrue(x == 1, "bad");' in result.code
+    assert '// assert(y == 2, "in a comment");' in result.code
+
+
+def test_assert_fix_is_limited_to_the_reported_lines(tmp_path):
+    code = 'function testX() public {\n    assert(x == 1, "a");\n    assert(y == 2, "b");\n}\n'
+    result = Fixer(str(tmp_path)).fix_errors(code, [FakeDiagnostic("6160", 3)])
+
+    assert result.fired == {"assert-with-message": 1}
+    assert 'assert(x == 1, "a");' in result.code
+    assert 'assertTrue(y == 2, "b");' in result.code
+
+
+def test_using_for_address_is_dropped_unless_the_library_is_imported(tmp_path):
+    code = ('import {Address} from "openzeppelin/utils/Address.sol";\n'
+            "contract FooTest {\n    using Address for address;\n    using SafeTransferLib for address;\n}\n")
+    result = Fixer(str(tmp_path)).fix_code(code)
+
+    assert result.fired == {"using-for-address": 1}
+    assert "using Address for address;" in result.code
+    assert "SafeTransferLib" not in result.code
+
+
+def test_broken_relative_import_is_repointed(tmp_path):
+    fixer = Fixer(str(tmp_path))
+    fixer.context.index = FakeIndex(["src/tokens/Token.sol", "src/Vault.sol", "lib/Vault.sol"])
+    code = 'import "../src/Token.sol";\nimport {Vault} from "./Vault.sol";\n'
+    result = fixer.fix_code(code)
+
+    assert result.fired == {"import-path": 1}
+    assert 'import "../src/tokens/Token.sol";' in result.code
+    assert 'import {Vault} from "./Vault.sol";' in result.code  # two candidates: left alone
+
+
+def test_address_checksum_uses_the_spelling_solc_reports(tmp_path):
+    wrong = "0x5b38da6a701c568545dcfcb03fcb875f56beddc4"
+    right = "0x5B38Da6a701c568545dCfcB03FcB875f56beddC4"
+    code = f"contract FooTest {{\n    address a = {wrong};\n}}\n"
+    fixer = Fixer(str(tmp_path))
+
+    assert fixer.fix_code(code).fired == {}  # needs the compiler's message
+    result = fixer.fix_errors(code, [FakeDiagnostic(
+        "9429", 2, f'This looks like an address but has an invalid checksum. Correct checksummed address: "{right}".')])
+    assert result.fired == {"address-checksum": 1}
+    assert f"address a = {right};" in result.code
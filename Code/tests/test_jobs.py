@@ -0,0 +1,34 @@
+import os
+import time
+
+from Jobs.Jobs import Job, JobService
+
+
+def finished_job(service, job_id, age_days):
+    finished = time.time() - age_days * 86400
+    job = Job(job_id, "/project", "src/", "gpt-4", "few-shot", ["A.sol"], status="done",
+              created=finished - 60, finished=finished)
+    service.save(job)
+    return job
+
+
+def test_old_and_surplus_finished_jobs_are_pruned(tmp_path):
+    root = str(tmp_path)
+    service = JobService(root, workers=1)
+    for job_id, age in [("new", 0), ("recent", 1), ("older", 2), ("expired", 10)]:
+        finished_job(service, job_id, age)
+
+    service = JobService(root, workers=1, retention_days=7, max_finished=2)
+
+    assert sorted(job.id for job in service.list()) == ["new", "recent"]
+    assert sorted(os.listdir(root)) == ["new", "recent"]
+
+
+def test_running_jobs_are_kept(tmp_path):
+    service = JobService(str(tmp_path), workers=1, max_finished=0)
+    job = finished_job(service, "running", 30)
+    job.status, job.finished = "running", None
+    service.jobs[job.id] = job
+
+    assert service.prune() == []
+    assert service.get("running") is job
@@ -0,0 +1,52 @@
+import asyncio
+
+from Pipeline.Pipeline import PromptChainPipeline
+
+
+def pipeline(model_call, **options):
+    return PromptChainPipeline([lambda contract, _: contract["code"]], model_call, retry_delay=0, **options)
+
+
+async def echo(prompt):
+    if prompt == "broken":
+        raise RuntimeError("model unavailable")
+    return prompt.upper()
+
+
+CONTRACTS = [{"filename": "A.sol", "code": "a"}, {"filename": "B.sol", "code": "broken"},
+             {"filename": "C.sol", "code": "c"}]
+
+
+def test_a_failing_contract_does_not_abort_the_batch():
+    runner = pipeline(echo, max_retries=1)
+
+    results = runner.run(CONTRACTS)
+
+    assert results == [["A"], None, ["C"]]
+    assert list(runner.failures) == ["B.sol"]
+    assert isinstance(runner.failures["B.sol"], RuntimeError)
+
+
+def test_run_inside_a_running_event_loop():
+    async def caller():
+        return pipeline(echo).run(CONTRACTS[:1])
+
+    assert asyncio.run(caller()) == [["A"]]
+
+
+def test_arun_for_async_callers():
+    assert asyncio.run(pipeline(echo).arun(CONTRACTS[2:])) == [["C"]]
+
+
+def test_retries_go_through_the_rate_limiter():
+    calls = []
+
+    async def flaky(prompt):
+        calls.append(prompt)
+        if len(calls) < 3:
+            raise RuntimeError("overloaded")
+        return prompt
+
+    runner = pipeline(flaky, max_retries=2, limits={"requests_per_minute": 100})
+    assert runner.run(CONTRACTS[:1]) == [["a"]]
+    assert len(runner.limiter.events) == 3
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from Process.Process import ProcessManager
+
+
+def test_child_that_ignores_its_stdin_still_returns_a_result(tmp_path):
+    result = ProcessManager(max_concurrency=1).run_sync(["sh", "-c", "exec 0<&-; echo failed >&2; exit 3"], str(tmp_path),
+                                                        timeout=10, input="x" * (10 * 1024 * 1024))
+
+    assert result.returncode == 3
+    assert result.stderr.strip() == "failed"
+    assert not result.timed_out
+
+
+def test_stdin_is_passed_through(tmp_path):
+    result = ProcessManager(max_concurrency=1).run_sync(["cat"], str(tmp_path), timeout=10, input="hello")
+
+    assert result.ok and result.stdout == "hello"
+
+
+def test_stdin_write_is_covered_by_the_timeout(tmp_path):
+    # the child never reads, so a large input fills the pipe and only the timeout ends the call
+    start = time.monotonic()
+    result = ProcessManager(max_concurrency=1).run_sync(["sleep", "30"], str(tmp_path),
+                                                        timeout=1, input="x" * (10 * 1024 * 1024))
+
+    assert result.timed_out
+    assert time.monotonic() - start < 10
+
+
+def test_slots_bound_concurrent_processes(tmp_path):
+    manager = ProcessManager(max_concurrency=1)
+
+    async def both():
+        return await asyncio.gather(*(manager.run(["sh", "-c", "sleep 0.3; date +%s.%N"], str(tmp_path))
+                                      for _ in range(2)))
+
+    first, second = sorted(float(r.stdout) for r in asyncio.run(both()))
+    assert second - first >= 0.25
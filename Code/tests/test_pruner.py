@@ -0,0 +1,71 @@
+import re
+from types import SimpleNamespace
+
+from Pruner.Pruner import Pruner
+
+SUITE = """// SPDX-License-Identifier: UNLICENSED
+pragma solidity ^0.8.0;
+
+contract FooTest {
+    uint256 x;
+
+    function setUp() public {
+        x = 1;
+    }
+
+    function test_a() public {
+        BAD;
+    }
+
+    function test_b() public {
+        x = 2;
+    }
+
+    function test_c() public {
+        BAD;
+    }
+
+    function test_d() public {
+        x = 3;
+    }
+}
+"""
+
+
+class FakePool:
+    """Fails any file that still contains BAD, without locating the error, so the pruner has to bisect."""
+
+    def __init__(self):
+        self.compiled = []
+
+    def compile(self, path):
+        with open(path) as file:
+            code = file.read()
+        self.compiled.append(sorted(re.findall(r"function (test_\w+)", code)))
+        if "BAD" in code:
+            return SimpleNamespace(success=False, diagnostics=[], errors=["Error: undeclared identifier"])
+        return SimpleNamespace(success=True, diagnostics=[], errors=[])
+
+
+def test_bisection_keeps_every_compiling_function(tmp_path):
+    path = tmp_path / "FooTest.t.sol"
+    path.write_text(SUITE)
+
+    result = Pruner(FakePool()).prune(str(path))
+
+    assert result.compiles
+    assert result.kept == ["test_b", "test_d"]
+    assert sorted(result.dropped) == ["test_a", "test_c"]
+    assert "BAD" not in result.code.split("// Properties dropped")[0]
+
+
+def test_compiling_suite_is_left_alone(tmp_path):
+    path = tmp_path / "FooTest.t.sol"
+    path.write_text(SUITE.replace("BAD;", "x = 0;"))
+    pool = FakePool()
+
+    result = Pruner(pool).prune(str(path))
+
+    assert result.kept == ["test_a", "test_b", "test_c", "test_d"]
+    assert not result.pruned
+    assert result.compile_runs == 1
@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("langchain")  # RepairEngine -> Prompts.prompts
+
+from CompilingAgent.RepairEngine import RepairEngine
+
+TEST = """contract TokenTest {
+    function test_a() public {
+        broken();
+    }
+}
+"""
+
+
+class FakeDiagnostic:
+    is_error = True
+    file = "Token.t.sol"
+    line = 3
+
+    def __str__(self):
+        return "Error: undeclared identifier broken"
+
+
+class FakeResult:
+    success = False
+    diagnostics = [FakeDiagnostic()]
+    errors = diagnostics
+
+
+class FakePool:
+    def compile(self, path):
+        return FakeResult()
+
+
+class FakeLLM:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []  # max_tokens of every call
+
+    def bind(self, max_tokens):
+        return CappedLLM(self, max_tokens)
+
+
+class CappedLLM:
+    def __init__(self, llm, max_tokens):
+        self.llm, self.max_tokens = llm, max_tokens
+
+    def invoke(self, prompt):
+        # cut off like a provider would at max_tokens (words are tokens here)
+        self.llm.calls.append(self.max_tokens)
+        return " ".join(self.llm.reply.split(" ")[:self.max_tokens])
+
+
+def test_replies_are_capped_to_the_token_budget(tmp_path):
+    path = tmp_path / "Token.t.sol"
+    path.write_text(TEST)
+    # a reply far longer than the span it replaces is cut off at the cap
+    llm = FakeLLM("```solidity\n    function test_a() public {" + " x();" * 5000 + " }\n```")
+    engine = RepairEngine(llm, FakePool(), lambda text: len(text.split()), token_budget=600)
+    result = engine.repair(str(path))
+
+    assert llm.calls and all(0 < cap < 200 for cap in llm.calls)
+    assert result.input_tokens + result.output_tokens <= engine.token_budget
+    assert result.stopped
+    assert not result.compiles and path.read_text() == TEST
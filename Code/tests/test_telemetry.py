@@ -0,0 +1,14 @@
+import json
+
+from Telemetry.Telemetry import Telemetry
+
+
+def test_exporting_twice_does_not_duplicate_records(tmp_path):
+    telemetry = Telemetry(count_tokens=len)
+    telemetry.observe("A.sol", "prompt_build", input_tokens=10)
+    telemetry.export(str(tmp_path))
+    telemetry.observe("A.sol", "compile", latency=1.5)
+    telemetry.export(str(tmp_path))
+
+    lines = (tmp_path / "telemetry.jsonl").read_text().splitlines()
+    assert [json.loads(line)["stage"] for line in lines] == ["prompt_build", "compile"]
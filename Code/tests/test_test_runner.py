@@ -0,0 +1,20 @@
+import pytest
+
+pytest.importorskip("solidity_parser")  # TestRunner -> Diagnostics -> ProjectIndex
+
+from TestRunner.TestRunner import TestRunner, parse_results
+
+RESULTS = {
+    "test/Token.t.sol:TokenTest": {"test_results": {
+        "test_transfer()": {"status": "Success", "kind": {"Unit": {"gas": 31000}}},
+        "test_burn()": {"status": "Failure", "reason": "assertion failed"},
+        "test_fork()": {"status": "Skipped"},
+    }},
+}
+
+
+def test_skipped_tests_are_not_failures():
+    records = parse_results(RESULTS, "test/Token.t.sol")
+    assert {r.test: r.status for r in records} == {
+        "test_transfer()": "pass", "test_burn()": "fail", "test_fork()": "skip"}
+    assert TestRunner.summary(records) == {"pass": 1, "fail": 1, "skip": 1}
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+pytest.importorskip("solidity_parser")  # Validator -> Diagnostics -> ProjectIndex
+
+from Validator.Validator import Validator
+
+LIBRARY = {
+    "parsed": True,
+    "resolved": [],
+    "contracts": [{
+        "name": "LibString",
+        "kind": "library",
+        "bases": [],
+        "functions": [
+            {"name": "indexOf", "visibility": "internal"},
+            {"name": "_toLower", "visibility": "private"},
+        ],
+        "variables": [
+            {"name": "NOT_FOUND", "visibility": "internal"},
+            {"name": "_SECRET", "visibility": "private"},
+        ],
+    }],
+}
+
+
+class FakeIndex:
+    def __init__(self, root):
+        self.path = os.path.join(root, "src", "LibString.sol")
+
+    def resolve(self, path, base):
+        return self.path if path.endswith("LibString.sol") else None
+
+    def get(self, path):
+        return LIBRARY if path == self.path else None
+
+
+def suite(body):
+    return ('import "forge-std/Test.sol";\nimport "../src/LibString.sol";\n\n'
+            "contract LibStringTest is Test {\n    function testIndexOf() public {\n"
+            f"        {body}\n    }}\n}}\n")
+
+
+@pytest.fixture
+def validator(tmp_path):
+    return Validator(str(tmp_path), index=FakeIndex(str(tmp_path)))
+
+
+def test_library_internal_constants_are_usable(validator):
+    result = validator.validate(suite('assertEq(LibString.indexOf("a", "b"), LibString.NOT_FOUND);'))
+    assert result.valid, result.reasons
+
+
+def test_library_private_members_are_rejected(validator):
+    result = validator.validate(suite("assertEq(LibString._SECRET, 0);"))
+    assert [issue.kind for issue in result.issues] == ["non-public-member"]
@@ -0,0 +1,61 @@
+import os
+import stat
+
+from WorkspacePool.WorkspacePool import WorkspacePool
+
+FORGE_OK = """#!/bin/sh
+[ "$1" = init ] || exit 1
+mkdir -p "$2/lib/forge-std/src" "$2/src" "$2/test"
+printf '[profile.default]\\n' > "$2/foundry.toml"
+"""
+FORGE_OFFLINE = "#!/bin/sh\necho 'could not clone forge-std' >&2\nexit 1\n"
+
+
+def fake_forge(tmp_path, monkeypatch, script):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir(exist_ok=True)
+    forge = bin_dir / "forge"
+    forge.write_text(script)
+    forge.chmod(forge.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+def test_failed_forge_init_is_not_persisted(tmp_path, monkeypatch):
+    template = tmp_path / "workspaces" / "template"
+    fake_forge(tmp_path, monkeypatch, FORGE_OFFLINE)
+    pool = WorkspacePool(size=1, template_dir=str(template), root=str(tmp_path / "pool"))
+
+    assert not template.exists()
+    assert os.path.isfile(os.path.join(pool.acquire(), "foundry.toml"))
+
+    fake_forge(tmp_path, monkeypatch, FORGE_OK)
+    pool = WorkspacePool(size=1, template_dir=str(template), root=str(tmp_path / "pool"))
+    assert (template / "lib" / "forge-std").is_dir()
+    assert os.path.isdir(os.path.join(pool.acquire(), "lib", "forge-std", "src"))
+
+
+def test_template_without_libraries_is_rebuilt(tmp_path, monkeypatch):
+    template = tmp_path / "workspaces" / "template"
+    template.mkdir(parents=True)
+    (template / "foundry.toml").write_text("[profile.default]\n")
+    fake_forge(tmp_path, monkeypatch, FORGE_OK)
+    WorkspacePool(size=1, template_dir=str(template), root=str(tmp_path / "pool"))
+
+    assert (template / "lib" / "forge-std").is_dir()
+
+
+def test_seed_libraries_take_precedence(tmp_path, monkeypatch):
+    fake_forge(tmp_path, monkeypatch, FORGE_OK)
+    pool = WorkspacePool(size=1, template_dir=str(tmp_path / "template"), root=str(tmp_path / "pool"))
+    seed = tmp_path / "project"
+    (seed / "src").mkdir(parents=True)
+    (seed / "lib" / "forge-std").mkdir(parents=True)
+    (seed / "lib" / "solady").mkdir()
+
+    path = pool.acquire(seed=str(seed))
+    assert os.path.realpath(os.path.join(path, "lib", "forge-std")) == os.path.realpath(seed / "lib" / "forge-std")
+    assert os.path.realpath(os.path.join(path, "lib", "solady")) == os.path.realpath(seed / "lib" / "solady")
+
+    pool.release(path)
+    assert os.path.realpath(os.path.join(path, "lib", "forge-std")) == \
+        os.path.realpath(tmp_path / "template" / "lib" / "forge-std")
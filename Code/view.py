@@ -1,7 +1,11 @@
 import streamlit as st
 import os
+import time
 from Foundry.Foundry import foundry
+from Jobs.Jobs import get_job_service, FINISHED
 from InvariantGenerator.InvariantGenerator import InvariantGenerator
+from ProjectIndex.ProjectIndex import get_index
+from Backends.Backends import BACKENDS
 
 # from CompilingAgent.CompilingAgent import CompilingAgent
 
@@ -11,7 +15,7 @@ def sideBar():
     with st.sidebar:
         st.title("🔍🔒 Smart Auditor Pro")
 
-        llmModel = st.selectbox("Select a model:", ["gemini-1.0-pro","gemini-1.5-advanced","gpt-4","gpt-3.5"])
+        llmModel = st.selectbox("Select a model:", [name for name, spec in BACKENDS.items() if spec.provider != "replay"])
         prompt_technique = st.selectbox("Select Prompt :", ["zero-shot","few-shot","Prompt chaining"])
 
         st.markdown("---")
@@ -97,22 +101,22 @@ def input_files():
             if st.button("Compile Project"):
                 # Foundry project path
                 foundry_path = f'{current_dir}/FoundryProject/src/'
-                # Create Foundry project
-                if foundry.dir_existence(foundry_path) == False:
-                    foundry.clear_foundry()
-                    foundry.create_src(uploaded_zip, foundry_path)
-                else:
-                    foundry.clear_foundry()
-                    foundry.create_src(uploaded_zip, foundry_path)
+                # Apply only the files that differ from the previous upload, keeping forge's cache/ and out/
+                changes = foundry.sync_src(uploaded_zip, foundry_path)
+                if any(changes.values()):
+                    # tests generated for the previous sources no longer apply
+                    foundry.clear_test()
+                # Index the uploaded sources once; generation and compiling reuse the parsed summaries
+                get_index(f'{current_dir}/FoundryProject').refresh()
                 # Compile Project
-                output=(foundry.forge_build())
+                report=foundry.forge_build()
 
-                if "Error" in output:
-                    st.error(output)
+                if not report.success:
+                    st.error(report.output)
                     st.session_state.compilable=False
                     return False
                 else:
-                    st.success(output)
+                    st.success(report.output)
                     st.session_state.compilable=True
                     st.session_state.custom_invariants = {}
                     return True
@@ -166,20 +170,19 @@ def generate_invariants(llmmodel,prompt_technique):
 
         # Filter the selected files
         selected_files = [file for file, checked in checked_files.items() if checked]
+        incremental = st.checkbox("Only regenerate contracts whose source or references changed")
 
         if st.button("Generate Invariants"):
-            with st.spinner("Generating invariants..."):
-                # Pass custom invariants dictionary to InvariantGenerator
-                IG = InvariantGenerator(foundry_path, contracts_file_name, llmmodel)
-                IG.process_contracts(
-                    st.session_state.custom_invariants if "custom_invariants" in st.session_state else {},
-                    prompt_technique,selected_files)
-                print(st.session_state.custom_invariants)
-                st.success("Invariants generated successfully.")
-                st.session_state.generated = True
-                IG.view_test_contract()
-
+            # generation runs as a background job; the script only keeps its id and polls it
+            job_id = get_job_service().submit(
+                foundry_path, contracts_file_name, llmmodel, prompt_technique, selected_files,
+                st.session_state.custom_invariants if "custom_invariants" in st.session_state else {},
+                incremental)
+            st.query_params["job"] = job_id
+            print(st.session_state.custom_invariants)
 
+        if "job" in st.query_params:
+            show_job(st.query_params["job"])
 
 
 
@@ -187,6 +190,32 @@ def generate_invariants(llmmodel,prompt_technique):
         st.session_state.generated = False
         st.error(f"Error: {e}")
 
+def show_job(job_id):
+    service = get_job_service()
+    job = service.get(job_id)
+    if job is None:
+        st.warning(f"Job {job_id} not found.")
+        return
+    done, total = job.progress
+    st.text(f"Job {job.id}: {job.status} ({job.technique}, {job.model})")
+    st.progress(done / total if total else 1.0, text=f"{done}/{total} contracts")
+    for filename, result in job.results.items():
+        st.text(f"{filename}: {result['status']}")
+    if job.status == "failed":
+        st.session_state.generated = False
+        st.error(f"Error: {job.error}")
+    elif job.status == "done":
+        st.success("Invariants generated successfully.")
+        st.session_state.generated = True
+        InvariantGenerator.view_tests(service.output_dir(job.id))
+    if job.status in FINISHED:
+        # shown once more on this run; a later rerun or refresh starts without the finished job
+        del st.query_params["job"]
+    else:
+        # poll without blocking other sessions: the job keeps running between reruns
+        time.sleep(1)
+        st.rerun()
+
 def compile_invariants():
     foundry_path = f'{current_dir}/FoundryProject/'
     try: